@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""Archivo anual de los logs de máquina con resúmenes retenidos.
+
+Las filas de producción y paros con ``fecha`` anterior al horizonte
+(``config.ARCHIVO_HORIZONTE_DIAS``) salen del log vivo hacia
+``archivo/oee_<id>_<AAAA>.csv.gz`` / ``archivo/down_<id>_<AAAA>.csv.gz``.
+De esos archivos se derivan los resúmenes por ``(fecha, turno, molde)``
+(``archivo/resumen_oee_<id>.csv`` y ``archivo/resumen_down_<id>.csv``) con
+los que ``metrics`` sigue respondiendo históricos, acumulados por molde y
+reportes de rangos ya archivados.
+
+El proceso es repetible: al archivar se une con lo que ya había en el año
+(sin duplicar filas idénticas), luego se reescribe el log vivo y al final se
+recalculan los resúmenes a partir de los ``.gz``. Si se corta a la mitad,
+basta con volver a correrlo::
+
+    python archive.py [horizonte_dias]
+"""
+
+import csv
+import gzip
+import os
+import sys
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import config
+import csv_utils
+from columnar import VOCAB, VOCAB_LOCK, columnas_de_filas
+from file_lock import bloqueo_csv
+
+RESUMEN_OEE_FIELDS = [
+    "fecha", "turno", "molde", "registros", "total_pzs", "scrap_pzs", "buenas_pzs",
+    "meta_oper_pzs", "horas_turno", "tiempo_paro_min",
+    "suma_avail", "n_avail", "suma_perf", "n_perf", "suma_qual", "n_qual", "suma_oee", "n_oee",
+]
+RESUMEN_DOWN_FIELDS = ["fecha", "turno", "molde", "eventos", "duracion_seg"]
+
+
+def ruta(nombre: str) -> str:
+    """Ruta de ``nombre`` dentro de ``config.ARCHIVE_DIR``."""
+    return os.path.join(config.ARCHIVE_DIR, nombre)
+
+
+def _anual(tipo: str, machine, anio: str) -> str:
+    return ruta(f"{tipo}_{machine['id']}_{anio}.csv.gz")
+
+
+def archivos_anuales(tipo: str, machine) -> List[str]:
+    """Archivos ``.csv.gz`` anuales de ``tipo`` (``oee`` o ``down``) de la máquina, en orden."""
+    pref = f"{tipo}_{machine['id']}_"
+    try:
+        nombres = sorted(n for n in os.listdir(config.ARCHIVE_DIR) if n.startswith(pref) and n.endswith(".csv.gz"))
+    except FileNotFoundError:
+        return []
+    return [ruta(n) for n in nombres]
+
+
+def leer_gz(path: str) -> List[Dict[str, str]]:
+    """Filas de un archivo anual comprimido (vacío si no existe)."""
+    try:
+        with gzip.open(path, "rt", newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+    except FileNotFoundError:
+        return []
+
+
+def _escribir_gz(path: str, campos: List[str], rows) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.open(raw, "wt", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=campos, extrasaction="ignore")
+            w.writeheader()
+            w.writerows(rows)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+
+
+# ===== archivar =====
+def _archivar_log(tipo: str, machine, campos: List[str], corte: str) -> int:
+    path = machine[f"{tipo}_csv"]
+    with bloqueo_csv(path):
+        ids: List[int] = []
+        rows = csv_utils.leer_log_maquina(path, pendientes=False) + csv_utils.filas_pendientes(path, ids)
+        viejas: Dict[str, List[Dict[str, str]]] = {}
+        vivas = []
+        for r in rows:
+            f = (r.get("fecha") or "").strip()
+            if f and f < corte:
+                viejas.setdefault(f[:4], []).append(r)
+            else:
+                vivas.append(r)
+        if not viejas:
+            return 0
+        os.makedirs(config.ARCHIVE_DIR, exist_ok=True)
+        for anio, nuevas in viejas.items():
+            dest = _anual(tipo, machine, anio)
+            previas = leer_gz(dest)
+            vistas = {tuple(r.get(k, "") for k in campos) for r in previas}
+            for r in nuevas:
+                t = tuple(r.get(k, "") for k in campos)
+                if t not in vistas:
+                    vistas.add(t)
+                    previas.append(r)
+            _escribir_gz(dest, campos, previas)
+        csv_utils.escribir_csv_dict(path, campos, vivas, ids)
+    return sum(len(v) for v in viejas.values())
+
+
+def archivar(machine, horizonte_dias: Optional[int] = None, hoy: Optional[date] = None) -> Dict[str, int]:
+    """Mueve al archivo anual lo anterior a ``hoy - horizonte_dias`` y rehace los resúmenes."""
+    dias = config.ARCHIVO_HORIZONTE_DIAS if horizonte_dias is None else horizonte_dias
+    corte = ((hoy or date.today()) - timedelta(days=dias)).isoformat()
+    csv_utils.asegurar_archivos_maquina(machine)
+    out = {
+        "oee": _archivar_log("oee", machine, csv_utils.OEE_FIELDS, corte),
+        "down": _archivar_log("down", machine, csv_utils.DOWN_FIELDS, corte),
+    }
+    reconstruir_resumenes(machine)
+    return out
+
+
+# ===== resúmenes =====
+def _resumen_oee(rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    c = columnas_de_filas(rows)
+    if not len(c):
+        return []
+    claves = np.empty(len(c), dtype=[("fecha", "datetime64[D]"), ("turno", np.int8), ("molde", np.int32)])
+    claves["fecha"], claves["turno"], claves["molde"] = c.fecha, c.turno, c.molde
+    grupos, inv = np.unique(claves, return_inverse=True)
+    n = len(grupos)
+
+    def suma(col):
+        return np.bincount(inv, weights=col.astype(np.float64), minlength=n)
+
+    def pct(col):
+        ok = ~np.isnan(col)
+        return suma(np.where(ok, col, 0.0)), np.bincount(inv, weights=ok, minlength=n)
+
+    cols = {
+        "registros": np.bincount(inv, minlength=n),
+        "total_pzs": suma(c.total), "scrap_pzs": suma(c.scrap), "buenas_pzs": suma(c.buenas),
+        "meta_oper_pzs": suma(c.meta), "horas_turno": suma(c.horas_turno), "tiempo_paro_min": suma(c.paro_min),
+    }
+    for k, col in (("avail", c.avail), ("perf", c.perf), ("qual", c.qual), ("oee", c.oee)):
+        cols[f"suma_{k}"], cols[f"n_{k}"] = pct(col)
+    fechas = np.datetime_as_string(grupos["fecha"], unit="D")
+    moldes = VOCAB["molde"].valores
+    out = []
+    for i in range(n):
+        if np.isnat(grupos["fecha"][i]):
+            continue
+        r = {"fecha": str(fechas[i]), "turno": str(int(grupos["turno"][i])), "molde": moldes[grupos["molde"][i]]}
+        for k, v in cols.items():
+            x = float(v[i])
+            r[k] = str(int(x)) if x.is_integer() else f"{x:.4f}"
+        out.append(r)
+    return out
+
+
+def _resumen_down(rows: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    acc: Dict[tuple, List[float]] = {}
+    for r in rows:
+        f = (r.get("fecha") or "").strip()
+        if not f:
+            continue
+        k = (f, (r.get("turno") or "").strip(), (r.get("molde") or "").strip())
+        try:
+            seg = float(str(r.get("duracion_seg") or 0).replace(",", "."))
+        except ValueError:
+            seg = 0.0
+        a = acc.setdefault(k, [0, 0.0])
+        a[0] += 1
+        a[1] += seg
+    return [{"fecha": f, "turno": t, "molde": m, "eventos": str(n), "duracion_seg": f"{s:g}"}
+            for (f, t, m), (n, s) in sorted(acc.items())]
+
+
+def reconstruir_resumenes(machine) -> None:
+    """Recalcula los resúmenes de la máquina a partir de sus archivos ``.gz``."""
+    for tipo, campos, fn in (("oee", RESUMEN_OEE_FIELDS, _resumen_oee),
+                             ("down", RESUMEN_DOWN_FIELDS, _resumen_down)):
+        anuales = archivos_anuales(tipo, machine)
+        if not anuales:
+            continue
+        rows = []
+        for p in anuales:
+            rows.extend(leer_gz(p))
+        csv_utils.escribir_csv_dict(ruta(f"resumen_{tipo}_{machine['id']}.csv"), campos, fn(rows))
+
+
+# ===== lectura para metrics =====
+class ResumenProduccion:
+    """Resumen archivado de producción en columnas (una fila por fecha/turno/molde)."""
+
+    def __init__(self, rows: List[Dict[str, str]]):
+        n = len(rows)
+        self.n = n
+        self.fecha = np.array([r.get("fecha") or "NaT" for r in rows], dtype="datetime64[D]")
+        self.turno = np.array([int(float(r.get("turno") or 0)) for r in rows], dtype=np.int8)
+        with VOCAB_LOCK:
+            self.molde = np.array([VOCAB["molde"].codigo((r.get("molde") or "").strip()) for r in rows],
+                                  dtype=np.int32)
+        for k in RESUMEN_OEE_FIELDS[3:]:
+            setattr(self, k, np.array([float(r.get(k) or 0) for r in rows], dtype=np.float64))
+
+    def __len__(self):
+        return self.n
+
+    def mascara(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> np.ndarray:
+        mask = np.ones(self.n, dtype=bool)
+        if desde:
+            mask &= self.fecha >= np.datetime64(desde, "D")
+        if hasta:
+            mask &= self.fecha <= np.datetime64(hasta, "D")
+        return mask
+
+
+_CACHE: Dict[str, tuple] = {}
+_CACHE_LOCK = threading.Lock()
+_VACIO = ResumenProduccion([])
+_SIN_PAROS: Dict[str, float] = {}
+
+
+def _cacheado(path: str, construir):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    firma = (st.st_mtime_ns, st.st_size)
+    with _CACHE_LOCK:
+        hit = _CACHE.get(path)
+        if hit is not None and hit[0] == firma:
+            return hit[1]
+    res = construir(csv_utils.leer_csv_dict(path))
+    with _CACHE_LOCK:
+        _CACHE[path] = (firma, res)
+    return res
+
+
+def resumen_produccion(machine) -> ResumenProduccion:
+    """Resumen archivado de la máquina (vacío si nunca se archivó)."""
+    res = _cacheado(ruta(f"resumen_oee_{machine['id']}.csv"), ResumenProduccion)
+    return _VACIO if res is None else res
+
+
+def _minutos_por_fecha(rows: List[Dict[str, str]]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for r in rows:
+        f = r.get("fecha") or ""
+        out[f] = out.get(f, 0.0) + float(r.get("duracion_seg") or 0) / 60.0
+    return out
+
+
+def paros_por_fecha(machine) -> Dict[str, float]:
+    """Minutos de paro archivados por fecha (diccionario compartido: no modificar)."""
+    res = _cacheado(ruta(f"resumen_down_{machine['id']}.csv"), _minutos_por_fecha)
+    return _SIN_PAROS if res is None else res
+
+
+def turno_archivado(machine, fecha_iso: str, turno: int) -> bool:
+    """``True`` si ``fecha_iso``/``turno`` ya está en el archivo de la máquina."""
+    res = resumen_produccion(machine)
+    if not len(res) or not fecha_iso:
+        return False
+    return bool(((res.fecha == np.datetime64(fecha_iso, "D")) & (res.turno == int(turno))).any())
+
+
+def paros_archivados(machine, desde: Optional[str] = None, hasta: Optional[str] = None) -> Dict[str, float]:
+    """Minutos de paro archivados por fecha dentro de ``[desde, hasta]``."""
+    return {f: m for f, m in paros_por_fecha(machine).items()
+            if not ((desde and f < desde) or (hasta and f > hasta))}
+
+
+if __name__ == "__main__":
+    dias = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    for m in config.MACHINES:
+        res = archivar(m, dias)
+        print(f"{m['id']}: {res['oee']} filas de producción y {res['down']} paros archivados")
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Estado en memoria de una máquina para la pantalla de captura.
+
+Al abrir la máquina (``App.go_oee``) se arma una vez desde sus rollups y su
+archivo: el acumulado de cada fecha, el conjunto ``(fecha, turno)`` ya
+registrado (vivo y archivado), el acumulado global con sus fechas y el
+promedio de la tabla diaria. Cambiar de fecha solo consulta diccionarios, y
+al guardar un turno la fila se suma aquí mismo sin volver a leer nada. Lo
+que guarden otras terminales entra la próxima vez que se abra la máquina.
+"""
+
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+
+import archive
+import config
+import csv_utils
+import metrics
+import rollup
+from columnar import entero
+
+
+class EstadoMaquina:
+    """Acumulados por fecha, turnos registrados y totales de una máquina."""
+
+    def __init__(self, machine):
+        self.machine = machine
+        partes = rollup.produccion(machine)
+        grupos: Dict[str, list] = {}
+        for i, p in enumerate(partes):
+            for f, turnos in p.por_fecha.items():
+                lst = grupos.setdefault(f, [])
+                for t, acc in turnos.items():
+                    lst.append((i, acc.ciclo_pos, t, acc))
+        self.dias: Dict[str, rollup.Acumulado] = {}
+        self.turnos: Set[Tuple[str, int]] = set()
+        for f, lst in grupos.items():
+            a = self.dias[f] = rollup.Acumulado()
+            for _, _, t, acc in sorted(lst, key=lambda g: g[:2]):
+                a.sumar(acc)
+                self.turnos.add((f, t))
+        self.total, self.fechas = rollup.acumulado_total(partes)
+        self.pos = sum(p.total.registros for p in partes)
+        self.archivado = archive.resumen_produccion(machine)
+        if len(self.archivado):
+            fechas = np.datetime_as_string(self.archivado.fecha, unit="D").tolist()
+            self.turnos.update(zip(fechas, self.archivado.turno.tolist()))
+        self.promedio_hist = metrics.promedio_oee_daily(config.DAILY_CSV_GLOBAL)
+
+    def acum_dia(self, fecha_iso: str) -> Dict[str, object]:
+        """Como ``metrics.acum_por_fecha_maquina``."""
+        return metrics.resumen_dia(self.dias.get(fecha_iso) or rollup.Acumulado())
+
+    def acum_global(self) -> Dict[str, object]:
+        """Como ``metrics.acum_global_maquina``."""
+        return metrics.resumen_global(self.total, self.fechas, self.archivado)
+
+    def turno_registrado(self, fecha_iso: str, turno: int) -> bool:
+        return (fecha_iso, int(turno)) in self.turnos
+
+    def registrar(self, row: Dict[str, str]) -> None:
+        """Suma una fila recién guardada (campos de ``csv_utils.OEE_FIELDS``)."""
+        f = row.get("fecha") or ""
+        a = self.dias.get(f)
+        if a is None:
+            a = self.dias[f] = rollup.Acumulado()
+        a.agregar(row, self.pos)
+        self.total.agregar(row, self.pos)
+        self.pos += 1
+        if f:
+            self.fechas.add(f)
+            self.turnos.add((f, entero(row.get("turno"))))
+        self.promedio_hist = metrics.promedio_oee_daily(config.DAILY_CSV_GLOBAL)
+
+
+_ESTADOS: Dict[str, EstadoMaquina] = {}
+_LOCK = threading.Lock()
+
+
+def cargar(machine) -> EstadoMaquina:
+    """Arma (o rearma) el estado de ``machine``; se llama al abrirla en captura."""
+    csv_utils.asegurar_archivos_maquina(machine)
+    e = EstadoMaquina(machine)
+    with _LOCK:
+        _ESTADOS[machine["id"]] = e
+    return e
+
+
+def estado(machine) -> Optional[EstadoMaquina]:
+    """Estado ya cargado de ``machine`` o ``None``."""
+    e = _ESTADOS.get(machine["id"])
+    return e if e is not None and e.machine is machine else None
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""Historial de producción por máquina en columnas NumPy.
+
+Cada log ``oee_<id>.csv`` (o cada shard mensual) se convierte una sola vez en
+columnas tipadas: conteos ``int32``, porcentajes ``float64`` (``NaN`` si la
+celda está vacía; en ``float32`` el redondeo a 2 decimales de los resúmenes
+cambiaría en los empates), fechas ``datetime64[D]`` y códigos enteros para
+``operador``, ``molde`` y ``parte`` (vocabulario compartido por todo el
+proceso, así los códigos de distintas máquinas son comparables). Las filas
+nuevas que entrega el lector incremental se agregan sin reconstruir.
+"""
+
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import csv_utils
+
+_NAT = np.datetime64("NaT", "D")
+
+
+class Vocabulario:
+    """Codificación de diccionario ``texto <-> código``."""
+
+    def __init__(self):
+        self.codigos: Dict[str, int] = {}
+        self.valores: List[str] = []
+
+    def codigo(self, valor: str) -> int:
+        c = self.codigos.get(valor)
+        if c is None:
+            c = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return c
+
+    def buscar(self, valor: str) -> int:
+        """Código de ``valor`` o -1 si nunca apareció."""
+        return self.codigos.get(valor, -1)
+
+
+VOCAB = {"operador": Vocabulario(), "molde": Vocabulario(), "parte": Vocabulario()}
+VOCAB_LOCK = threading.Lock()
+
+
+def entero(s) -> int:
+    """Entero tolerante (``"12,0"`` -> 12); 0 si no se puede leer."""
+    try:
+        return int(float(str(s).replace(",", ".").strip()))
+    except Exception:
+        return 0
+
+
+def flotante(s, vacio=np.nan) -> float:
+    """Número tolerante a coma decimal y ``%``; ``vacio`` si la celda está vacía, 0.0 si no se lee."""
+    if s in (None, ""):
+        return vacio
+    try:
+        return float(str(s).replace(",", ".").replace("%", "").strip())
+    except Exception:
+        return 0.0
+
+
+def redondear2(x) -> np.ndarray:
+    """Redondeo a 2 decimales como ``round`` (``np.round`` decide distinto algunos empates: 52.355)."""
+    return np.array([round(v, 2) for v in np.asarray(x, dtype=np.float64).tolist()], dtype=np.float64)
+
+
+def fecha_np(s):
+    """``datetime64[D]`` de un texto ISO; ``NaT`` si está vacío o no es fecha."""
+    try:
+        return np.datetime64(s, "D") if s else _NAT
+    except Exception:
+        return _NAT
+
+
+COLUMNAS = {
+    # nombre: (dtype, campo CSV, parser)
+    "fecha": ("datetime64[D]", "fecha", fecha_np),
+    "turno": (np.int8, "turno", entero),
+    "operador": (np.int32, "operador", None),
+    "molde": (np.int32, "molde", None),
+    "parte": (np.int32, "parte", None),
+    "ciclo_s": (np.float32, "ciclo_s", lambda s: flotante(s, 0.0)),
+    "horas_turno": (np.float32, "horas_turno", lambda s: flotante(s, 0.0)),
+    "paro_min": (np.float32, "tiempo_paro_min", lambda s: flotante(s, 0.0)),
+    "meta": (np.int32, "meta_oper_pzs", entero),
+    "total": (np.int32, "total_pzs", entero),
+    "scrap": (np.int32, "scrap_pzs", entero),
+    "buenas": (np.int32, "buenas_pzs", entero),
+    "avail": (np.float64, "availability_%", flotante),
+    "perf": (np.float64, "performance_%", flotante),
+    "qual": (np.float64, "quality_%", flotante),
+    "oee": (np.float64, "oee_%", flotante),
+}
+
+
+class ColumnasProduccion:
+    """Columnas de un log de producción con capacidad amortizada."""
+
+    def __init__(self, capacidad: int = 0):
+        self.n = 0
+        self._cap = max(16, capacidad)
+        self._arr = {k: np.empty(self._cap, dtype=dt) for k, (dt, _, _) in COLUMNAS.items()}
+
+    def __len__(self):
+        return self.n
+
+    def __getattr__(self, nombre):
+        arr = self.__dict__.get("_arr")
+        if arr is not None and nombre in arr:
+            return arr[nombre][:self.n]
+        raise AttributeError(nombre)
+
+    def _crecer(self, extra: int) -> None:
+        need = self.n + extra
+        if need <= self._cap:
+            return
+        cap = max(need, self._cap * 2)
+        for k, a in self._arr.items():
+            b = np.empty(cap, dtype=a.dtype)
+            b[:self.n] = a[:self.n]
+            self._arr[k] = b
+        self._cap = cap
+
+    def agregar_filas(self, rows: List[Dict[str, str]]) -> None:
+        if not rows:
+            return
+        self._crecer(len(rows))
+        i0, i1 = self.n, self.n + len(rows)
+        with VOCAB_LOCK:
+            for k, (_, campo, parser) in COLUMNAS.items():
+                if parser is None:
+                    voc = VOCAB[k]
+                    vals = [voc.codigo(str(r.get(campo) or "").strip()) for r in rows]
+                else:
+                    vals = [parser(r.get(campo)) for r in rows]
+                self._arr[k][i0:i1] = vals
+        self.n = i1
+
+    @classmethod
+    def concatenar(cls, partes: List["ColumnasProduccion"]) -> "ColumnasProduccion":
+        if len(partes) == 1:
+            return partes[0]
+        n = sum(len(p) for p in partes)
+        out = cls(n)
+        if n:
+            for k in COLUMNAS:
+                out._arr[k][:n] = np.concatenate([getattr(p, k) for p in partes])
+        out.n = n
+        return out
+
+    def fechas_iso(self, mask=None) -> np.ndarray:
+        f = self.fecha if mask is None else self.fecha[mask]
+        return np.datetime_as_string(f, unit="D")
+
+
+class _Entrada:
+    __slots__ = ("rows", "lectura", "consumidas", "cols")
+
+    def __init__(self):
+        self.rows = None           # CSV: lista del lector incremental
+        self.lectura = None        # SQLite: ``csv_utils.lectura_log``
+        self.consumidas = 0
+        self.cols = ColumnasProduccion()
+
+
+_CACHE: Dict[str, _Entrada] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def columnas_archivo(path: str) -> ColumnasProduccion:
+    """Columnas en caché de un archivo físico del log (sin filas encoladas)."""
+    lectura = None
+    if csv_utils.almacen_sqlite() is not None:
+        rows, lectura = csv_utils.lectura_log(path)
+    else:
+        rows = csv_utils.leer_log_maquina(path, pendientes=False)
+    with _CACHE_LOCK:
+        e = _CACHE.get(path)
+        # el lector incremental extiende la misma lista; otra lista (CSV) u otro
+        # número de lectura (SQLite) = el log se releyó completo
+        releido = e is None or (e.lectura != lectura if lectura is not None else e.rows is not rows)
+        if releido or len(rows) < e.consumidas:
+            e = _CACHE[path] = _Entrada()
+            e.rows, e.lectura = rows, lectura
+        if len(rows) > e.consumidas:
+            e.cols.agregar_filas(rows[e.consumidas:])
+            e.consumidas = len(rows)
+        return e.cols
+
+
+def columnas_log(path: str, desde: Optional[str] = None, hasta: Optional[str] = None) -> ColumnasProduccion:
+    """Columnas del log ``path``; con particiones solo las de ``[desde, hasta]``.
+
+    Las filas aún encoladas (write_journal) se agregan al final sin caché.
+    """
+    partes = [columnas_archivo(p) for p in csv_utils.fuentes_log(path, desde, hasta)]
+    pendientes = csv_utils.filas_pendientes(path)
+    if pendientes:
+        partes.append(columnas_de_filas(pendientes))
+    return ColumnasProduccion.concatenar(partes)
+
+
+def columnas_maquina(machine, desde: Optional[str] = None, hasta: Optional[str] = None) -> ColumnasProduccion:
+    return columnas_log(machine["oee_csv"], desde, hasta)
+
+
+def columnas_de_filas(rows: List[Dict[str, str]]) -> ColumnasProduccion:
+    """Columnas para una lista de filas arbitraria (sin caché)."""
+    cols = ColumnasProduccion(len(rows))
+    cols.agregar_filas(rows)
+    return cols
+
+
+class Vista:
+    """Columnas ``[i0:]`` de un ``ColumnasProduccion`` sin copiar."""
+
+    def __init__(self, cols: ColumnasProduccion, i0: int):
+        self._cols = cols
+        self._i0 = i0
+
+    def __len__(self):
+        return len(self._cols) - self._i0
+
+    def __getattr__(self, nombre):
+        return getattr(self._cols, nombre)[self._i0:]
+
+
+class Fuentes:
+    """Archivos físicos de uno o más logs ya sumados a un índice incremental.
+
+    Por archivo se guarda ``[objeto, filas consumidas]``, donde el objeto es
+    la lista del lector incremental o sus columnas (``columnas=True``). Si un
+    archivo solo creció, el lector entrega el mismo objeto más largo y basta
+    sumar lo nuevo; otro objeto o menos filas quiere decir que se reescribió
+    y el índice se rehace. Las filas encoladas (write_journal) no se
+    consumen: ``pendientes`` las da para sumarlas en cada consulta.
+    """
+
+    def __init__(self, columnas: bool = True):
+        self.columnas = columnas
+        self.vistos: Dict[str, list] = {}
+
+    def leer(self, logs: Sequence[str]) -> Dict[str, object]:
+        """Objeto actual de cada archivo físico de ``logs``."""
+        if self.columnas:
+            return {p: columnas_archivo(p) for log in logs for p in csv_utils.fuentes_log(log)}
+        return {p: csv_utils.leer_log_maquina(p, pendientes=False)
+                for log in logs for p in csv_utils.fuentes_log(log)}
+
+    def vigente(self, actuales: Dict[str, object]) -> bool:
+        """``True`` si todo lo consumido sigue igual en ``actuales``."""
+        return set(self.vistos) <= set(actuales) and all(
+            actuales[p] is obj and len(actuales[p]) >= n for p, (obj, n) in self.vistos.items())
+
+    def reiniciar(self) -> None:
+        self.vistos = {}
+
+    def nuevas(self, actuales: Dict[str, object]) -> Iterator[Tuple[str, object]]:
+        """``(archivo, filas o columnas sin consumir)``; quedan consumidas al pedir la siguiente."""
+        for p, obj in actuales.items():
+            e = self.vistos.setdefault(p, [obj, 0])
+            if len(obj) > e[1]:
+                yield p, (Vista(obj, e[1]) if self.columnas else obj[e[1]:])
+                e[1] = len(obj)
+
+    def pendientes(self, logs: Sequence[str]):
+        """Filas encoladas de ``logs`` (en columnas si ``columnas``); ``None`` si no hay."""
+        filas: List[Dict[str, str]] = []
+        for log in logs:
+            filas.extend(csv_utils.filas_pendientes(log))
+        if not filas:
+            return None
+        return columnas_de_filas(filas) if self.columnas else filas
+
+
+def mascara_rango(cols: ColumnasProduccion, desde: Optional[str], hasta: Optional[str]) -> np.ndarray:
+    mask = ~np.isnat(cols.fecha)
+    d, h = fecha_np(desde), fecha_np(hasta)
+    if not np.isnat(d):
+        mask &= cols.fecha >= d
+    if not np.isnat(h):
+        mask &= cols.fecha <= h
+    return mask
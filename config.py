@@ -20,6 +20,25 @@ MACHINES = [
     },
 ]
 
+# Almacenamiento: "csv" (un archivo por tabla en BASE_DIR) o "sqlite"
+# (una sola base WAL con las mismas tablas, ver sqlite_store.py).
+STORAGE_BACKEND = os.environ.get("MEFRUP_STORAGE", "csv").strip().lower()
+SQLITE_DB = os.path.join(BASE_DIR, "mefrup.db")
+
+# Logs de máquina partidos por mes: oee_<id>/AAAA-MM.csv y down_<id>/AAAA-MM.csv
+PARTICION_MENSUAL = os.environ.get("MEFRUP_PARTICION", "").strip().lower() == "mensual"
+
+# Bitácora local de escrituras diferidas (ver write_journal.py). Va en el
+# disco del equipo, no junto a los CSV, para no depender de la red ni de
+# que el archivo destino esté libre.
+JOURNAL_DIR = os.environ.get("MEFRUP_JOURNAL_DIR") or os.path.join(os.path.expanduser("~"), ".mefrup", "journal")
+
+# Archivo anual comprimido de producción y paros (ver archive.py): lo más
+# viejo que el horizonte sale de los logs vivos y queda resumido por día,
+# turno y molde.
+ARCHIVE_DIR = os.path.join(BASE_DIR, "archivo")
+ARCHIVO_HORIZONTE_DIAS = int(os.environ.get("MEFRUP_ARCHIVO_DIAS") or 400)
+
 DAILY_CSV_GLOBAL = os.path.join(BASE_DIR, "oee_daily.csv")
 DAILY_CSV_INJECTOR = os.path.join(BASE_DIR, "oee_inyeccion_daily.csv")
 
@@ -40,6 +59,9 @@ CLIENTS_CSV = os.path.join(BASE_DIR, "clients.csv")
 
 OPERADORES = ["OPERADOR 1", "OPERADOR 2", "OPERADOR 3"]
 TURNOS_HORAS = {1: 8, 2: 8, 3: 8}
+# Hora de inicio de cada turno; el 3 termina al día siguiente pero cuenta en
+# la fecha en que empieza (ver interval_index.py).
+TURNOS_INICIO = {1: "06:00", 2: "14:00", 3: "22:00"}
 DIAS_ES = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
 
 TICK_MS = 1000
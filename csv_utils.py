@@ -2,31 +2,591 @@
 """Utility helpers for dealing with CSV files."""
 
 import csv
+import io
+import itertools
 import os
-from typing import List, Dict
+import random
+import threading
+import time
+from typing import Any, Callable, List, Dict, Iterable, Optional, Tuple
 import config # <-- CAMBIO IMPORTANTE
+from daily_store import DAILY_FIELDS, escribir_atomico, fila_daily, store_diario
+from file_lock import ESPERA_S, ConflictoVersion, bloqueo_csv, subir_version, version_csv
+
+# ===== Caché de filas parseadas (por ruta, validada por mtime_ns + tamaño) =====
+_CACHE: Dict[str, Tuple[Tuple[int, int], List[Dict[str, str]]]] = {}
+_CACHE_LOCK = threading.Lock()
+# registros tipados derivados de las filas: (ruta, fábrica) -> (firma, registros)
+_REGISTROS: Dict[Tuple[str, Callable], Tuple[Tuple[int, int], List[Any]]] = {}
+_CACHE_STATS = {"hits": 0, "misses": 0, "tail_completas": 0, "tail_incrementales": 0}
+
+
+def firma_archivo(path: str) -> Optional[Tuple[int, int]]:
+    """``(mtime_ns, tamaño)`` de ``path``; ``None`` si no existe."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def invalidar_cache(path: Optional[str] = None) -> None:
+    """Descarta las filas cacheadas de ``path`` (o de todos los archivos)."""
+    with _CACHE_LOCK:
+        if path is None:
+            _CACHE.clear()
+            _REGISTROS.clear()
+        else:
+            key = os.path.abspath(path)
+            _CACHE.pop(key, None)
+            for k in [k for k in _REGISTROS if k[0] == key]:
+                del _REGISTROS[k]
+
+
+def cache_stats() -> Dict[str, int]:
+    """Contadores de la caché de ``leer_csv_dict`` y del lector incremental."""
+    with _CACHE_LOCK:
+        return dict(_CACHE_STATS, entradas=len(_CACHE), logs=len(_TAILS))
+
+
+# ===== Lector incremental (tail) para logs de máquina de solo-agregar =====
+class _TailState:
+    __slots__ = ("header_line", "fieldnames", "offset", "mtime_ns", "ino", "cola", "rows", "marca", "lectura")
+
+    def __init__(self):
+        self.header_line = b""
+        self.fieldnames: List[str] = []
+        self.offset = 0
+        self.mtime_ns = 0
+        self.ino = 0
+        self.cola = b""        # últimos bytes ya leídos, para notar una reescritura que creció
+        self.rows: List[Dict[str, str]] = []
+        self.marca = None      # solo SQLite: marca de ``SqliteStore.leer_desde``
+        self.lectura = 0       # solo SQLite: cambia cada vez que ``rows`` se rehace
+
+
+_TAILS: Dict[str, _TailState] = {}
+_TAIL_LOCK = threading.Lock()
+_LECTURAS = itertools.count(1)
+_COLA = 64
+
+
+def olvidar_cache(path: Optional[str] = None) -> None:
+    """Descarta las filas en caché de ``path`` (de todos los archivos sin ``path``)."""
+    with _TAIL_LOCK:
+        if path is None:
+            _TAILS.clear()
+        else:
+            _TAILS.pop(os.path.abspath(path), None)
+
+
+def parsear_lineas(data: bytes, fieldnames: List[str]) -> List[Dict[str, str]]:
+    """Filas de un bloque de líneas CSV completas (sin encabezado)."""
+    return list(csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""), fieldnames=fieldnames))
+
+
+def _tail_completo(f, size: int) -> Optional[_TailState]:
+    data = f.read(size)
+    fin = data.rfind(b"\n") + 1
+    if fin <= 0:
+        return None
+    st = _TailState()
+    nl = data.find(b"\n")
+    st.header_line = data[:nl + 1]
+    st.fieldnames = next(csv.reader(io.StringIO(st.header_line.decode("utf-8"), newline="")), [])
+    if not st.fieldnames:
+        return None
+    st.rows = parsear_lineas(data[nl + 1:fin], st.fieldnames)
+    st.offset = fin
+    st.cola = data[max(0, fin - _COLA):fin]
+    return st
+
+
+def _solo_crecio(f, stat, st: _TailState) -> bool:
+    # mismo archivo (inodo), mismo encabezado y lo ya leído intacto: solo se agregaron líneas
+    if stat.st_size <= st.offset or (st.ino and stat.st_ino and st.ino != stat.st_ino):
+        return False
+    if f.read(len(st.header_line)) != st.header_line:
+        return False
+    f.seek(st.offset - len(st.cola))
+    return f.read(len(st.cola)) == st.cola
+
+
+def _leer_tail(path: str) -> List[Dict[str, str]]:
+    key = os.path.abspath(path)
+    try:
+        stat = os.stat(key)
+    except OSError:
+        olvidar_cache(key)
+        return []
+    size = stat.st_size
+    with _TAIL_LOCK:
+        st = _TAILS.get(key)
+        if st is not None and size == st.offset and stat.st_mtime_ns == st.mtime_ns:
+            return st.rows
+        try:
+            with open(key, "rb") as f:
+                if st is not None and _solo_crecio(f, stat, st):
+                    f.seek(st.offset)
+                    data = f.read(size - st.offset)
+                    fin = data.rfind(b"\n") + 1
+                    if fin > 0:
+                        st.rows.extend(parsear_lineas(data[:fin], st.fieldnames))
+                        st.offset += fin
+                        st.cola = (st.cola + data[:fin])[-_COLA:]
+                    st.mtime_ns = stat.st_mtime_ns
+                    _CACHE_STATS["tail_incrementales"] += 1
+                    return st.rows
+                f.seek(0)
+                st = _tail_completo(f, size)
+        except (IOError, UnicodeDecodeError, csv.Error):
+            st = None
+        _CACHE_STATS["tail_completas"] += 1
+        if st is None:
+            _TAILS.pop(key, None)
+            return []
+        st.mtime_ns, st.ino = stat.st_mtime_ns, stat.st_ino
+        _TAILS[key] = st
+        return st.rows
+
+
+def _leer_tail_sqlite(db, path: str) -> Tuple[List[Dict[str, str]], int]:
+    """Como ``_leer_tail`` en SQLite: solo se piden las filas con rowid nuevo."""
+    key = os.path.abspath(path)
+    with _TAIL_LOCK:
+        st = _TAILS.get(key)
+        rows, marca, completa = db.leer_desde(path, st.marca if st is not None else None)
+        if st is None or completa:
+            st = _TAILS[key] = _TailState()
+            st.rows, st.lectura = rows, next(_LECTURAS)
+            _CACHE_STATS["tail_completas"] += 1
+        elif rows:
+            st.rows.extend(rows)
+            _CACHE_STATS["tail_incrementales"] += 1
+        st.marca = marca
+        return st.rows, st.lectura
+
+
+# ===== Particiones mensuales de logs de máquina =====
+OEE_FIELDS = [
+    "timestamp", "fecha", "operador", "turno", "molde", "parte",
+    "ciclo_s", "horas_turno", "tiempo_paro_min", "meta_oper_pzs",
+    "total_pzs", "scrap_pzs", "buenas_pzs", "availability_%",
+    "performance_%", "quality_%", "oee_%",
+]
+DOWN_FIELDS = ["fecha", "inicio_ts", "fin_ts", "duracion_seg", "motivo", "nota", "operador", "turno", "molde"]
+
+
+def _campos_log(path: str) -> Optional[List[str]]:
+    """Encabezado si ``path`` es un log de máquina, si no ``None``."""
+    ap = os.path.abspath(path)
+    for m in config.MACHINES:
+        if ap == os.path.abspath(m["oee_csv"]):
+            return OEE_FIELDS
+        if ap == os.path.abspath(m["down_csv"]):
+            return DOWN_FIELDS
+    return None
+
+
+def particionado(path: str) -> bool:
+    """``True`` si ``path`` es un log que se guarda en shards mensuales."""
+    return config.PARTICION_MENSUAL and _campos_log(path) is not None
+
+
+def dir_particiones(path: str) -> str:
+    return os.path.splitext(path)[0]
+
+
+def ruta_particion(path: str, fecha_iso: str) -> str:
+    mes = (fecha_iso or "")[:7] or "sin-fecha"
+    return os.path.join(dir_particiones(path), f"{mes}.csv")
+
+
+def particiones_log(path: str, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[str]:
+    """Shards mensuales de ``path`` que se traslapan con ``[desde, hasta]``."""
+    d = dir_particiones(path)
+    try:
+        nombres = sorted(n for n in os.listdir(d) if n.endswith(".csv"))
+    except OSError:
+        return []
+    out = []
+    for n in nombres:
+        mes = n[:-4]
+        if desde and mes < desde[:7]:
+            continue
+        if hasta and mes > hasta[:7]:
+            continue
+        out.append(os.path.join(d, n))
+    return out
+
+
+def fuentes_log(path: str, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[str]:
+    """Archivos físicos que contienen el log ``path`` (shards del rango o el propio archivo)."""
+    if almacen_sqlite() is None and particionado(path):
+        return particiones_log(path, desde, hasta)
+    return [path]
+
+
+def leer_log_maquina(path: str, pendientes: bool = True) -> List[Dict[str, str]]:
+    """Lee un log de solo-agregar (``oee_<id>.csv`` / ``down_<id>.csv``).
+
+    Recuerda el offset en bytes y las filas ya parseadas de cada archivo y
+    solo parsea las líneas agregadas desde la última lectura. Vuelve a leer
+    todo si el archivo se achicó o su encabezado cambió. En SQLite se piden
+    solo las filas con rowid posterior a la última lectura (todas si la
+    tabla se reescribió). La lista devuelta es compartida: los llamadores no
+    deben modificarla. Con ``pendientes`` incluye al final las filas
+    encoladas que aún no llegan al archivo.
+    """
+    db = almacen_sqlite()
+    if db is not None:
+        rows = _leer_tail_sqlite(db, path)[0]
+    elif particionado(path):
+        rows = []
+        for p in particiones_log(path):
+            rows.extend(_leer_tail(p))
+    else:
+        rows = _leer_tail(path)
+    extra = filas_pendientes(path) if pendientes else []
+    return rows + extra if extra else rows
+
+
+def lectura_log(path: str) -> Tuple[List[Dict[str, str]], int]:
+    """Solo SQLite: filas de ``leer_log_maquina(path, pendientes=False)`` y el
+    número de lectura de esa lista compartida. El número cambia cuando la
+    tabla se reescribió y la lista se rehízo; mientras no cambie, la lista
+    solo crece y basta procesar las filas posteriores a las ya vistas.
+    """
+    return _leer_tail_sqlite(almacen_sqlite(), path)
+
+
+def leer_log_rango(path: str, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[Dict[str, str]]:
+    """Filas del log con ``desde <= fecha <= hasta``.
+
+    Con particiones mensuales solo se abren los shards del rango; en SQLite
+    se filtra por el índice de ``fecha``.
+    """
+    db = almacen_sqlite()
+    if db is not None:
+        conds, args = ["fecha <> ''"], []
+        if desde:
+            conds.append("fecha >= ?"); args.append(desde)
+        if hasta:
+            conds.append("fecha <= ?"); args.append(hasta)
+        out = db.leer(path, " AND ".join(conds), tuple(args))
+        fuentes = []
+    elif particionado(path):
+        out, fuentes = [], particiones_log(path, desde, hasta)
+    else:
+        out, fuentes = [], [path]
+    for filas in [_leer_tail(p) for p in fuentes] + [filas_pendientes(path)]:
+        for r in filas:
+            f = r.get("fecha")
+            if not f:
+                continue
+            if desde and f < desde:
+                continue
+            if hasta and f > hasta:
+                continue
+            out.append(r)
+    return out
+
+
+def _agregar_particionado(path: str, rows: List[List]) -> None:
+    idx = _campos_log(path).index("fecha")
+    por_shard: Dict[str, List[List]] = {}
+    for row in rows:
+        fecha = str(row[idx]) if len(row) > idx else ""
+        por_shard.setdefault(ruta_particion(path, fecha), []).append(row)
+    for shard, filas in por_shard.items():
+        os.makedirs(os.path.dirname(shard), exist_ok=True)
+        nuevo = not os.path.exists(shard) or os.path.getsize(shard) == 0
+        with open(shard, "a", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            if nuevo:
+                w.writerow(_campos_log(path))
+            w.writerows(filas)
+        invalidar_cache(shard)
+
+
+def _reescribir_particionado(path: str, rows: Iterable[Dict[str, str]]) -> None:
+    campos = _campos_log(path)
+    por_shard: Dict[str, List[Dict[str, str]]] = {}
+    for r in rows:
+        por_shard.setdefault(ruta_particion(path, r.get("fecha", "")), []).append(r)
+    for shard in particiones_log(path):
+        por_shard.setdefault(shard, [])
+    for shard, filas in por_shard.items():
+        os.makedirs(os.path.dirname(shard), exist_ok=True)
+        try:
+            reemplazar_csv(shard, campos, filas)
+        finally:
+            invalidar_cache(shard)
+            olvidar_cache(shard)
+
+
+def particionar_log(path: str) -> int:
+    """Mueve las filas de un log plano a sus shards mensuales.
+
+    El archivo original se conserva como ``<path>.premensual.bak``; si no se
+    pudo leer (bloqueado, dañado) queda donde está y se reintenta la próxima
+    vez. Devuelve el número de filas migradas.
+    """
+    rows = parsear_csv(path)
+    if rows is None:
+        return 0
+    campos = _campos_log(path)
+    if rows:
+        _agregar_particionado(path, [[r.get(k, "") for k in campos] for r in rows])
+    if os.path.exists(path):
+        os.replace(path, path + ".premensual.bak")
+    invalidar_cache(path)
+    olvidar_cache(path)
+    return len(rows)
+
+
+def almacen_sqlite():
+    """Devuelve el almacén SQLite si es el backend activo, si no ``None``."""
+    if config.STORAGE_BACKEND != "sqlite":
+        return None
+    import sqlite_store
+    return sqlite_store.store()
+
 
 def asegurar_csv(path: str, header: List[str]) -> None:
     """Ensure a CSV file exists with the provided header."""
+    db = almacen_sqlite()
+    if db is not None:
+        db.asegurar(path, header)
+        return
     try:
         if not os.path.exists(path) or os.path.getsize(path) == 0:
              with open(path, "w", newline="", encoding="utf-8") as f:
                 csv.writer(f).writerow(header)
+             invalidar_cache(path)
+             olvidar_cache(path)
     except (IOError, FileExistsError):
         pass
 
-def leer_csv_dict(path: str) -> List[Dict[str, str]]:
-    if not os.path.exists(path):
-        return []
+def parsear_csv(path: str) -> Optional[List[Dict[str, str]]]:
+    """Todas las filas de ``path`` sin caché; ``None`` si no se pudo leer."""
     try:
         with open(path, "r", newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f)
             if not reader.fieldnames:
                 return []
             return list(reader)
+    except (IOError, UnicodeDecodeError, csv.Error):
+        return None
+
+
+def leer_csv_dict(path: str, pendientes: bool = True) -> List[Dict[str, str]]:
+    """Lee ``path`` como lista de dicts.
+
+    Las filas parseadas se cachean por ruta y se reutilizan mientras
+    ``(mtime_ns, tamaño)`` no cambie. Se devuelven copias de cada fila para
+    que los llamadores puedan modificarlas sin contaminar la caché. Con
+    ``pendientes`` se agregan las filas encoladas que aún no se escriben.
+    """
+    extra = filas_pendientes(path) if pendientes else []
+    db = almacen_sqlite()
+    if db is not None:
+        return db.leer(path) + extra
+    key = os.path.abspath(path)
+    firma = firma_archivo(key)
+    if firma is None:
+        return extra
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None and hit[0] == firma:
+            _CACHE_STATS["hits"] += 1
+            return [dict(r) for r in hit[1]] + extra
+        _CACHE_STATS["misses"] += 1
+    rows = parsear_csv(key)
+    if rows is None:
+        return extra
+    # solo cachear si el archivo no cambió mientras se leía
+    if firma_archivo(key) == firma:
+        with _CACHE_LOCK:
+            _CACHE[key] = (firma, rows)
+    return [dict(r) for r in rows] + extra
+
+
+def leer_registros(path: str, fabrica: Callable[[Dict[str, str]], Any], pendientes: bool = True) -> List[Any]:
+    """Filas de ``path`` convertidas con ``fabrica`` una sola vez por versión.
+
+    La lista devuelta es compartida entre llamadas: no modificarla. Con
+    ``pendientes=False`` no se agregan las filas encoladas y, mientras el
+    archivo no cambie, se devuelve siempre la misma lista.
+    """
+    extra = [fabrica(r) for r in filas_pendientes(path)] if pendientes else []
+    db = almacen_sqlite()
+    if db is not None:
+        return [fabrica(r) for r in db.leer(path)] + extra
+    key = os.path.abspath(path)
+    firma = firma_archivo(key)
+    if firma is None:
+        return extra
+    with _CACHE_LOCK:
+        hit = _REGISTROS.get((key, fabrica))
+        if hit is not None and hit[0] == firma:
+            _CACHE_STATS["hits"] += 1
+            return hit[1] + extra if extra else hit[1]
+    regs = [fabrica(r) for r in leer_csv_dict(key, pendientes=False)]
+    if firma_archivo(key) == firma:
+        with _CACHE_LOCK:
+            _REGISTROS[(key, fabrica)] = (firma, regs)
+    return regs + extra if extra else regs
+
+
+def agregar_fila_csv(path: str, row: Iterable) -> None:
+    """Agrega una fila al final de ``path`` e invalida su caché."""
+    agregar_filas_csv(path, [row])
+
+
+def agregar_filas_csv(path: str, rows: Iterable[Iterable], espera: float = ESPERA_S) -> None:
+    """Agrega varias filas con una sola apertura del archivo.
+
+    Toma el candado de ``path`` (hasta ``espera`` segundos) y sube su versión.
+    """
+    rows = [list(r) for r in rows]
+    with bloqueo_csv(path, espera):
+        db = almacen_sqlite()
+        if db is not None:
+            db.agregar_muchas(path, rows)
+        elif particionado(path):
+            _agregar_particionado(path, rows)
+        else:
+            try:
+                with open(path, "a", newline="", encoding="utf-8") as f:
+                    csv.writer(f).writerows(rows)
+            finally:
+                invalidar_cache(path)
+        subir_version(path)
+
+
+def encolar_fila_csv(path: str, row: Iterable) -> None:
+    """Como ``agregar_fila_csv`` pero sin bloquear (ver write_journal.py).
+
+    La fila queda en la bitácora local y los lectores de este módulo la ven
+    de inmediato aunque el archivo destino esté en uso.
+    """
+    import write_journal
+    write_journal.journal().encolar(path, row)
+
+
+def filas_pendientes(path: str, ids: Optional[List[int]] = None) -> List[Dict[str, str]]:
+    """Filas encoladas para ``path`` que aún no llegan al archivo.
+
+    Si se da ``ids``, se le agregan los ids de esas filas en la bitácora
+    (para ``escribir_csv_dict(..., pendientes=ids)``).
+    """
+    import write_journal
+    wj = write_journal.activo()
+    rows = wj.pendientes(path, ids) if wj is not None else []
+    if not rows:
+        return []
+    campos = encabezado_csv(path)
+    return [{k: (row[i] if i < len(row) else "") for i, k in enumerate(campos)} for row in rows]
+
+
+def encabezado_csv(path: str) -> List[str]:
+    """Columnas de ``path`` (logs de máquina, tabla SQLite o primera línea del CSV)."""
+    campos = _campos_log(path)
+    if campos:
+        return campos
+    db = almacen_sqlite()
+    if db is not None:
+        return db.columnas_de(path)
+    try:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), [])
     except (IOError, csv.Error):
         return []
 
+
+def escribir_csv_dict(path: str, fieldnames: List[str], rows: Iterable[Dict[str, str]],
+                      pendientes: Iterable[int] = ()) -> None:
+    """Reescribe ``path`` completo con ``rows`` e invalida su caché.
+
+    Escribe a ciegas: si las filas salen de una lectura previa y otra terminal
+    pudo escribir entretanto, usar ``actualizar_csv``. ``pendientes`` son los
+    ids de las filas encoladas que ``rows`` ya incluye (ver
+    ``filas_pendientes``); esas salen de la cola y las demás se siguen
+    agregando después.
+    """
+    with bloqueo_csv(path):
+        db = almacen_sqlite()
+        if db is not None:
+            db.reescribir(path, fieldnames, rows)
+        elif particionado(path):
+            _reescribir_particionado(path, rows)
+        else:
+            try:
+                reemplazar_csv(path, fieldnames, list(rows))
+            finally:
+                invalidar_cache(path)
+                olvidar_cache(path)
+        subir_version(path)
+        _descartar_pendientes(path, pendientes)
+
+
+def reemplazar_csv(path: str, fieldnames: List[str], rows: List[Dict[str, str]]) -> None:
+    """Reescribe ``path`` completo de forma atómica (el candado lo toma quien llama)."""
+    # temporal + replace: otra terminal que lee sin candado nunca ve el archivo a medias.
+    # En Windows el replace falla mientras alguien lo tiene abierto: se reintenta un momento.
+    for i in range(20):
+        try:
+            escribir_atomico(path, fieldnames, rows)
+            return
+        except PermissionError:
+            if i == 19:
+                raise
+            time.sleep(0.05)
+
+
+def actualizar_csv(path: str, fieldnames: List[str],
+                   mutar: Callable[[List[Dict[str, str]]], List[Dict[str, str]]],
+                   intentos: int = 5) -> Optional[List[Dict[str, str]]]:
+    """Lectura-modificación-escritura optimista de ``path``.
+
+    ``mutar`` recibe las filas actuales y devuelve las filas a guardar (o
+    ``None`` si no hay nada que cambiar). Si la versión del archivo cambió
+    entre la lectura y la escritura (otra terminal guardó), se vuelve a leer
+    y a aplicar ``mutar`` sobre las filas nuevas en lugar de pisarlas.
+    Devuelve las filas guardadas.
+    """
+    for _ in range(intentos):
+        ver = version_csv(path)
+        invalidar_cache(path)  # la firma mtime/tamaño no basta entre equipos
+        ids: List[int] = []
+        # si el escritor diferido agrega algo entre estas dos lecturas, sube la versión
+        rows = mutar(leer_csv_dict(path, pendientes=False) + filas_pendientes(path, ids))
+        if rows is None:
+            return None
+        with bloqueo_csv(path):
+            if version_csv(path) == ver:
+                escribir_csv_dict(path, fieldnames, rows, ids)
+                return rows
+        time.sleep(random.uniform(0.01, 0.1))
+    raise ConflictoVersion(f"{os.path.basename(path)} cambió en cada uno de {intentos} intentos")
+
+
+def _descartar_pendientes(path: str, ids: Iterable[int]) -> None:
+    # las filas encoladas que el llamador leyó ya quedaron en el archivo
+    ids = list(ids)
+    if not ids:
+        return
+    import write_journal
+    wj = write_journal.activo()
+    if wj is not None:
+        wj.descartar(path, ids)
+
+PLANNING_FIELDS = ["orden", "parte", "molde_id", "maquina_id", "qty_total", "inicio_ts", "fin_est_ts", "setup_min", "estado", "ciclo_s", "cav_on"]
+DELIV_FIELDS = ["orden", "due_date", "qty", "cumplido"]
+SHIPMENTS_FIELDS = ["orden", "ship_date", "qty", "destino", "nota", "approved", "entrega", "autoriza"]
+
+
 def leer_shipments() -> List[Dict[str, str]]:
     rows = leer_csv_dict(config.SHIPMENTS_CSV)
     for r in rows:
@@ -34,69 +594,56 @@ def leer_shipments() -> List[Dict[str, str]]:
             r["approved"] = "1"
     return rows
 
+def guardar_shipments(rows: List[Dict[str, str]]) -> None:
+    escribir_csv_dict(config.SHIPMENTS_CSV, SHIPMENTS_FIELDS, rows)
+
+
 def escribir_daily(path: str, fecha_iso: str, oee_pct: float, total: int, scrap: int, meta: int) -> None:
-    header = ["fecha", "oee_dia_%", "total_pzs", "scrap_pzs", "meta_pzs"]
+    """Upsert de la fila ``fecha_iso`` en la tabla diaria ``path``."""
+    header = DAILY_FIELDS
     asegurar_csv(path, header)
-    rows = leer_csv_dict(path)
-    
-    found = False
-    for r in rows:
-        if r.get("fecha") == fecha_iso:
-            r.update({
-                "oee_dia_%": f"{oee_pct:.2f}",
-                "total_pzs": str(total),
-                "scrap_pzs": str(scrap),
-                "meta_pzs": str(meta),
-            })
-            found = True
-            break
-    if not found:
-        rows.append({
-            "fecha": fecha_iso, "oee_dia_%": f"{oee_pct:.2f}",
-            "total_pzs": str(total), "scrap_pzs": str(scrap), "meta_pzs": str(meta),
-        })
-
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=header)
-        w.writeheader()
-        w.writerows(rows)
+    db = almacen_sqlite()
+    if db is not None:
+        db.upsert(path, "fecha", fila_daily(fecha_iso, oee_pct, total, scrap, meta))
+        return
+    store_diario(path).upsert(fecha_iso, oee_pct, total, scrap, meta)
+    invalidar_cache(path)
 
 def fechas_registradas(path_daily: str):
-    asegurar_csv(path_daily, ["fecha", "oee_dia_%", "total_pzs", "scrap_pzs", "meta_pzs"])
-    return {r["fecha"] for r in leer_csv_dict(path_daily) if r.get("fecha")}
+    asegurar_csv(path_daily, DAILY_FIELDS)
+    if almacen_sqlite() is not None:
+        return {r["fecha"] for r in leer_csv_dict(path_daily) if r.get("fecha")}
+    return store_diario(path_daily).fechas()
+
+
+def leer_daily(path_daily: str) -> List[Dict[str, str]]:
+    """Filas vigentes de una tabla diaria (una por fecha)."""
+    if almacen_sqlite() is not None:
+        return leer_csv_dict(path_daily)
+    return store_diario(path_daily).filas()
 
 def asegurar_archivos_basicos() -> None:
-    asegurar_csv(config.DAILY_CSV_GLOBAL, ["fecha", "oee_dia_%", "total_pzs", "scrap_pzs", "meta_pzs"])
-    asegurar_csv(config.DAILY_CSV_INJECTOR, ["fecha", "oee_dia_%", "total_pzs", "scrap_pzs", "meta_pzs"])
+    asegurar_csv(config.DAILY_CSV_GLOBAL, DAILY_FIELDS)
+    asegurar_csv(config.DAILY_CSV_INJECTOR, DAILY_FIELDS)
     asegurar_csv(
         config.RECIPES_CSV,
         ["molde_id", "parte", "ciclo_ideal_s", "cavidades", "cavidades_habilitadas", "scrap_esperado_pct", "activo"],
     )
     if not leer_csv_dict(config.RECIPES_CSV):
-        with open(config.RECIPES_CSV, "a", newline="", encoding="utf-8") as f:
-            w = csv.writer(f)
-            w.writerow(["48", "19-001-049", "45", "1", "1", "2", "1"])
-            w.writerow(["84", "19-001-084", "23", "1", "1", "2", "1"])
-    asegurar_csv(
-        config.PLANNING_CSV,
-        ["orden", "parte", "molde_id", "maquina_id", "qty_total", "inicio_ts", "fin_est_ts", "setup_min", "estado", "ciclo_s", "cav_on"],
-    )
-    asegurar_csv(config.DELIV_CSV, ["orden", "due_date", "qty", "cumplido"])
-    asegurar_csv(config.SHIPMENTS_CSV, ["orden", "ship_date", "qty", "destino", "nota", "approved", "entrega", "autoriza"])
+        agregar_fila_csv(config.RECIPES_CSV, ["48", "19-001-049", "45", "1", "1", "2", "1"])
+        agregar_fila_csv(config.RECIPES_CSV, ["84", "19-001-084", "23", "1", "1", "2", "1"])
+    asegurar_csv(config.PLANNING_CSV, PLANNING_FIELDS)
+    asegurar_csv(config.DELIV_CSV, DELIV_FIELDS)
+    asegurar_csv(config.SHIPMENTS_CSV, SHIPMENTS_FIELDS)
     asegurar_csv(config.PERSONNEL_CSV, ["nombre", "rol"])
     asegurar_csv(config.CLIENTS_CSV, ["nombre", "direccion", "contacto"])
 
 def asegurar_archivos_maquina(machine: Dict[str, str]) -> None:
-    asegurar_csv(
-        machine["oee_csv"],
-        [
-            "timestamp", "fecha", "operador", "turno", "molde", "parte",
-            "ciclo_s", "horas_turno", "tiempo_paro_min", "meta_oper_pzs",
-            "total_pzs", "scrap_pzs", "buenas_pzs", "availability_%",
-            "performance_%", "quality_%", "oee_%",
-        ],
-    )
-    asegurar_csv(
-        machine["down_csv"],
-        ["fecha", "inicio_ts", "fin_ts", "duracion_seg", "motivo", "nota", "operador", "turno", "molde"],
-    )
+    if config.PARTICION_MENSUAL and almacen_sqlite() is None:
+        for path in (machine["oee_csv"], machine["down_csv"]):
+            if os.path.exists(path):
+                particionar_log(path)
+            os.makedirs(dir_particiones(path), exist_ok=True)
+        return
+    asegurar_csv(machine["oee_csv"], OEE_FIELDS)
+    asegurar_csv(machine["down_csv"], DOWN_FIELDS)
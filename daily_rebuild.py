@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Reconstrucción completa de las tablas diarias desde los logs de producción.
+
+``oee_daily.csv`` y ``oee_inyeccion_daily.csv`` solo se escriben al guardar
+un turno (``_guardar``). Después de reparar o importar logs, este comando
+las regenera de una vez y sin interfaz: cada archivo físico del log (un
+shard mensual por máquina, o el log plano completo) se resume por fecha en
+un proceso aparte y luego se arman las dos tablas con las mismas reglas que
+captura:
+
+* global: el acumulado del día (``acum_por_fecha_maquina``) de la máquina
+  que guardó al último ese día (mayor ``timestamp``);
+* área: OEE promedio de todas las máquinas (``resumen_hoy_maquina``) y
+  sumas de piezas y meta.
+
+Las fechas que solo quedan en el archivo (``archive``) conservan su fila;
+las demás que ya no están en los logs se quitan.
+
+Uso: ``python daily_rebuild.py [procesos]``
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import archive
+import config
+import csv_utils
+import metrics
+import rollup
+import write_journal
+from daily_store import DAILY_FIELDS, fila_daily
+
+Resumen = Dict[str, Tuple[str, dict, dict]]   # fecha -> (último timestamp, acumulado del día, resumen del día)
+
+
+def _resumir_filas(rows: List[Dict[str, str]]) -> Resumen:
+    r = rollup.de_filas(rows)
+    ultimo: Dict[str, str] = {}
+    for row in rows:
+        f = row.get("fecha") or ""
+        ts = row.get("timestamp") or ""
+        if ts > ultimo.get(f, ""):
+            ultimo[f] = ts
+    out: Resumen = {}
+    for f in r.por_fecha:
+        if not f:
+            continue
+        a = rollup.acumulado_dia([r], f)
+        hoy = metrics.resumen_hoy(a)
+        out[f] = (ultimo.get(f, ""), metrics.resumen_dia(a),
+                  {k: hoy[k] for k in ("oee", "total", "scrap", "meta")})
+    return out
+
+
+def _resumir_archivo(path: str) -> Tuple[Resumen, float]:
+    """Resumen por fecha de un archivo físico del log (corre en el pool)."""
+    t0 = time.perf_counter()
+    return _resumir_filas(csv_utils.parsear_csv(path) or []), time.perf_counter() - t0
+
+
+def _fusionar(rows: List[Dict[str, str]], filas: Dict[str, Dict[str, str]], archivadas: set) -> List[Dict[str, str]]:
+    # las fechas que solo quedan en el archivo conservan la fila que ya tenían
+    out = dict(filas)
+    for r in rows:
+        if r.get("fecha") in archivadas and r["fecha"] not in filas:
+            out[r["fecha"]] = r
+    return [out[f] for f in sorted(out)]
+
+
+def reconstruir(procesos: Optional[int] = None, machines=None) -> Dict[str, object]:
+    """Regenera las dos tablas diarias; devuelve filas escritas y tiempos (segundos)."""
+    t0 = time.perf_counter()
+    machines = config.MACHINES if machines is None else machines
+    wj = write_journal.activo()
+    if wj is not None:
+        wj.vaciar()
+
+    # (índice de máquina, archivo); en SQLite el log se lee aquí mismo
+    tareas: List[Tuple[int, str]] = []
+    resumenes: List[Tuple[int, Resumen]] = []
+    cpu = 0.0
+    for i, m in enumerate(machines):
+        if csv_utils.almacen_sqlite() is not None:
+            resumenes.append((i, _resumir_filas(csv_utils.leer_log_maquina(m["oee_csv"], pendientes=False))))
+            continue
+        tareas.extend((i, p) for p in csv_utils.fuentes_log(m["oee_csv"]) if os.path.exists(p))
+    procesos = procesos or os.cpu_count() or 1
+    if tareas and procesos > 1 and len(tareas) > 1:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(tareas))) as pool:
+            hechos = list(pool.map(_resumir_archivo, [p for _, p in tareas]))
+    else:
+        hechos = [_resumir_archivo(p) for _, p in tareas]
+    for (i, _), (res, dt) in zip(tareas, hechos):
+        resumenes.append((i, res))
+        cpu += dt
+    t_leer = time.perf_counter() - t0
+
+    por_fecha: Dict[str, Dict[int, Tuple[str, dict, dict]]] = {}
+    for i, res in resumenes:
+        for f, v in res.items():
+            por_fecha.setdefault(f, {})[i] = v
+    globales, area = {}, {}
+    for f, maquinas in por_fecha.items():
+        _, acum, _ = max(maquinas.values(), key=lambda v: v[0])
+        globales[f] = fila_daily(f, acum["oee_pct"], acum["total"], acum["scrap"], acum["meta_pzs"])
+        hoy = [maquinas[i][2] for i in maquinas]
+        oee = sum(h["oee"] for h in hoy) / len(machines)
+        area[f] = fila_daily(f, oee, sum(h["total"] for h in hoy), sum(h["scrap"] for h in hoy),
+                             sum(h["meta"] for h in hoy))
+
+    t1 = time.perf_counter()
+    archivadas = set()
+    for m in machines:
+        arch = archive.resumen_produccion(m)
+        archivadas.update(np.datetime_as_string(arch.fecha, unit="D").tolist())
+    for path, filas in ((config.DAILY_CSV_GLOBAL, globales), (config.DAILY_CSV_INJECTOR, area)):
+        csv_utils.asegurar_csv(path, DAILY_FIELDS)
+        csv_utils.actualizar_csv(path, DAILY_FIELDS, lambda rows, filas=filas: _fusionar(rows, filas, archivadas))
+    t_escribir = time.perf_counter() - t1
+    return {
+        "fechas": len(por_fecha), "archivos": len(tareas), "procesos": min(procesos, max(1, len(tareas))),
+        "leer_s": round(t_leer, 3), "cpu_s": round(cpu, 3), "escribir_s": round(t_escribir, 3),
+        "total_s": round(time.perf_counter() - t0, 3),
+    }
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    res = reconstruir(n)
+    print(f"{res['fechas']} fechas desde {res['archivos']} archivos con {res['procesos']} procesos")
+    print(f"lectura y resumen {res['leer_s']:.2f}s (suma por archivo {res['cpu_s']:.2f}s), "
+          f"escritura {res['escribir_s']:.2f}s, total {res['total_s']:.2f}s")
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""Tablas diarias (``oee_daily.csv``, ``oee_inyeccion_daily.csv``) indexadas por fecha.
+
+El archivo se lee una sola vez y queda como índice ``fecha -> fila`` (más la
+suma del OEE); consultar fechas, filas o el promedio no vuelve a parsearlo
+mientras nadie lo cambie por fuera. Cada upsert actualiza el índice y
+reescribe el archivo con una línea por fecha de forma atómica (archivo
+temporal + ``fsync`` + ``os.replace``), de modo que quien lo abra por fuera
+(Excel, reportes) siempre ve la tabla completa y un corte de luz deja la
+versión anterior o la nueva, nunca una mezcla. La escritura se hace con el
+candado del archivo (``file_lock``) y tras releerlo si otra terminal lo
+cambió, para no pisar sus filas.
+"""
+
+import csv
+import os
+import threading
+from typing import Dict, List, Optional
+
+from file_lock import bloqueo_csv, subir_version
+
+DAILY_FIELDS = ["fecha", "oee_dia_%", "total_pzs", "scrap_pzs", "meta_pzs"]
+
+
+def _float(x) -> float:
+    try:
+        return float(str(x).replace(",", ".").replace("%", "").strip())
+    except Exception:
+        return 0.0
+
+
+def escribir_atomico(path: str, fieldnames: List[str], rows) -> None:
+    """Reescribe ``path`` de forma atómica (temporal en la misma carpeta + replace)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def fila_daily(fecha_iso: str, oee_pct: float, total: int, scrap: int, meta) -> Dict[str, str]:
+    """Fila de la tabla diaria con el formato con que se guarda."""
+    return {
+        "fecha": fecha_iso, "oee_dia_%": f"{oee_pct:.2f}",
+        "total_pzs": str(total), "scrap_pzs": str(scrap), "meta_pzs": str(meta),
+    }
+
+
+def _fila_valida(vals: List[str], n: int, idx: List[int]) -> Optional[Dict[str, str]]:
+    """Fila de una línea del CSV o ``None`` si está incompleta o no es numérica (edición a mano)."""
+    if len(vals) != n:
+        return None
+    row = {k: vals[i].strip() for k, i in zip(DAILY_FIELDS, idx)}
+    if not row["fecha"]:
+        return None
+    try:
+        for k in DAILY_FIELDS[1:]:
+            float(row[k].replace(",", ".").replace("%", ""))
+    except ValueError:
+        return None
+    return row
+
+
+class DailyStore:
+    """Índice en memoria ``fecha -> fila`` respaldado por el CSV diario."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._rows: Dict[str, Dict[str, str]] = {}
+        self._suma_oee = 0.0
+        self._n_oee = 0
+        self._firma = None
+        self._cargar()
+
+    # ----- persistencia -----
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def _cargar(self) -> None:
+        self._rows.clear()
+        self._suma_oee, self._n_oee = 0.0, 0
+        try:
+            with open(self.path, "r", newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                campos = next(reader, None)
+                if campos is not None and all(k in campos for k in DAILY_FIELDS):
+                    idx = [campos.index(k) for k in DAILY_FIELDS]
+                    for vals in reader:
+                        row = _fila_valida(vals, len(campos), idx)
+                        if row is not None:
+                            self._poner(row["fecha"], row)
+        except (IOError, csv.Error):
+            pass
+        self._firma = self._stat()
+
+    def _poner(self, fecha: str, row: Dict[str, str]) -> None:
+        # una fecha existente conserva su posición (orden de aparición)
+        prev = self._rows.get(fecha)
+        if prev is not None:
+            self._suma_oee -= _float(prev.get("oee_dia_%"))
+            self._n_oee -= 1
+        self._rows[fecha] = row
+        self._suma_oee += _float(row.get("oee_dia_%"))
+        self._n_oee += 1
+
+    def _escribir(self) -> None:
+        # con el candado tomado y el índice al día con el archivo
+        escribir_atomico(self.path, DAILY_FIELDS, self._rows.values())
+        subir_version(self.path)
+        self._firma = self._stat()
+
+    def _refrescar_si_externo(self) -> None:
+        if self._stat() != self._firma:
+            self._cargar()
+
+    # ----- API -----
+    def upsert(self, fecha_iso: str, oee_pct: float, total: int, scrap: int, meta) -> None:
+        row = fila_daily(fecha_iso, oee_pct, total, scrap, meta)
+        with self._lock, bloqueo_csv(self.path):
+            self._refrescar_si_externo()
+            self._poner(fecha_iso, row)
+            self._escribir()
+
+    def filas(self) -> List[Dict[str, str]]:
+        with self._lock:
+            self._refrescar_si_externo()
+            return [dict(r) for r in self._rows.values()]
+
+    def fila(self, fecha_iso: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            self._refrescar_si_externo()
+            r = self._rows.get(fecha_iso)
+            return dict(r) if r else None
+
+    def fechas(self) -> set:
+        with self._lock:
+            self._refrescar_si_externo()
+            return set(self._rows)
+
+    def promedio_oee(self) -> float:
+        with self._lock:
+            self._refrescar_si_externo()
+            return round(self._suma_oee / self._n_oee, 2) if self._n_oee else 0.0
+
+
+_STORES: Dict[str, DailyStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def store_diario(path: str) -> DailyStore:
+    key = os.path.abspath(path)
+    with _STORES_LOCK:
+        st = _STORES.get(key)
+        if st is None:
+            st = _STORES[key] = DailyStore(key)
+        return st
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Eventos y segundos de paro por ``(día, turno, molde, motivo)``.
+
+Cada fila de ``down_<id>.csv`` suma en O(1) a su grupo del día; los días
+se guardan ordenados para responder cualquier rango recorriendo solo los
+días que caen dentro. Los logs se siguen con ``columnar.Fuentes`` (las filas
+encoladas son, p. ej., el paro recién cerrado en captura). Lo archivado se lee de los
+``.gz`` anuales (el resumen no guarda el motivo) cada vez que cambia el
+archivo de la máquina.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import archive
+import config
+from columnar import Fuentes, entero, fecha_np, flotante
+
+DIMENSIONES = ("maquina", "fecha", "turno", "molde", "motivo")
+
+Grupo = Tuple[int, str, str]   # (turno, molde, motivo)
+
+
+def _clave(r: Dict[str, str]) -> Tuple[Optional[int], Grupo]:
+    d = fecha_np((r.get("fecha") or "").strip())
+    dia = None if np.isnat(d) else int(d.astype(np.int64))
+    return dia, (entero(r.get("turno")), (r.get("molde") or "").strip(), (r.get("motivo") or "").strip())
+
+
+def _seg(r: Dict[str, str]) -> float:
+    return flotante(r.get("duracion_seg"), 0.0)
+
+
+class IndiceParos:
+    """``día -> (turno, molde, motivo) -> [eventos, segundos]`` de una máquina."""
+
+    def __init__(self, machine):
+        self.machine = machine
+        self._reiniciar()
+
+    def _reiniciar(self) -> None:
+        self.fuentes = Fuentes(columnas=False)
+        self.arch = None
+        self.dias: Dict[int, Dict[Grupo, List[float]]] = {}
+        self.orden: List[int] = []
+
+    def agregar(self, r: Dict[str, str]) -> None:
+        dia, g = _clave(r)
+        if dia is None:
+            return
+        grupos = self.dias.get(dia)
+        if grupos is None:
+            grupos = self.dias[dia] = {}
+            insort(self.orden, dia)
+        e = grupos.get(g)
+        if e is None:
+            e = grupos[g] = [0, 0.0]
+        e[0] += 1
+        e[1] += _seg(r)
+
+    def actualizar(self) -> None:
+        m = self.machine
+        arch = archive.paros_por_fecha(m)
+        fuentes = self.fuentes.leer([m["down_csv"]])
+        if arch is not self.arch or not self.fuentes.vigente(fuentes):
+            self._reiniciar()
+            self.arch = arch
+            for p in archive.archivos_anuales("down", m):
+                for r in archive.leer_gz(p):
+                    self.agregar(r)
+        for _, rows in self.fuentes.nuevas(fuentes):
+            for r in rows:
+                self.agregar(r)
+
+    def recorrer(self, desde: Optional[int], hasta: Optional[int]):
+        """``(día, grupo, [eventos, segundos])`` de los días en ``[desde, hasta]``."""
+        i0 = 0 if desde is None else bisect_left(self.orden, desde)
+        i1 = len(self.orden) if hasta is None else bisect_right(self.orden, hasta)
+        for dia in self.orden[i0:i1]:
+            for g, e in self.dias[dia].items():
+                yield dia, g, e
+
+
+_INDICES: Dict[str, IndiceParos] = {}
+_LOCK = threading.Lock()
+
+
+def agrupar(machines: Optional[Sequence] = None, desde: Optional[str] = None, hasta: Optional[str] = None,
+            dimensiones: Sequence[str] = ()) -> Dict[tuple, List[float]]:
+    """``[eventos, segundos]`` por combinación de ``dimensiones`` en ``[desde, hasta]``.
+
+    Las claves llevan un valor por dimensión: id de máquina, día como entero
+    desde 1970, turno (entero), molde y motivo.
+    """
+    for d in dimensiones:
+        if d not in DIMENSIONES:
+            raise ValueError(f"Dimensión desconocida: {d}")
+    machines = config.MACHINES if machines is None else machines
+    d0, d1 = fecha_np(desde), fecha_np(hasta)
+    i0 = None if np.isnat(d0) else int(d0.astype(np.int64))
+    i1 = None if np.isnat(d1) else int(d1.astype(np.int64))
+
+    out: Dict[tuple, List[float]] = {}
+
+    def sumar(m, dia, g, ev, seg):
+        valores = {"maquina": m["id"], "fecha": dia, "turno": g[0], "molde": g[1], "motivo": g[2]}
+        k = tuple(valores[d] for d in dimensiones)
+        e = out.get(k)
+        if e is None:
+            e = out[k] = [0, 0.0]
+        e[0] += ev
+        e[1] += seg
+
+    for m in machines:
+        with _LOCK:
+            ix = _INDICES.get(m["id"])
+            if ix is None or ix.machine is not m:
+                ix = _INDICES[m["id"]] = IndiceParos(m)
+            ix.actualizar()
+            for dia, g, (ev, seg) in ix.recorrer(i0, i1):
+                sumar(m, dia, g, ev, seg)
+            pend = ix.fuentes.pendientes([m["down_csv"]]) or []
+        for r in pend:
+            dia, g = _clave(r)
+            if dia is not None and (i0 is None or dia >= i0) and (i1 is None or dia <= i1):
+                sumar(m, dia, g, 1, _seg(r))
+    return out
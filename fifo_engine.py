@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Asignación FIFO del stock neto de cada molde a sus órdenes.
+
+Las órdenes se agrupan por molde y se ordenan por ``(inicio, orden)`` una
+vez por versión del plan. Cada cadena de molde se asigna en una pasada con
+sus entradas (producido del molde desde ``mold_index``; enviados aprobados
+del molde en todo el plan y de cada orden desde ``shipment_index``); el
+resultado se guarda junto con esas entradas y solo se recalcula la cadena cuyas entradas cambiaron. Así,
+agregar o aprobar una salida, o guardar un turno, rehace solo el molde
+afectado.
+
+``instantanea()`` es la asignación compartida por todas las vistas: un
+objeto inmutable que se recalcula solo cuando cambia el sello de versión de
+plan, salidas y logs de producción (ver ``_sello``).
+"""
+
+import threading
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import archive
+import config
+import csv_utils
+import mold_index
+import shipment_index
+from file_lock import version_csv
+from records import Orden, leer_ordenes
+
+
+class Cadena:
+    """Resultado FIFO de un molde."""
+
+    __slots__ = ("molde", "ordenes", "bruto", "enviado", "neto", "asignado", "restante")
+
+    def __init__(self, molde: str, ordenes: List[Orden], bruto: int, enviado: int, enviados: Dict[str, int]):
+        self.molde = molde
+        self.ordenes = ordenes
+        self.bruto = bruto
+        self.enviado = enviado
+        self.neto = max(0, bruto - enviado)
+        self.asignado: Dict[str, int] = {}
+        rem = self.neto
+        for o in ordenes:
+            necesidad = max(0, o.objetivo - enviados.get(o.orden, 0))
+            a = min(necesidad, rem)
+            self.asignado[o.orden] = a
+            rem -= a
+        self.restante = rem
+
+
+class MotorFifo:
+    """Cadenas por molde de un plan, con resultados recalculados por molde."""
+
+    def __init__(self):
+        self.plan: Optional[List[Orden]] = None
+        self.orden_molde: Dict[str, str] = {}
+        self.por_molde: Dict[str, List[str]] = {}    # molde -> órdenes (una vez)
+        self.cadenas: Dict[str, List[Orden]] = {}    # molde -> órdenes en orden FIFO
+        self.moldes: List[str] = []                  # orden de recorrido de las cadenas
+        self.decide: Dict[str, str] = {}             # orden -> molde cuya asignación vale
+        self._hechas: Dict[str, Tuple[tuple, Cadena]] = {}
+
+    def agrupar(self, plan: List[Orden]) -> None:
+        if plan is self.plan:
+            return
+        self.orden_molde = {o.orden: o.molde_id for o in plan}
+        self.por_molde = {}
+        for o, m in self.orden_molde.items():
+            if m:
+                self.por_molde.setdefault(m, []).append(o)
+        cadenas: Dict[str, List[Orden]] = {}
+        for o in plan:
+            if o.orden and o.molde_id:
+                cadenas.setdefault(o.molde_id, []).append(o)
+        for lst in cadenas.values():
+            lst.sort(key=lambda r: (r.inicio, r.orden))
+        # como el cálculo original: moldes del plan en orden alfabético y luego los
+        # que solo salen en filas repetidas; una orden en dos moldes queda con la
+        # asignación del último en este orden
+        self.moldes = sorted(self.por_molde) + [m for m in cadenas if m not in self.por_molde]
+        self.decide = {o.orden: m for m in self.moldes for o in cadenas.get(m, [])}
+        self.plan, self.cadenas = plan, cadenas
+
+    def cadena(self, molde: str, enviados: Dict[str, int], enviados_molde: Dict[str, int]) -> Cadena:
+        """Cadena de ``molde``; se recalcula solo si cambió alguna entrada.
+
+        ``enviados_molde`` son los enviados aprobados de cada molde sobre todo
+        ``planning.csv`` (no solo las órdenes de este plan).
+        """
+        ordenes = self.cadenas.get(molde, [])
+        propias = self.por_molde.get(molde)
+        if propias is None:
+            bruto = enviado = 0  # molde solo en filas repetidas de la orden
+        else:
+            bruto = int(mold_index.producido(molde) or 0)
+            enviado = enviados_molde.get(molde, 0)
+        entrada = (bruto, enviado, tuple(ordenes), tuple(enviados.get(o.orden, 0) for o in ordenes))
+        hecha = self._hechas.get(molde)
+        if hecha is not None and hecha[0] == entrada:
+            return hecha[1]
+        c = Cadena(molde, ordenes, bruto, enviado, enviados)
+        self._hechas[molde] = (entrada, c)
+        return c
+
+    def todas(self, enviados: Dict[str, int], enviados_molde: Dict[str, int]) -> Dict[str, Cadena]:
+        out = {m: self.cadena(m, enviados, enviados_molde) for m in self.moldes}
+        for m in list(self._hechas):
+            if m not in out:
+                del self._hechas[m]
+        return out
+
+
+_MOTOR = MotorFifo()
+_LOCK = threading.Lock()
+
+
+def cadenas(plan: Optional[List[Orden]] = None) -> Tuple[MotorFifo, Dict[str, Cadena], Dict[str, int]]:
+    """Motor agrupado, cadenas de todos los moldes y enviados aprobados por orden."""
+    plan = leer_ordenes() if plan is None else plan
+    enviados = shipment_index.por_orden(aprobados=True)
+    enviados_molde = shipment_index.por_molde(aprobados=True)
+    with _LOCK:
+        _MOTOR.agrupar(plan)
+        return _MOTOR, _MOTOR.todas(enviados, enviados_molde), enviados
+
+
+def cadena_de_orden(orden: str, plan: Optional[List[Orden]] = None) -> Optional[Cadena]:
+    """Solo la cadena que decide la asignación de ``orden`` (``None`` si no tiene molde)."""
+    plan = leer_ordenes() if plan is None else plan
+    enviados = shipment_index.por_orden(aprobados=True)
+    enviados_molde = shipment_index.por_molde(aprobados=True)
+    with _LOCK:
+        _MOTOR.agrupar(plan)
+        m = _MOTOR.decide.get(str(orden).strip())
+        return _MOTOR.cadena(m, enviados, enviados_molde) if m else None
+
+
+def asignacion(plan: Optional[List[Orden]] = None) -> Dict[str, Dict]:
+    """Diccionarios de ``metrics.compute_fifo_assignments`` para ``plan``."""
+    motor, todas, enviados = cadenas(plan)
+    assigned_by_order = {}
+    for c in todas.values():
+        assigned_by_order.update(c.asignado)
+    return dict(
+        assigned_by_order=assigned_by_order,
+        remaining_by_mold={m: c.restante for m, c in todas.items()},
+        bruto_by_mold={m: todas[m].bruto for m in sorted(motor.por_molde)},
+        shipped_by_mold={m: todas[m].enviado for m in sorted(motor.por_molde)},
+        order_to_mold=dict(motor.orden_molde),
+        shipped_by_order={o: enviados.get(o, 0) for o in motor.orden_molde},
+    )
+
+
+# ===== instantánea compartida =====
+def _sello() -> tuple:
+    """Versión (contador, mtime y tamaño) de todo lo que entra al FIFO."""
+    paths = [config.PLANNING_CSV, config.SHIPMENTS_CSV]
+    for m in config.MACHINES:
+        paths.extend(csv_utils.fuentes_log(m["oee_csv"]))
+        paths.append(archive.ruta(f"resumen_oee_{m['id']}.csv"))
+    encoladas = [config.PLANNING_CSV, config.SHIPMENTS_CSV] + [m["oee_csv"] for m in config.MACHINES]
+    return (tuple((p, version_csv(p), csv_utils.firma_archivo(p)) for p in paths),
+            tuple(len(csv_utils.filas_pendientes(p)) for p in encoladas))
+
+
+_INSTANTANEA: Optional[Tuple[tuple, Mapping]] = None
+_INST_LOCK = threading.Lock()
+
+
+def instantanea() -> Mapping[str, Mapping]:
+    """Asignación FIFO vigente; el mismo objeto (de solo lectura) mientras no cambien los datos."""
+    global _INSTANTANEA
+    sello = _sello()
+    with _INST_LOCK:
+        if _INSTANTANEA is not None and _INSTANTANEA[0] == sello:
+            return _INSTANTANEA[1]
+        datos = asignacion()
+        snap = MappingProxyType({k: MappingProxyType(v) for k, v in datos.items()})
+        _INSTANTANEA = (sello, snap)
+        return snap
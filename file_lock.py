@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Bloqueo entre terminales y versión de cada archivo de datos.
+
+Varias PCs comparten ``BASE_DIR`` por red, así que el candado es un archivo
+``<ruta>.lock`` creado con ``O_CREAT | O_EXCL`` (funciona igual en discos
+locales y en recursos compartidos SMB). Cada escritura sube el contador de
+``<ruta>.ver``; ``csv_utils.actualizar_csv`` lo usa para detectar que otra
+terminal escribió entre su lectura y su escritura. Un candado sin renovar
+por más de ``CADUCA_S`` (la terminal se cerró a la mala o se apagó) se rompe.
+
+Prueba de carga con varios procesos escribiendo a la vez::
+
+    python file_lock.py estres [procesos] [escrituras_por_proceso]
+"""
+
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+ESPERA_S = 10.0       # tiempo máximo para obtener el candado
+CADUCA_S = 30.0       # un candado más viejo que esto se considera abandonado
+LATIDO_S = CADUCA_S / 3   # cada cuánto se renueva el mtime de los candados tomados
+
+_local = threading.local()
+_VIVOS: Dict[str, str] = {}   # candado -> token, tomados por este proceso
+_VIVOS_LOCK = threading.Lock()
+_LATIDO: Optional[threading.Thread] = None
+
+
+class ArchivoBloqueado(PermissionError):
+    """Otra terminal tiene el archivo bloqueado más allá de la espera."""
+
+
+class ConflictoVersion(RuntimeError):
+    """El archivo cambió en cada intento de lectura-modificación-escritura."""
+
+
+def _tomados():
+    d = getattr(_local, "tomados", None)
+    if d is None:
+        d = _local.tomados = {}
+    return d
+
+
+def _leer_token(lock: str) -> Optional[str]:
+    try:
+        with open(lock, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _romper_caducado(lock: str) -> None:
+    """Quita ``lock`` si sigue abandonado.
+
+    El candado se renombra a una lápida única (solo una terminal gana el
+    rename) y se compara su dueño con el que se vio caducado; si entretanto
+    otra terminal lo tomó, se le devuelve.
+    """
+    dueno = _leer_token(lock)
+    try:
+        if time.time() - os.path.getmtime(lock) <= CADUCA_S:
+            return
+        lapida = f"{lock}.{uuid.uuid4().hex}.caducado"
+        os.rename(lock, lapida)
+    except OSError:
+        return  # lo liberó su dueño u otra terminal lo rompió primero
+    try:
+        quitado = _leer_token(lapida)
+        vivo = time.time() - os.path.getmtime(lapida) <= CADUCA_S
+    except OSError:
+        quitado, vivo = None, False
+    if quitado != dueno or vivo:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            try:
+                os.write(fd, (quitado or "").encode("utf-8"))
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+    try:
+        os.remove(lapida)
+    except OSError:
+        pass
+
+
+def _latir() -> None:
+    # mantiene fresco el mtime de los candados tomados por este proceso
+    while True:
+        time.sleep(LATIDO_S)
+        with _VIVOS_LOCK:
+            candados = list(_VIVOS)
+        for lock in candados:
+            try:
+                os.utime(lock)
+            except OSError:
+                pass
+
+
+def _registrar_vivo(lock: str, token: str) -> None:
+    global _LATIDO
+    with _VIVOS_LOCK:
+        _VIVOS[lock] = token
+        if _LATIDO is None:
+            _LATIDO = threading.Thread(target=_latir, name="file-lock-latido", daemon=True)
+            _LATIDO.start()
+
+
+@contextmanager
+def bloqueo_csv(path: str, espera: float = ESPERA_S):
+    """Candado exclusivo sobre ``path``; reentrante dentro del mismo hilo.
+
+    Mientras se tiene, un hilo de fondo le renueva el mtime para que una
+    escritura larga no parezca abandonada. Al soltarlo solo se borra si el
+    archivo sigue siendo el propio.
+    """
+    key = os.path.abspath(path)
+    tomados = _tomados()
+    if tomados.get(key):
+        tomados[key] += 1
+        try:
+            yield
+        finally:
+            tomados[key] -= 1
+        return
+    lock = key + ".lock"
+    token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+    limite = time.monotonic() + espera
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            _romper_caducado(lock)
+            if time.monotonic() >= limite:
+                raise ArchivoBloqueado(f"{os.path.basename(key)} está bloqueado por otra terminal")
+            time.sleep(random.uniform(0.01, 0.05))
+            continue
+        try:
+            os.write(fd, token.encode("utf-8"))
+        finally:
+            os.close(fd)
+        break
+    tomados[key] = 1
+    _registrar_vivo(lock, token)
+    try:
+        yield
+    finally:
+        tomados.pop(key, None)
+        with _VIVOS_LOCK:
+            _VIVOS.pop(lock, None)
+        if _leer_token(lock) == token:
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+
+
+def version_csv(path: str) -> int:
+    """Versión actual de ``path`` (0 si nunca se escribió con candado)."""
+    try:
+        with open(os.path.abspath(path) + ".ver", "r", encoding="utf-8") as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def subir_version(path: str) -> int:
+    """Incrementa la versión; llamar con el candado de ``path`` tomado."""
+    v = version_csv(path) + 1
+    with open(os.path.abspath(path) + ".ver", "w", encoding="utf-8") as f:
+        f.write(f"{v} {socket.gethostname()}:{os.getpid()}\n")
+    return v
+
+
+# ===== prueba de carga multiproceso =====
+def _escritor(base_dir: str, n: int, ident: int) -> int:
+    import csv_utils
+    contador = os.path.join(base_dir, "contador.csv")
+    bitacora = os.path.join(base_dir, "bitacora.csv")
+    reintentos = 0
+    for i in range(n):
+        intentos = []
+
+        def sumar(rows):
+            intentos.append(1)
+            rows[0]["valor"] = str(int(rows[0]["valor"]) + 1)
+            return rows
+
+        csv_utils.actualizar_csv(contador, ["clave", "valor"], sumar, intentos=50)
+        csv_utils.agregar_fila_csv(bitacora, [ident, i])
+        reintentos += len(intentos) - 1
+    return reintentos
+
+
+def estres(procesos: int = 8, escrituras: int = 25) -> bool:
+    """Lanza ``procesos`` escritores concurrentes y verifica que no se pierda nada."""
+    import tempfile
+    from multiprocessing import Pool
+
+    import csv_utils
+    base_dir = tempfile.mkdtemp(prefix="mefrup_estres_")
+    contador = os.path.join(base_dir, "contador.csv")
+    bitacora = os.path.join(base_dir, "bitacora.csv")
+    csv_utils.escribir_csv_dict(contador, ["clave", "valor"], [{"clave": "total", "valor": "0"}])
+    csv_utils.asegurar_csv(bitacora, ["proceso", "i"])
+    t0 = time.perf_counter()
+    with Pool(procesos) as pool:
+        reintentos = pool.starmap(_escritor, [(base_dir, escrituras, p) for p in range(procesos)])
+    dt = time.perf_counter() - t0
+    esperado = procesos * escrituras
+    csv_utils.invalidar_cache()
+    total = int(csv_utils.leer_csv_dict(contador)[0]["valor"])
+    filas = len(csv_utils.leer_csv_dict(bitacora))
+    ok = total == esperado and filas == esperado
+    print(f"{procesos} procesos x {escrituras} escrituras en {dt:.2f}s: "
+          f"contador={total} bitácora={filas} (esperado {esperado}), "
+          f"reintentos por conflicto={sum(reintentos)} -> {'OK' if ok else 'FALLA'}")
+    return ok
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "estres":
+        print(__doc__)
+        sys.exit(2)
+    args = [int(a) for a in sys.argv[2:4]]
+    sys.exit(0 if estres(*args) else 1)
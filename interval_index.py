@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Índice de intervalos ``[inicio_ts, fin_ts)`` de los paros de cada máquina.
+
+Los paros se guardan ordenados por inicio en arreglos NumPy (segundos),
+junto con la duración más larga y sumas acumuladas de segundos por motivo.
+Un paro que toca la ventana ``[t0, t1)`` empieza entre ``t0 - más largo`` y
+``t1``; los que empiezan en ``[t0, t1 - más largo)`` caben completos y se
+suman con las acumuladas, así que solo los de las orillas se recortan uno
+por uno (búsqueda binaria + orillas). Con eso se reparte el paro por día o
+por turno (``config.TURNOS_INICIO``) aunque cruce medianoche o un cambio de
+turno.
+
+Un paro sin ``fin_ts`` termina en ``inicio_ts + duracion_seg``; sin
+``inicio_ts`` no se puede ubicar y se omite. En una máquina los paros no se
+enciman (captura lleva uno a la vez), por eso las sumas por motivo son
+también el tiempo parado. Los logs se siguen con ``columnar.Fuentes``: las
+filas nuevas se agregan al final sin reordenar (si llegan en orden) y las
+encoladas se recortan en cada consulta.
+"""
+
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import archive
+import config
+from columnar import Fuentes, flotante
+
+_EPOCA = datetime(1970, 1, 1)
+
+
+def _ts(v) -> Optional[int]:
+    """Segundos desde 1970 de ``datetime`` o texto ``AAAA-MM-DD[ HH:MM[:SS]]``."""
+    if v is None or v == "":
+        return None
+    if isinstance(v, datetime):
+        return int((v - _EPOCA).total_seconds())
+    if isinstance(v, date):
+        return int((datetime(v.year, v.month, v.day) - _EPOCA).total_seconds())
+    try:
+        return int(np.datetime64(str(v).strip(), "s").astype(np.int64))
+    except ValueError:
+        return None
+
+
+def _texto(t: int) -> str:
+    return str(np.datetime64(int(t), "s")).replace("T", " ")
+
+
+def _intervalo(r: Dict[str, str]) -> Optional[Tuple[int, int, str]]:
+    ini = _ts(r.get("inicio_ts"))
+    if ini is None:
+        return None
+    fin = _ts(r.get("fin_ts"))
+    if fin is None:
+        fin = ini + int(flotante(r.get("duracion_seg"), 0.0))
+    return ini, max(ini, fin), (r.get("motivo") or "").strip()
+
+
+class IntervalosParo:
+    """Paros de una máquina ordenados por inicio."""
+
+    def __init__(self, machine):
+        self.machine = machine
+        self._reiniciar()
+
+    def _reiniciar(self) -> None:
+        self.fuentes = Fuentes(columnas=False)
+        self.arch = None
+        self.motivos: List[str] = []
+        self._codigo: Dict[str, int] = {}
+        self.n = 0
+        self.ini = np.empty(64, dtype=np.int64)
+        self.fin = np.empty(64, dtype=np.int64)
+        self.mot = np.empty(64, dtype=np.int32)
+        self.mas_largo = 0
+        self._acum: Optional[np.ndarray] = None   # (n + 1) x motivos, se arma al consultar
+        self._acum_n = 0
+
+    def _agregar(self, nuevos: List[Tuple[int, int, str]]) -> None:
+        if not nuevos:
+            return
+        nuevos.sort(key=lambda x: x[0])
+        k = len(nuevos)
+        if self.n + k > len(self.ini):
+            cap = max(self.n + k, 2 * len(self.ini))
+            for nombre in ("ini", "fin", "mot"):
+                a = getattr(self, nombre)
+                b = np.empty(cap, dtype=a.dtype)
+                b[:self.n] = a[:self.n]
+                setattr(self, nombre, b)
+        for ini, fin, motivo in nuevos:
+            if motivo not in self._codigo:
+                self._codigo[motivo] = len(self.motivos)
+                self.motivos.append(motivo)
+                self._acum = None  # columna nueva
+        i0 = self.n
+        self.ini[i0:i0 + k] = [x[0] for x in nuevos]
+        self.fin[i0:i0 + k] = [x[1] for x in nuevos]
+        self.mot[i0:i0 + k] = [self._codigo[x[2]] for x in nuevos]
+        self.n += k
+        self.mas_largo = max(self.mas_largo, max(x[1] - x[0] for x in nuevos))
+        if i0 and self.ini[i0] < self.ini[i0 - 1]:
+            orden = np.argsort(self.ini[:self.n], kind="stable")
+            for nombre in ("ini", "fin", "mot"):
+                a = getattr(self, nombre)
+                a[:self.n] = a[:self.n][orden]
+            self._acum = None
+
+    def actualizar(self) -> None:
+        m = self.machine
+        arch = archive.paros_por_fecha(m)
+        fuentes = self.fuentes.leer([m["down_csv"]])
+        if arch is not self.arch or not self.fuentes.vigente(fuentes):
+            self._reiniciar()
+            self.arch = arch
+            viejos = []
+            for p in archive.archivos_anuales("down", m):
+                viejos.extend(x for x in map(_intervalo, archive.leer_gz(p)) if x)
+            self._agregar(viejos)
+        nuevos = []
+        for _, rows in self.fuentes.nuevas(fuentes):
+            nuevos.extend(x for x in map(_intervalo, rows) if x)
+        self._agregar(nuevos)
+
+    def _acumuladas(self) -> np.ndarray:
+        k = len(self.motivos)
+        if self._acum is None or self._acum.shape[1] != k:
+            self._acum_n = 0
+            self._acum = np.zeros((1, k), dtype=np.int64)
+        if self._acum_n < self.n:
+            i0 = self._acum_n
+            dur = np.zeros((self.n - i0, k), dtype=np.int64)
+            dur[np.arange(self.n - i0), self.mot[i0:self.n]] = self.fin[i0:self.n] - self.ini[i0:self.n]
+            self._acum = np.vstack([self._acum, self._acum[-1] + np.cumsum(dur, axis=0)])
+            self._acum_n = self.n
+        return self._acum
+
+    def ventana(self, t0: int, t1: int) -> np.ndarray:
+        """Segundos por motivo (índice de ``motivos``) dentro de ``[t0, t1)``."""
+        out = np.zeros(len(self.motivos), dtype=np.int64)
+        if not self.n or t1 <= t0:
+            return out
+        ini = self.ini[:self.n]
+        a = int(np.searchsorted(ini, t0 - self.mas_largo, side="left"))
+        b = int(np.searchsorted(ini, t0, side="left"))
+        c = max(b, int(np.searchsorted(ini, t1 - self.mas_largo, side="left")))
+        d = int(np.searchsorted(ini, t1, side="left"))
+        c = min(c, d)
+        if c > b:  # caben completos
+            acum = self._acumuladas()
+            out += acum[c] - acum[b]
+        for i in list(range(a, b)) + list(range(c, d)):
+            s = min(int(self.fin[i]), t1) - max(int(self.ini[i]), t0)
+            if s > 0:
+                out[self.mot[i]] += s
+        return out
+
+    def eventos(self, t0: int, t1: int) -> List[Tuple[int, int, str]]:
+        """Paros que tocan ``[t0, t1)``, recortados a la ventana."""
+        ini = self.ini[:self.n]
+        a = int(np.searchsorted(ini, t0 - self.mas_largo, side="left"))
+        d = int(np.searchsorted(ini, t1, side="left"))
+        out = []
+        for i in range(a, d):
+            s, f = max(int(self.ini[i]), t0), min(int(self.fin[i]), t1)
+            if f > s:
+                out.append((s, f, self.motivos[self.mot[i]]))
+        return out
+
+
+_INDICES: Dict[str, IntervalosParo] = {}
+_LOCK = threading.Lock()
+
+
+def _indice(machine) -> IntervalosParo:
+    ix = _INDICES.get(machine["id"])
+    if ix is None or ix.machine is not machine:
+        ix = _INDICES[machine["id"]] = IntervalosParo(machine)
+    ix.actualizar()
+    return ix
+
+
+def _pendientes(ix: IntervalosParo, t0: int, t1: int) -> List[Tuple[int, int, str]]:
+    out = []
+    for r in ix.fuentes.pendientes([ix.machine["down_csv"]]) or []:
+        x = _intervalo(r)
+        if x and min(x[1], t1) > max(x[0], t0):
+            out.append((max(x[0], t0), min(x[1], t1), x[2]))
+    return out
+
+
+def paro_en_ventana(machine, t0, t1) -> Dict[str, int]:
+    """Segundos parados por motivo dentro de ``[t0, t1)``."""
+    a, b = _ts(t0), _ts(t1)
+    out: Dict[str, int] = {}
+    if a is None or b is None:
+        return out
+    with _LOCK:
+        ix = _indice(machine)
+        for i, s in enumerate(ix.ventana(a, b).tolist()):
+            if s:
+                out[ix.motivos[i]] = s
+    for s, f, motivo in _pendientes(ix, a, b):
+        out[motivo] = out.get(motivo, 0) + (f - s)
+    return out
+
+
+def eventos_en_ventana(machine, t0, t1) -> List[Tuple[int, int, str]]:
+    a, b = _ts(t0), _ts(t1)
+    if a is None or b is None:
+        return []
+    with _LOCK:
+        ix = _indice(machine)
+        out = ix.eventos(a, b)
+    return sorted(out + _pendientes(ix, a, b))
+
+
+def simultaneos(machines: Optional[Sequence], t0, t1, minimo: int = 2) -> List[Dict[str, object]]:
+    """Tramos de ``[t0, t1)`` con al menos ``minimo`` máquinas paradas a la vez."""
+    machines = config.MACHINES if machines is None else machines
+    marcas = []
+    for m in machines:
+        for s, f, motivo in eventos_en_ventana(m, t0, t1):
+            marcas.append((s, 1, m["id"], motivo))
+            marcas.append((f, -1, m["id"], motivo))
+    marcas.sort(key=lambda x: (x[0], x[1]))
+    out: List[Dict[str, object]] = []
+    activos: Dict[str, List[str]] = {}
+    previo = None
+    for t, delta, mid, motivo in marcas:
+        if previo is not None and t > previo and len(activos) >= minimo:
+            tramo = {"inicio": _texto(previo), "fin": _texto(t), "segundos": t - previo,
+                     "maquinas": {k: v[-1] for k, v in sorted(activos.items())}}
+            if out and out[-1]["fin"] == tramo["inicio"] and out[-1]["maquinas"] == tramo["maquinas"]:
+                out[-1]["fin"] = tramo["fin"]
+                out[-1]["segundos"] += tramo["segundos"]
+            else:
+                out.append(tramo)
+        if delta > 0:
+            activos.setdefault(mid, []).append(motivo)
+        else:
+            lst = activos.get(mid, [])
+            if motivo in lst:
+                lst.remove(motivo)
+            if not lst:
+                activos.pop(mid, None)
+        previo = t
+    return out
+
+
+def _dias(desde: str, hasta: str):
+    d, h = date.fromisoformat(desde[:10]), date.fromisoformat(hasta[:10])
+    while d <= h:
+        yield d
+        d += timedelta(days=1)
+
+
+def paro_por_turno(machine, desde: str, hasta: str) -> Dict[Tuple[str, int], Dict[str, int]]:
+    """Segundos por motivo de cada ``(fecha, turno)`` recortando en los cambios de turno."""
+    out: Dict[Tuple[str, int], Dict[str, int]] = {}
+    for d in _dias(desde, hasta):
+        for turno, inicio in sorted(config.TURNOS_INICIO.items()):
+            hh, mm = (int(x) for x in inicio.split(":"))
+            t0 = datetime(d.year, d.month, d.day, hh, mm)
+            t1 = t0 + timedelta(hours=config.TURNOS_HORAS.get(turno, 8))
+            por_motivo = paro_en_ventana(machine, t0, t1)
+            if por_motivo:
+                out[(d.isoformat(), turno)] = por_motivo
+    return out
+
+
+def paro_por_dia(machine, desde: str, hasta: str) -> Dict[str, Dict[str, int]]:
+    """Segundos por motivo de cada día calendario (un paro que cruza medianoche se reparte)."""
+    out: Dict[str, Dict[str, int]] = {}
+    for d in _dias(desde, hasta):
+        por_motivo = paro_en_ventana(machine, d, d + timedelta(days=1))
+        if por_motivo:
+            out[d.isoformat()] = por_motivo
+    return out
@@ -6,12 +6,17 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox
 from tkcalendar import Calendar
-import csv, os, logging, traceback
+import os, logging, traceback
 from datetime import datetime, date, timedelta
 
 import config # <-- CAMBIO IMPORTANTE
+import write_journal
+import archive
+import rollup
+import capture_state
 from csv_utils import *
 from metrics import *
+from records import leer_recetas
 
 from views.recipes import RecipesView
 from views.machine_recipes_panel import MachineRecipesView
@@ -65,7 +70,9 @@ class App(ctk.CTk):
         self.glob_info=tk.StringVar(value="Registros: 0 | Días: 0")
 
         asegurar_archivos_basicos()
-        self.recipes = leer_csv_dict(config.RECIPES_CSV)
+        write_journal.journal()  # repone lo que quedó en cola en la sesión anterior
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.recipes = leer_recetas()
         self.recipe_map = {}
 
         self.active_machine = None
@@ -142,6 +149,7 @@ class App(ctk.CTk):
         if machine["id"] not in self.oee_pages:
             self.oee_pages[machine["id"]] = OEEView(self.container, self, machine)
         self.oee_page = self.oee_pages[machine["id"]]
+        capture_state.cargar(machine)
         self._refresh_moldes_from_recipes(force_update_menu=True)
         self._pack_only(self.oee_page)
         self._bind_shortcuts_oee()
@@ -195,15 +203,13 @@ class App(ctk.CTk):
             messagebox.showerror("Acceso denegado", "Contraseña incorrecta.")
 
     def _refresh_moldes_from_recipes(self, force_update_menu=False):
-        self.recipes = leer_csv_dict(config.RECIPES_CSV)
+        self.recipes = leer_recetas()
         self.recipe_map = {}
         opciones = ["Selecciona"]
         for r in self.recipes:
-            if r.get("activo", "1") == "1":
-                mid = (r.get("molde_id") or "").strip()
-                if mid:
-                    self.recipe_map[mid] = r
-                    opciones.append(mid)
+            if r.activo and r.molde_id:
+                self.recipe_map[r.molde_id] = r
+                opciones.append(r.molde_id)
         if hasattr(self, "molde_menu"):
             try:
                 self.molde_menu.configure(values=opciones)
@@ -259,13 +265,11 @@ class App(ctk.CTk):
         mid = str(self.molde.get() or "")
         rec = self.recipe_map.get(mid)
         if rec:
-            self.parte.set((rec.get("parte") or "").strip())
-            raw = (rec.get("ciclo_ideal_s") or "").replace(",", ".").strip()
-            try: self.ciclo_s.set(int(float(raw)))
-            except: self.ciclo_s.set(0)
-            self.rec_cavs    = (rec.get("cavidades") or "").strip()
-            self.rec_cavs_on = (rec.get("cavidades_habilitadas") or "").strip()
-            self.rec_scrap   = (rec.get("scrap_esperado_pct") or "").strip()
+            self.parte.set(rec.parte)
+            self.ciclo_s.set(int(rec.ciclo_ideal_s))
+            self.rec_cavs    = str(rec.cavidades or "")
+            self.rec_cavs_on = str(rec.cavidades_habilitadas or "")
+            self.rec_scrap   = f"{rec.scrap_esperado_pct:g}" if rec.scrap_esperado_pct else ""
         else:
             self.parte.set(""); self.ciclo_s.set(0)
             self.rec_cavs = self.rec_cavs_on = self.rec_scrap = ""
@@ -357,10 +361,7 @@ class App(ctk.CTk):
              datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
              str(dur), self.paro_motivo, self.paro_nota,
              self.operador.get(), str(self.turno.get() or ""), str(self.molde.get() or "")]
-        try:
-            with open(self.active_machine["down_csv"],"a",newline="",encoding="utf-8") as f: csv.writer(f).writerow(row)
-        except PermissionError:
-            messagebox.showerror("Archivo en uso","Cierra el CSV de paros.")
+        encolar_fila_csv(self.active_machine["down_csv"], row)
         self._reload_downtime_table()
 
     def reset_paros(self):
@@ -389,7 +390,7 @@ class App(ctk.CTk):
         if not (hasattr(self, "tree") and self.active_machine): return
         for i in self.tree.get_children(): self.tree.delete(i)
         f=self.fecha_sel.get().strip()
-        for r in leer_csv_dict(self.active_machine["down_csv"]):
+        for r in leer_log_maquina(self.active_machine["down_csv"]):
             if r.get("fecha")!=f: continue
             try: dmin = round(int(float(r.get("duracion_seg","0")))/60.0,1)
             except: dmin=0.0
@@ -412,13 +413,10 @@ class App(ctk.CTk):
         if hasattr(self,"pb_quality"): self._set_pb_if_changed(self.pb_quality, (buenas/total) if total>0 else 0.0)
 
     def _turno_bloqueado_maquina(self, machine, fecha_iso, turno:int) -> bool:
-        rows = leer_csv_dict(machine["oee_csv"])
-        for r in rows:
-            try:
-                if r.get("fecha")==fecha_iso and int(float(r.get("turno","0")))==int(turno):
-                    return True
-            except: pass
-        return False
+        e = capture_state.estado(machine)
+        if e is not None and e.turno_registrado(fecha_iso, turno): return True
+        # lo que otra terminal guardó después de abrir la máquina
+        return rollup.turno_registrado(machine, fecha_iso, turno) or archive.turno_archivado(machine, fecha_iso, turno)
 
     def _guardar(self):
         if not self.active_machine:
@@ -442,25 +440,18 @@ class App(ctk.CTk):
         ts=f"{f}T{datetime.now().strftime('%H:%M:%S')}"
         row=[ts,f,self.operador.get(),self.turno.get(),self.molde.get(),self.parte.get(),ciclo,horas,
              int(round(paro_seg/60.0)), meta_oper,total,scrap,buenas,A,P,Q,OEE]
+        encolar_fila_csv(self.active_machine["oee_csv"], row)
+        # las tablas diarias guardan sumas: con la cola escrita, ninguna fila cuenta en archivo y en cola a la vez
+        write_journal.journal().vaciar(2.0)
+
         try:
-            with open(self.active_machine["oee_csv"],"a",newline="",encoding="utf-8") as fi: csv.writer(fi).writerow(row)
+            escribir_daily_maquina(self.active_machine, f)
+            escribir_daily_area(f)
         except PermissionError:
-            messagebox.showerror("Archivo en uso","Cierra el CSV de la máquina y vuelve a intentar."); return
-
-        rows_maquina = leer_csv_dict(self.active_machine["oee_csv"])
-        a=acum_por_fecha(rows_maquina, f)
-        escribir_daily(config.DAILY_CSV_GLOBAL, f, a["oee_pct"], a["total"], a["scrap"], a["meta_pzs"])
-
-        total_area = scrap_area = meta_area = 0
-        suma_oee = 0.0
-        for m in config.MACHINES:
-            r = resumen_hoy_maquina(m, f)
-            suma_oee += r["oee"]
-            total_area += r["total"]
-            scrap_area += r["scrap"]
-            meta_area += r["meta"]
-        OEE_area = (suma_oee / len(config.MACHINES)) if config.MACHINES else 0.0
-        escribir_daily(config.DAILY_CSV_INJECTOR, f, OEE_area, total_area, scrap_area, meta_area)
+            messagebox.showerror("Archivo en uso","El turno quedó guardado, pero las tablas diarias están abiertas en otro programa.\n"
+                                 "Ciérralas y ejecuta daily_rebuild.py para ponerlas al día.")
+        e = capture_state.estado(self.active_machine)
+        if e is not None: e.registrar(dict(zip(OEE_FIELDS, map(str, row))))
 
         self._refrescar_dia(); self._refrescar_hist(); self._refrescar_global(); self._update_save_state()
         if getattr(self, 'dashboard_page', None):
@@ -468,25 +459,31 @@ class App(ctk.CTk):
                 self.dashboard_page._refresh_now(f)
             except Exception:
                 logging.exception("Error al actualizar tablero en vivo")
+        aviso = ""
+        if write_journal.journal().stats()["bloqueados"]:
+            aviso = "\n\nArchivo en uso: el registro quedó en cola y se escribirá al liberarse."
         messagebox.showinfo("Guardado",
                             f"Máquina: {self.active_machine['name']}\n"
-                            f"OEE {OEE:.2f}% (A {A:.2f}% | P {P:.2f}% | Q {Q:.2f}%)")
+                            f"OEE {OEE:.2f}% (A {A:.2f}% | P {P:.2f}% | Q {Q:.2f}%)" + aviso)
 
     def _refrescar_dia(self):
         if not self.active_machine: return
         f=self.fecha_sel.get().strip()
         if self.oee_page and hasattr(self.oee_page, "lbl_dia"):
             self.oee_page.lbl_dia.configure(text=f"{dia_semana_es(f)} — {f}")
-        a=acum_por_fecha(leer_csv_dict(self.active_machine["oee_csv"]), f)
+        e=capture_state.estado(self.active_machine)
+        a=e.acum_dia(f) if e is not None else acum_por_fecha_maquina(self.active_machine, f)
         self.tot_day.set(str(a["total"])); self.scr_day.set(str(a["scrap"])); self.buen_day.set(str(a["buenas"]))
         self.perf_day.set(f"{a['perf_pct']:.2f}%"); self.qual_day.set(f"{a['qual_pct']:.2f}%"); self.oee_day.set(f"{a['oee_pct']:.2f}%")
         self.day_info.set("Registros del día: "+str(a.get("count",0)) if a.get("count",0) else "Sin registros para la fecha.")
 
     def _refrescar_hist(self):
-        self.oee_hist.set(f"{promedio_oee_daily(config.DAILY_CSV_GLOBAL):.2f}%")
+        e=capture_state.estado(self.active_machine) if self.active_machine else None
+        self.oee_hist.set(f"{(e.promedio_hist if e is not None else promedio_oee_daily(config.DAILY_CSV_GLOBAL)):.2f}%")
     def _refrescar_global(self):
         if not self.active_machine: return
-        g=acum_global(leer_csv_dict(self.active_machine["oee_csv"]))
+        e=capture_state.estado(self.active_machine)
+        g=e.acum_global() if e is not None else acum_global_maquina(self.active_machine)
         self.glob_total.set(str(g["total"])); self.glob_scrap.set(str(g["scrap"])); self.glob_buenas.set(str(g["buenas"]))
         self.glob_perf.set(f"{g['perf_pct']:.2f}%"); self.glob_qual.set(f"{g['qual_pct']:.2f}%"); self.glob_oee.set(f"{g['oee_pct']:.2f}%")
         self.glob_info.set(f"Registros: {g['registros']} | Días: {g['dias']}")
@@ -503,6 +500,12 @@ class App(ctk.CTk):
         try: self.btn_guardar.configure(state=("normal" if ready else "disabled"))
         except: pass
 
+    def _on_close(self):
+        # lo que no alcance a escribirse queda en la bitácora para el próximo arranque
+        write_journal.journal().vaciar(3.0)
+        rollup.persistir()
+        self.destroy()
+
     def _apply_initial_scale(self):
         try:
             s=min(max(self.winfo_screenwidth()/1920.0, 0.95), 1.20)
@@ -1,14 +1,40 @@
 # -*- coding: utf-8 -*-
 """Core calculation and aggregation helpers."""
 
-import os
 from datetime import date
-from typing import Dict, List
-
-from config import MACHINES, PLANNING_CSV, DIAS_ES
+from typing import Dict
+
+import numpy as np
+
+import archive
+import config
+import downtime_index
+import interval_index
+import fifo_engine
+import mold_index
+import performance_cube
+import query_index
+import range_index
+import rollup
+import shipment_index
+from config import MACHINES, DIAS_ES
+from daily_store import store_diario
+from records import (
+    Orden,
+    como_ordenes,
+    leer_ordenes,
+    objetivo_de_fila,
+)
+from columnar import (
+    VOCAB,
+    columnas_maquina,
+    mascara_rango,
+    redondear2,
+)
 from csv_utils import (
+    escribir_daily,
     leer_csv_dict,
-    leer_shipments,
+    leer_log_rango,
     asegurar_archivos_maquina,
 )
 
@@ -36,17 +62,41 @@ def calcular_metricas(total, scrap, turno_seg, oper_seg, ciclo_ideal_s):
     return buenas, round(A * 100, 2), round(P * 100, 2), round(Q * 100, 2), round(OEE, 2)
 
 
-def acum_por_fecha(rows, fecha_iso):
-    total = scrap = 0
-    meta = 0.0
-    n = 0
-    for r in rows:
-        if r.get("fecha") != fecha_iso:
-            continue
-        total += parse_int_str(r.get("total_pzs", "0"))
-        scrap += parse_int_str(r.get("scrap_pzs", "0"))
-        meta += _safe_float(r.get("meta_oper_pzs", "0"))
-        n += 1
+def calcular_tiempos_vec(horas_turno, ciclo_s, paro_seg):
+    """``calcular_tiempos`` sobre arreglos (una posición por turno)."""
+    horas = np.nan_to_num(np.asarray(horas_turno, dtype=np.float64))
+    turno_seg = np.floor(np.maximum(0.0, horas) * 3600.0).astype(np.int64)
+    paro = np.trunc(np.maximum(0.0, np.nan_to_num(np.asarray(paro_seg, dtype=np.float64)))).astype(np.int64)
+    operativo = np.maximum(0, turno_seg - paro)
+    ciclo = np.trunc(np.nan_to_num(np.asarray(ciclo_s, dtype=np.float64))).astype(np.int64)
+    ok = ciclo > 0
+    div = np.where(ok, ciclo, 1)
+    meta_plan = np.where(ok, turno_seg // div, 0)
+    meta_oper = np.where(ok, operativo // div, 0)
+    return turno_seg, operativo, meta_plan, meta_oper
+
+
+def calcular_metricas_vec(total, scrap, turno_seg, oper_seg, ciclo_ideal_s):
+    """``calcular_metricas`` sobre arreglos; devuelve buenas, A, P, Q y OEE (en %)."""
+    total = np.asarray(total, dtype=np.int64)
+    scrap = np.asarray(scrap, dtype=np.int64)
+    turno_seg = np.asarray(turno_seg, dtype=np.float64)
+    oper_seg = np.asarray(oper_seg, dtype=np.float64)
+    buenas = np.maximum(0, total - scrap)
+    A = np.divide(oper_seg, turno_seg, out=np.zeros_like(oper_seg), where=turno_seg > 0)
+    A = np.clip(A, 0.0, 1.0)
+    perf_num = buenas * np.nan_to_num(np.asarray(ciclo_ideal_s, dtype=np.float64))
+    P = np.divide(perf_num, oper_seg, out=np.zeros_like(oper_seg), where=oper_seg > 0)
+    P = np.clip(P, 0.0, 1.0)
+    tot = total.astype(np.float64)
+    Q = np.divide(buenas, tot, out=np.zeros_like(tot), where=tot > 0)
+    OEE = A * P * Q * 100.0
+    return buenas, np.round(A * 100, 2), np.round(P * 100, 2), np.round(Q * 100, 2), np.round(OEE, 2)
+
+
+def resumen_dia(a):
+    """Acumulado de un día (``rollup.Acumulado``) como lo devuelve ``acum_por_fecha_maquina``."""
+    total, scrap, meta, n = a.total, a.scrap, a.meta, a.registros
     if total <= 0 or meta <= 0:
         return {
             "count": n,
@@ -74,22 +124,29 @@ def acum_por_fecha(rows, fecha_iso):
     }
 
 
-def acum_global(rows):
-    total = scrap = 0
-    meta = 0.0
-    n = 0
-    dias = set()
-    for r in rows:
-        total += parse_int_str(r.get("total_pzs", "0"))
-        scrap += parse_int_str(r.get("scrap_pzs", "0"))
-        meta += _safe_float(r.get("meta_oper_pzs", "0"))
-        n += 1
-        if r.get("fecha"):
-            dias.add(r["fecha"])
+def acum_por_fecha(rows, fecha_iso):
+    return resumen_dia(rollup.acumulado_dia([rollup.de_filas(rows)], fecha_iso))
+
+
+def acum_por_fecha_maquina(machine, fecha_iso):
+    """``acum_por_fecha`` del log de la máquina, desde su rollup en caché."""
+    return resumen_dia(rollup.dia_maquina(machine, fecha_iso))
+
+
+def resumen_global(a, fechas, archivado=None):
+    """Acumulado total como ``acum_global_maquina``, más lo archivado."""
+    total, scrap, meta, n = a.total, a.scrap, a.meta, a.registros
+    if archivado is not None and len(archivado):
+        total += int(archivado.total_pzs.sum())
+        scrap += int(archivado.scrap_pzs.sum())
+        meta += float(archivado.meta_oper_pzs.sum())
+        n += int(archivado.registros.sum())
+        fechas = fechas | set(np.datetime_as_string(archivado.fecha, unit="D").tolist())
+    dias = len(fechas)
     if total <= 0 or meta <= 0:
         return {
             "registros": n,
-            "dias": len(dias),
+            "dias": dias,
             "total": total,
             "scrap": scrap,
             "buenas": max(0, total - scrap),
@@ -104,7 +161,7 @@ def acum_global(rows):
     OEE = P * Q * 100.0
     return {
         "registros": n,
-        "dias": len(dias),
+        "dias": dias,
         "total": total,
         "scrap": scrap,
         "buenas": buenas,
@@ -115,8 +172,23 @@ def acum_global(rows):
     }
 
 
+def acum_global(rows, archivado=None):
+    """Acumulado global de una lista de filas del log.
+
+    ``archivado`` (``archive.resumen_produccion``) suma además lo archivado.
+    """
+    return resumen_global(*rollup.acumulado_total([rollup.de_filas(rows)]), archivado)
+
+
+def acum_global_maquina(machine):
+    """``acum_global`` de la máquina (rollup en caché) incluyendo su historial archivado."""
+    return resumen_global(*rollup.total_maquina(machine), archive.resumen_produccion(machine))
+
+
 def promedio_oee_daily(path_daily):
-    rows = leer_csv_dict(path_daily) if os.path.exists(path_daily) else []
+    if config.STORAGE_BACKEND != "sqlite":
+        return store_diario(path_daily).promedio_oee()
+    rows = leer_csv_dict(path_daily)
     vals = [_safe_float(r.get("oee_dia_%", 0)) for r in rows]
     return round(sum(vals) / len(vals), 2) if vals else 0.0
 
@@ -124,26 +196,37 @@ def promedio_oee_daily(path_daily):
 def resumen_historico_maquina(machine):
     """Promedios históricos de OEE y sus componentes para una máquina."""
     asegurar_archivos_maquina(machine)
-    rows = leer_csv_dict(machine["oee_csv"])
-    if not rows:
+    a, _ = rollup.total_maquina(machine)
+    arch = archive.resumen_produccion(machine)
+    if not a.registros and not len(arch):
         return dict(oee=0.0, A=0.0, P=0.0, Q=0.0)
 
-    def _avg(key):
-        vals = [_safe_float(r.get(key, 0)) for r in rows if r.get(key) not in (None, "")]
-        return sum(vals) / len(vals) if vals else 0.0
+    def _avg(i, k):
+        # celdas vacías no cuentan
+        suma = a.suma_pct[i] + float(getattr(arch, f"suma_{k}").sum())
+        n = a.n_pct[i] + int(getattr(arch, f"n_{k}").sum())
+        return suma / n if n else 0.0
 
     return dict(
-        oee=round(_avg("oee_%"), 2),
-        A=round(_avg("availability_%"), 2),
-        P=round(_avg("performance_%"), 2),
-        Q=round(_avg("quality_%"), 2),
+        oee=round(_avg(3, "oee"), 2),
+        A=round(_avg(0, "avail"), 2),
+        P=round(_avg(1, "perf"), 2),
+        Q=round(_avg(2, "qual"), 2),
     )
 
 
+def nombre_dia(weekday):
+    """Nombre del día ``weekday`` (0 = lunes, como ``date.weekday``)."""
+    try:
+        return DIAS_ES[int(weekday)]
+    except Exception:
+        return "Día"
+
+
 def dia_semana_es(f):
     try:
         y, m, d = map(int, f.split("-"))
-        return DIAS_ES[date(y, m, d).weekday()]
+        return nombre_dia(date(y, m, d).weekday())
     except Exception:
         return "Día"
 
@@ -165,44 +248,35 @@ def parse_int_str(s, default=0):
 
 
 def producido_por_molde_global(molde_id: str, hasta_fecha: str = None) -> int:
-    total_buenas = 0
-    for m in MACHINES:
-        rows = leer_csv_dict(m["oee_csv"])
-        for r in rows:
-            try:
-                if str(r.get("molde", "")).strip() == str(molde_id).strip():
-                    if hasta_fecha:
-                        if (r.get("fecha") or "") <= hasta_fecha:
-                            total_buenas += int(float(r.get("buenas_pzs", "0")))
-                    else:
-                        total_buenas += int(float(r.get("buenas_pzs", "0")))
-            except Exception:
-                pass
-    return total_buenas
+    return mold_index.producido(molde_id, hasta_fecha or None)
+
+
+def _enviados_aprobados() -> Dict[str, int]:
+    """Piezas enviadas (solo aprobadas) por orden, desde el índice de salidas."""
+    return shipment_index.por_orden(aprobados=True)
 
 
 def enviados_por_orden(orden: str) -> int:
-    return sum(
-        parse_int_str(r.get("qty", "0"))
-        for r in leer_shipments()
-        if r.get("orden") == orden and r.get("approved", "0") == "1"
-    )
+    return shipment_index.enviados_orden(orden)
 
 
 def enviados_por_molde(molde_id: str) -> int:
     """Cantidad total enviada asociada a un molde (todas las órdenes)."""
-    orden_a_molde = {
-        r.get("orden", "").strip(): r.get("molde_id", "").strip()
-        for r in leer_csv_dict(PLANNING_CSV)
-    }
-    total = 0
-    for r in leer_shipments():
-        if (
-            orden_a_molde.get(r.get("orden", "").strip()) == str(molde_id).strip()
-            and r.get("approved", "0") == "1"
-        ):
-            total += parse_int_str(r.get("qty", "0"))
-    return total
+    return shipment_index.enviados_molde(molde_id)
+
+
+def pendientes_por_orden(orden: str) -> int:
+    """Piezas en salidas aún sin aprobar de la orden."""
+    return shipment_index.enviados_orden(orden, aprobados=False)
+
+
+def pendientes_por_molde(molde_id: str) -> int:
+    return shipment_index.enviados_molde(molde_id, aprobados=False)
+
+
+def actualizar_shipments(mutar, normalizar: bool = True):
+    """Aprobar o borrar salidas sin pisar a otra terminal (ver ``shipment_index.actualizar``)."""
+    return shipment_index.actualizar(mutar, normalizar)
 
 
 def inventario_fifo():
@@ -214,22 +288,19 @@ def inventario_fifo():
     ``progreso`` y ``pendiente``. ``totals`` agrega producción total,
     enviados aprobados y stock neto restante.
     """
-
-    orders = leer_csv_dict(PLANNING_CSV)
     by_mold = {}
-    for r in orders:
-        m = (r.get("molde_id", "") or "").strip()
-        if not m:
-            continue
-        by_mold.setdefault(m, []).append(r)
+    for o in leer_ordenes():
+        if o.molde_id:
+            by_mold.setdefault(o.molde_id, []).append(o)
+    enviados = _enviados_aprobados()
 
     rows_out = []
     totals = dict(produccion=0, enviados=0, stock=0)
 
     for m, ords in by_mold.items():
-        ords.sort(key=lambda r: ((r.get("inicio_ts") or ""), r.get("orden", "")))
+        ords.sort(key=lambda o: (o.inicio_ts, o.orden))
         prod = producido_por_molde_global(m)
-        shipped_by_order = {o["orden"]: enviados_por_orden(o["orden"]) for o in ords}
+        shipped_by_order = {o.orden: enviados.get(o.orden, 0) for o in ords}
         shipped_total = sum(shipped_by_order.values())
         neto = max(0, prod - shipped_total)
 
@@ -239,28 +310,15 @@ def inventario_fifo():
 
         restante = neto
         for o in ords:
-            orden = o.get("orden", "")
-            parte = o.get("parte", "")
-            objetivo = parse_int_str(o.get("qty_total", "0"))
-            enviado = shipped_by_order.get(orden, 0)
-            necesidad = max(0, objetivo - enviado)
-            asignado = min(necesidad, restante)
+            objetivo = o.qty_total  # como parse_int_str(qty_total)
+            enviado = shipped_by_order[o.orden]
+            asignado = min(max(0, objetivo - enviado), restante)
             restante -= asignado
             progreso = min(objetivo, enviado + asignado)
-            pendiente = max(0, objetivo - progreso)
-            rows_out.append(
-                dict(
-                    orden=orden,
-                    parte=parte,
-                    molde=m,
-                    objetivo=objetivo,
-                    enviado=enviado,
-                    asignado=asignado,
-                    progreso=progreso,
-                    pendiente=pendiente,
-                )
-            )
-
+            rows_out.append(dict(
+                orden=o.orden, parte=o.parte, molde=m, objetivo=objetivo, enviado=enviado,
+                asignado=asignado, progreso=progreso, pendiente=max(0, objetivo - progreso),
+            ))
     return rows_out, totals
 
 
@@ -276,10 +334,9 @@ def _safe_float(x, default=0.0):
         return default
 
 
-def resumen_hoy_maquina(machine, fecha_iso):
-    asegurar_archivos_maquina(machine)
-    rows = [r for r in leer_csv_dict(machine["oee_csv"]) if r.get("fecha") == fecha_iso]
-    if not rows:
+def resumen_hoy(a):
+    """Indicadores del día a partir de su ``rollup.Acumulado`` (sin último paro)."""
+    if not a.registros:
         return dict(
             oee=0.0,
             A=0.0,
@@ -296,33 +353,26 @@ def resumen_hoy_maquina(machine, fecha_iso):
             ultimo_paro="-",
         )
     # acumulados
-    total = sum(parse_int_str(r.get("total_pzs", "0")) for r in rows)
-    scrap = sum(parse_int_str(r.get("scrap_pzs", "0")) for r in rows)
+    total = a.total
+    scrap = a.scrap
     buenas = max(0, total - scrap)
     # meta planeada almacenada
-    meta_oper = sum(parse_int_str(r.get("meta_oper_pzs", "0")) for r in rows)
+    meta_oper = a.meta_int
     # tiempos
-    horas_sum = sum(_safe_float(r.get("horas_turno", "0")) for r in rows)
-    turno_seg = int(horas_sum * 3600)
-    paro_seg = int(sum(_safe_float(r.get("tiempo_paro_min", "0")) for r in rows) * 60)
-    oper_seg = max(0, turno_seg - paro_seg)
+    turno_seg = a.turno_seg
+    oper_seg = max(0, turno_seg - a.paro_seg)
     # ciclo ideal (último válido)
-    ciclos = [
-        parse_int_str(r.get("ciclo_s", "0"))
-        for r in rows
-        if parse_int_str(r.get("ciclo_s", "0")) > 0
-    ]
-    ciclo_ideal = ciclos[-1] if ciclos else 0
+    ciclo_ideal = a.ciclo
 
     A = (oper_seg / turno_seg) if turno_seg > 0 else None
     P = (total / meta_oper) if meta_oper > 0 else None
     Q = (buenas / total) if total > 0 else None
     if None in (A, P, Q):
         # fallback a promedios almacenados si faltan datos para calcular
-        n = max(1, len(rows))
-        A = sum(_safe_float(r.get("availability_%", "0")) for r in rows) / n / 100.0
-        P = sum(_safe_float(r.get("performance_%", "0")) for r in rows) / n / 100.0
-        Q = sum(_safe_float(r.get("quality_%", "0")) for r in rows) / n / 100.0
+        n = max(1, a.registros)
+        A = a.suma_pct[0] / n / 100.0
+        P = a.suma_pct[1] / n / 100.0
+        Q = a.suma_pct[2] / n / 100.0
     oee = A * P * Q * 100.0
     A *= 100.0
     P *= 100.0
@@ -330,17 +380,6 @@ def resumen_hoy_maquina(machine, fecha_iso):
 
     # ciclo real estimado
     ciclo_real = (oper_seg / buenas) if buenas > 0 else 0.0
-    # último paro
-    downs = [r for r in leer_csv_dict(machine["down_csv"]) if r.get("fecha") == fecha_iso]
-    if downs:
-        d = downs[-1]
-        try:
-            mins = round(int(float(d.get("duracion_seg", "0"))) / 60.0, 1)
-            ultimo = f"{d.get('inicio_ts','')} -> {d.get('fin_ts','')}   {mins:.1f} min ({d.get('motivo','')})"
-        except Exception:
-            ultimo = f"{d.get('inicio_ts','')} -> {d.get('fin_ts','')}   ({d.get('motivo','')})"
-    else:
-        ultimo = "-"
     return dict(
         oee=round(oee, 2),
         A=round(A, 2),
@@ -354,117 +393,405 @@ def resumen_hoy_maquina(machine, fecha_iso):
         ciclo_real=round(ciclo_real, 2),
         turno_seg=turno_seg,
         oper_seg=oper_seg,
-        ultimo_paro=ultimo,
+        ultimo_paro="-",
     )
 
 
+def resumen_hoy_maquina(machine, fecha_iso):
+    asegurar_archivos_maquina(machine)
+    a = rollup.dia_maquina(machine, fecha_iso)
+    r = resumen_hoy(a)
+    if a.registros:
+        # último paro
+        d = rollup.ultimo_paro(machine, fecha_iso)
+        if d is not None:
+            try:
+                mins = round(int(float(d.get("duracion_seg", "0"))) / 60.0, 1)
+                r["ultimo_paro"] = f"{d.get('inicio_ts','')} -> {d.get('fin_ts','')}   {mins:.1f} min ({d.get('motivo','')})"
+            except Exception:
+                r["ultimo_paro"] = f"{d.get('inicio_ts','')} -> {d.get('fin_ts','')}   ({d.get('motivo','')})"
+    return r
+
+
+def escribir_daily_maquina(machine, fecha_iso):
+    """Fila ``fecha_iso`` de la tabla diaria global con el acumulado de ``machine``."""
+    a = acum_por_fecha_maquina(machine, fecha_iso)
+    escribir_daily(config.DAILY_CSV_GLOBAL, fecha_iso, a["oee_pct"], a["total"], a["scrap"], a["meta_pzs"])
+    return a
+
+
+def escribir_daily_area(fecha_iso):
+    """Fila ``fecha_iso`` de la tabla diaria del área (OEE promedio de todas las máquinas)."""
+    total_area = scrap_area = meta_area = 0
+    suma_oee = 0.0
+    for m in config.MACHINES:
+        r = resumen_hoy_maquina(m, fecha_iso)
+        suma_oee += r["oee"]
+        total_area += r["total"]
+        scrap_area += r["scrap"]
+        meta_area += r["meta"]
+    oee_area = (suma_oee / len(config.MACHINES)) if config.MACHINES else 0.0
+    escribir_daily(config.DAILY_CSV_INJECTOR, fecha_iso, oee_area, total_area, scrap_area, meta_area)
+
+
 def resumen_rango_maquina(machine, desde, hasta):
     """Agrega métricas de producción en un rango de fechas."""
     asegurar_archivos_maquina(machine)
-    rows = leer_csv_dict(machine["oee_csv"])
-    down_rows = leer_csv_dict(machine["down_csv"])
-    down_by_date = {}
+    c = columnas_maquina(machine, desde, hasta)
+    down_rows = leer_log_rango(machine["down_csv"], desde, hasta)
+    down_by_date = archive.paros_archivados(machine, desde, hasta)
     for d in down_rows:
         f = d.get("fecha")
-        if not f:
-            continue
-        if desde and f < desde:
-            continue
-        if hasta and f > hasta:
-            continue
         mins = _safe_float(d.get("duracion_seg", "0")) / 60.0
         down_by_date[f] = down_by_date.get(f, 0.0) + mins
 
-    data = []
-    for r in rows:
-        f = r.get("fecha")
-        if not f:
-            continue
-        if desde and f < desde:
-            continue
-        if hasta and f > hasta:
-            continue
-        total = parse_int_str(r.get("total_pzs", "0"))
-        scrap = parse_int_str(r.get("scrap_pzs", "0"))
-        meta = _safe_float(r.get("meta_oper_pzs", "0"))
-        avail = _safe_float(r.get("availability_%", "0"))
-        perf = _safe_float(r.get("performance_%", "0"))
-        qual = _safe_float(r.get("quality_%", "0"))
-        oee = _safe_float(r.get("oee_%", "0"))
-        if total <= 0 or meta <= 0:
-            continue
-        buenas = max(0, total - scrap)
-        paro = round(down_by_date.get(f, 0.0), 2)
-        data.append(
-            {
-                "fecha": f,
-                "paro_min": paro,
-                "total": total,
-                "scrap": scrap,
-                "buenas": buenas,
-                "availability": round(avail, 2),
-                "performance": round(perf, 2),
-                "quality": round(qual, 2),
-                "oee": round(oee, 2),
-            }
-        )
-    if not data:
-        return {
-            "rows": [],
-            "totals": {
-                "total": 0,
-                "scrap": 0,
-                "buenas": 0,
-                "paro_min": 0.0,
-                "availability": 0.0,
-                "performance": 0.0,
-                "quality": 0.0,
-                "oee": 0.0,
-            },
+    mask = mascara_rango(c, desde, hasta) & (c.total > 0) & (c.meta > 0)
+    # lo archivado entra como una fila por (fecha, turno, molde)
+    arch = archive.resumen_produccion(machine)
+    amask = arch.mascara(desde, hasta) & (arch.total_pzs > 0) & (arch.meta_oper_pzs > 0)
+    if not mask.any() and not amask.any():
+        return {"rows": [], "totals": totales_rango_maquina(machine, desde, hasta)}
+    fechas = np.concatenate([np.datetime_as_string(arch.fecha[amask], unit="D"), c.fechas_iso(mask)])
+    total = np.concatenate([arch.total_pzs[amask], c.total[mask]]).astype(np.int64)
+    scrap = np.concatenate([arch.scrap_pzs[amask], c.scrap[mask]]).astype(np.int64)
+    buenas = np.maximum(0, total - scrap)
+    paro = np.array([round(down_by_date.get(f, 0.0), 2) for f in fechas], dtype=np.float64)
+    # porcentajes vacíos cuentan como 0 en el rango
+    reg = arch.registros[amask]
+    pcts = {
+        k: redondear2(np.concatenate([
+            getattr(arch, f"suma_{k}")[amask] / reg,
+            np.nan_to_num(getattr(c, k)[mask].astype(np.float64)),
+        ]))
+        for k in ("avail", "perf", "qual", "oee")
+    }
+    data = [
+        {
+            "fecha": str(fechas[i]),
+            "paro_min": float(paro[i]),
+            "total": int(total[i]),
+            "scrap": int(scrap[i]),
+            "buenas": int(buenas[i]),
+            "availability": float(pcts["avail"][i]),
+            "performance": float(pcts["perf"][i]),
+            "quality": float(pcts["qual"][i]),
+            "oee": float(pcts["oee"][i]),
         }
-    total = sum(d["total"] for d in data)
-    scrap = sum(d["scrap"] for d in data)
-    buenas = sum(d["buenas"] for d in data)
-    paro = sum(d["paro_min"] for d in data)
-    avail = sum(d["availability"] for d in data) / len(data)
-    perf = sum(d["performance"] for d in data) / len(data)
-    qual = sum(d["quality"] for d in data) / len(data)
-    oee = sum(d["oee"] for d in data) / len(data)
+        for i in range(len(fechas))
+    ]
+    return {"rows": data, "totals": totales_rango_maquina(machine, desde, hasta, data)}
+
+
+def totales_rango_maquina(machine, desde, hasta, filas=None):
+    """Totales de ``resumen_rango_maquina`` desde el índice por día (sin recorrer filas).
+
+    ``filas`` (las de ``resumen_rango_maquina``, si ya se armaron) solo se
+    suman cuando un promedio cae justo en media centésima.
+    """
+    t = range_index.totales_rango(machine, desde or None, hasta or None)
+    n = int(t["n"])
+
+    def _prom(k, campo):
+        if not n:
+            return 0.0
+        c = int(t[k])  # suma exacta en centésimas
+        if filas and (2 * c) % (2 * n) == n:
+            # empate: el redondeo depende del error de la suma en flotante; se suma fila por fila como siempre
+            return round(sum(d[campo] for d in filas) / len(filas), 2)
+        return round(c / 100.0 / n, 2)
+
     return {
-        "rows": data,
-        "totals": {
-            "total": total,
-            "scrap": scrap,
-            "buenas": buenas,
-            "paro_min": round(paro, 2),
-            "availability": round(avail, 2),
-            "performance": round(perf, 2),
-            "quality": round(qual, 2),
-            "oee": round(oee, 2),
-        },
+        "total": int(round(t["total"])),
+        "scrap": int(round(t["scrap"])),
+        "buenas": int(round(t["buenas"])),
+        "paro_min": round(t["paro"] / 100.0, 2),
+        "availability": _prom("avail", "availability"),
+        "performance": _prom("perf", "performance"),
+        "quality": _prom("qual", "quality"),
+        "oee": _prom("oee", "oee"),
     }
-# ===== FIFO de inventario por molde / orden =====
+# ===== consultas por dimensión =====
+MEDIDAS = ("registros", "total", "scrap", "buenas", "meta", "paro_min",
+           "availability", "performance", "quality", "oee")
+_PCT_MEDIDA = {"availability": "avail", "performance": "perf", "quality": "qual", "oee": "oee"}
+
+
+def _maquinas(machines):
+    if machines is None:
+        return None
+    por_id = {m["id"]: m for m in MACHINES}
+    return [por_id[m] if isinstance(m, str) else m for m in machines]
+
+
+def query(machines=None, desde=None, hasta=None, group_by=(), measures=None):
+    """Producción de ``machines`` en ``[desde, hasta]`` agrupada por ``group_by``.
+
+    Dimensiones: ``maquina``, ``fecha``, ``turno``, ``operador``, ``molde``,
+    ``parte``, ``semana`` (ISO, ``"2024-W05"``), ``mes`` (``"2024-02"``) y
+    ``dia_semana`` (nombres de ``dia_semana_es``). Medidas (por omisión
+    todas): ``registros``, ``total``, ``scrap``, ``buenas``, ``meta``,
+    ``paro_min`` (de ``tiempo_paro_min``) y los promedios de las filas con
+    valor ``availability``, ``performance``, ``quality`` y ``oee``.
+    ``machines`` acepta máquinas de ``config`` o sus ids (``None`` = todas).
+    Devuelve una lista de dicts ordenada por grupo.
+    """
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+    measures = list(MEDIDAS if measures is None else measures)
+    for k in measures:
+        if k not in MEDIDAS:
+            raise ValueError(f"Medida desconocida: {k}")
+    claves, sumas = query_index.agrupar(_maquinas(machines), desde or None, hasta or None, group_by)
+    S = {k: i for i, k in enumerate(query_index.SUMAS)}
+    out = []
+    for clave, v in zip(claves, sumas):
+        r = {}
+        for d, x in zip(group_by, clave):
+            if d == "fecha":
+                x = str(np.datetime64(x, "D"))
+            elif d == "semana":
+                x = f"{x // 100}-W{x % 100:02d}"
+            elif d == "mes":
+                x = f"{x // 100}-{x % 100:02d}"
+            elif d == "dia_semana":
+                x = nombre_dia(x)
+            r[d] = x
+        for k in measures:
+            if k in _PCT_MEDIDA:
+                n = v[S[f"n_{_PCT_MEDIDA[k]}"]]
+                r[k] = round(float(v[S[f"suma_{_PCT_MEDIDA[k]}"]] / n), 2) if n else 0.0
+            elif k == "paro_min":
+                r[k] = round(float(v[S[k]]), 2)
+            else:
+                r[k] = int(round(v[S[k]]))
+        out.append(r)
+    return out
+
+
+def cubo_rendimiento(group_by=(), filtros=None, desde_mes=None, hasta_mes=None, medidas=None,
+                     orden=None, top=None, ascendente=False, min_total=0):
+    """Consulta al cubo operador × molde × parte × turno × mes (y máquina).
+
+    ``filtros`` corta por valores (``{"turno": 1, "molde": ["48", "84"]}``);
+    ``desde_mes``/``hasta_mes`` van como ``"AAAA-MM"``. Medidas: las de
+    ``performance_cube.MEDIDAS`` (OEE, A, P, Q, ``scrap_pct`` y ciclo real
+    contra ideal). Por ejemplo, los 10 pares molde/operador con más scrap del
+    trimestre::
+
+        cubo_rendimiento(["molde", "operador"], desde_mes="2024-07",
+                         hasta_mes="2024-09", orden="scrap_pct", top=10)
+    """
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+    return performance_cube.consultar(group_by, filtros, desde_mes, hasta_mes, medidas,
+                                      orden, top, ascendente, min_total)
 
-# campos compatibles para objetivo y fechas
-_OBJ_KEYS = ("qty_total", "objetivo", "objetivo_pzs", "qty", "qty_plan", "cantidad", "target", "qty_objetivo")
-_START_KEYS = ("inicio_ts", "inicio", "start", "fecha_inicio", "start_date")
 
-def _obj_de_orden(row: dict) -> int:
-    for k in _OBJ_KEYS:
-        v = row.get(k)
-        if v not in (None, ""):
-            try:
-                return int(float(v))
-            except Exception:
-                pass
-    return 0
+# ===== análisis de paros =====
+def analisis_paros(machines=None, desde=None, hasta=None, group_by=("motivo",)):
+    """Pareto de paros con MTTR y MTBF en ``[desde, hasta]``.
+
+    ``group_by`` combina ``maquina``, ``fecha``, ``turno``, ``molde`` y
+    ``motivo``. Cada fila trae ``eventos``, ``paro_min``, ``pct`` y
+    ``pct_acum`` (participación en el paro total, en orden de Pareto),
+    ``mttr_min`` (paro / eventos) y ``mtbf_min``: horas de turno capturadas
+    en producción para el mismo grupo (sin motivo) menos todo su paro,
+    entre los eventos del grupo. Filas de mayor a menor paro.
+    """
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+    machines = _maquinas(machines)
+    paros = downtime_index.agrupar(machines, desde or None, hasta or None, group_by)
+    if not paros:
+        return []
+    dims_prod = [d for d in group_by if d != "motivo"]
+    sin_motivo = [i for i, d in enumerate(group_by) if d != "motivo"]
+    claves, sumas = query_index.agrupar(machines, desde or None, hasta or None, dims_prod)
+    ih = query_index.SUMAS.index("horas")
+    plan_seg = {k: float(v[ih]) * 3600.0 for k, v in zip(claves, sumas)}
+    paro_seg: Dict[tuple, float] = {}
+    for k, (_, seg) in paros.items():
+        kp = tuple(k[i] for i in sin_motivo)
+        paro_seg[kp] = paro_seg.get(kp, 0.0) + seg
+
+    total = sum(seg for _, seg in paros.values())
+    acum = 0.0
+    out = []
+    for k, (ev, seg) in sorted(paros.items(), key=lambda kv: (-kv[1][1], kv[0])):
+        kp = tuple(k[i] for i in sin_motivo)
+        operativo = max(0.0, plan_seg.get(kp, 0.0) - paro_seg[kp])
+        acum += seg
+        r = {}
+        for d, x in zip(group_by, k):
+            r[d] = str(np.datetime64(x, "D")) if d == "fecha" else x
+        r.update(
+            eventos=int(ev),
+            paro_min=round(seg / 60.0, 2),
+            pct=round(seg * 100.0 / total, 2) if total else 0.0,
+            pct_acum=round(acum * 100.0 / total, 2) if total else 0.0,
+            mttr_min=round(seg / ev / 60.0, 2) if ev else 0.0,
+            mtbf_min=round(operativo / ev / 60.0, 2) if ev else 0.0,
+        )
+        out.append(r)
+    return out
+
+
+def paro_en_ventana(machine, t0, t1):
+    """Cuánto de ``[t0, t1)`` estuvo parada la máquina y por qué (segundos)."""
+    por_motivo = interval_index.paro_en_ventana(machine, t0, t1)
+    return {"segundos": sum(por_motivo.values()), "por_motivo": por_motivo}
+
+
+def paros_simultaneos(t0, t1, machines=None, minimo=2):
+    """Tramos de ``[t0, t1)`` con ``minimo`` o más máquinas paradas a la vez."""
+    return interval_index.simultaneos(_maquinas(machines), t0, t1, minimo)
+
+
+def paro_por_turno(machine, desde, hasta):
+    """Minutos de paro por ``(fecha, turno)`` y motivo, recortados en los cambios de turno."""
+    return {k: {mo: round(seg / 60.0, 2) for mo, seg in v.items()}
+            for k, v in interval_index.paro_por_turno(machine, desde, hasta).items()}
+
+
+# ===== escenarios (qué pasaría si) =====
+DIMENSIONES_ESCENARIO = ("maquina", "fecha", "turno", "operador", "molde", "parte", "mes")
+
+
+def _turnos_escenario(machines, desde, hasta):
+    """Columnas de todos los turnos capturados de ``machines`` en ``[desde, hasta]``."""
+    partes = []
+    for i, m in enumerate(machines):
+        c = columnas_maquina(m, desde, hasta)
+        mask = mascara_rango(c, desde, hasta)
+        partes.append(dict(
+            maquina=np.full(int(mask.sum()), i, dtype=np.int64),
+            fecha=c.fecha[mask].astype(np.int64),
+            **{k: getattr(c, k)[mask] for k in ("turno", "operador", "molde", "parte", "horas_turno",
+                                                  "ciclo_s", "paro_min", "total", "scrap")},
+        ))
+    return {k: np.concatenate([p[k] for p in partes]) for k in partes[0]} if partes else {}
 
-def _inicio_de_orden(row: dict) -> str:
-    for k in _START_KEYS:
-        v = (row.get(k) or "").strip()
-        if v:
-            return v
-    return ""  # sin fecha: queda al final si hay empate por orden
+
+def _paro_excluido(t, machines, desde, hasta, motivos):
+    """Segundos de los ``motivos`` excluidos que tocan a cada turno.
+
+    El paro se cruza por ``(máquina, fecha, turno, molde)``; si ese grupo tiene
+    varias filas de producción se reparte por igual entre ellas.
+    """
+    resta = np.zeros(len(t["fecha"]), dtype=np.float64)
+    paros = downtime_index.agrupar(machines, desde, hasta, ("maquina", "fecha", "turno", "molde", "motivo"))
+    ids = {m["id"]: i for i, m in enumerate(machines)}
+    excl: Dict[tuple, float] = {}
+    for (mid, dia, turno, molde, motivo), (_, seg) in paros.items():
+        if motivo in motivos:
+            k = (ids[mid], dia, turno, VOCAB["molde"].buscar(molde))
+            excl[k] = excl.get(k, 0.0) + seg
+    if not excl or not len(resta):
+        return resta
+    llave = np.stack([t["maquina"], t["fecha"], t["turno"].astype(np.int64), t["molde"].astype(np.int64)], axis=1)
+    grupos, inv, n = np.unique(llave, axis=0, return_inverse=True, return_counts=True)
+    inv = inv.reshape(-1)
+    por_grupo = np.zeros(len(grupos), dtype=np.float64)
+    pos = {tuple(g): i for i, g in enumerate(grupos.tolist())}
+    for k, seg in excl.items():
+        g = pos.get(k)
+        if g is not None:
+            por_grupo[g] += seg
+    return por_grupo[inv] / n[inv]
+
+
+def escenario_oee(machines=None, desde=None, hasta=None, group_by=(), ciclo_molde=None,
+                  delta_ciclo_molde=None, turnos_horas=None, excluir_motivos=()):
+    """Recalcula A, P, Q y OEE de cada turno capturado con otros supuestos.
+
+    Supuestos (todos opcionales): ``ciclo_molde`` fija el ciclo ideal de un
+    molde (``{"84": 28}``), ``delta_ciclo_molde`` lo mueve en segundos
+    (``{"84": -2}``), ``turnos_horas`` cambia las horas por turno (como
+    ``config.TURNOS_HORAS``) y ``excluir_motivos`` descuenta del paro de
+    cada turno el de esos motivos. La base se recalcula con las mismas
+    fórmulas (``calcular_tiempos_vec`` / ``calcular_metricas_vec``) para que
+    la diferencia sea solo el supuesto. Se agrupa por ``group_by`` (ver
+    ``DIMENSIONES_ESCENARIO``) y cada fila trae ``turnos``, ``total``,
+    los promedios ``availability``, ``performance``, ``quality`` y ``oee``
+    (con ``_base`` sin supuestos) y ``delta_oee``. Solo entran los turnos
+    de los logs; lo archivado no guarda ciclo por turno.
+    """
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+    for d in group_by:
+        if d not in DIMENSIONES_ESCENARIO:
+            raise ValueError(f"Dimensión desconocida: {d}")
+    machines = _maquinas(machines) or MACHINES
+    desde, hasta = desde or None, hasta or None
+    t = _turnos_escenario(machines, desde, hasta)
+    if not t or not len(t["fecha"]):
+        return []
+
+    horas = t["horas_turno"].astype(np.float64)
+    ciclo = t["ciclo_s"].astype(np.float64)
+    paro = t["paro_min"].astype(np.float64) * 60.0
+    base = calcular_tiempos_vec(horas, ciclo, paro)
+    base = calcular_metricas_vec(t["total"], t["scrap"], base[0], base[1], ciclo)
+
+    ciclo2 = ciclo.copy()
+    for molde, v in (ciclo_molde or {}).items():
+        ciclo2[t["molde"] == VOCAB["molde"].buscar(str(molde).strip())] = float(v)
+    for molde, d in (delta_ciclo_molde or {}).items():
+        sel = t["molde"] == VOCAB["molde"].buscar(str(molde).strip())
+        ciclo2[sel] = np.maximum(0.0, ciclo2[sel] + float(d))
+    horas2 = horas.copy()
+    for turno, h in (turnos_horas or {}).items():
+        horas2[t["turno"] == int(turno)] = float(h)
+    paro2 = paro
+    if excluir_motivos:
+        motivos = {excluir_motivos} if isinstance(excluir_motivos, str) else set(excluir_motivos)
+        paro2 = np.maximum(0.0, paro - _paro_excluido(t, machines, desde, hasta, motivos))
+    esc = calcular_tiempos_vec(horas2, ciclo2, paro2)
+    esc = calcular_metricas_vec(t["total"], t["scrap"], esc[0], esc[1], ciclo2)
+
+    cols = {d: t[d] for d in ("maquina", "fecha", "turno", "operador", "molde", "parte")}
+    if "mes" in group_by:
+        f = t["fecha"].astype("datetime64[D]")
+        cols["mes"] = ((f.astype("datetime64[Y]").astype(np.int64) + 1970) * 100
+                       + f.astype("datetime64[M]").astype(np.int64) % 12 + 1)
+    n_filas = len(t["fecha"])
+    if group_by:
+        llave = np.stack([cols[d].astype(np.int64) for d in group_by], axis=1)
+        grupos, inv = np.unique(llave, axis=0, return_inverse=True)
+        inv = inv.reshape(-1)
+    else:
+        grupos, inv = np.zeros((1, 0), dtype=np.int64), np.zeros(n_filas, dtype=np.int64)
+    ng = len(grupos)
+    turnos = np.bincount(inv, minlength=ng)
+
+    def promedio(x):
+        return np.bincount(inv, weights=x, minlength=ng) / turnos
+
+    medidas = {"total": np.bincount(inv, weights=t["total"], minlength=ng)}
+    for i, k in enumerate(("availability", "performance", "quality", "oee"), start=1):
+        medidas[f"{k}_base"] = promedio(base[i])
+        medidas[k] = promedio(esc[i])
+
+    out = []
+    for g, clave in enumerate(grupos.tolist()):
+        r = {}
+        for d, x in zip(group_by, clave):
+            if d == "maquina":
+                x = machines[x]["id"]
+            elif d == "fecha":
+                x = str(np.datetime64(x, "D"))
+            elif d in ("operador", "molde", "parte"):
+                x = VOCAB[d].valores[x]
+            elif d == "mes":
+                x = f"{x // 100}-{x % 100:02d}"
+            r[d] = x
+        r["turnos"] = int(turnos[g])
+        r["total"] = int(medidas["total"][g])
+        for k in ("availability", "performance", "quality", "oee"):
+            r[f"{k}_base"] = round(float(medidas[f"{k}_base"][g]), 2)
+            r[k] = round(float(medidas[k][g]), 2)
+        r["delta_oee"] = round(r["oee"] - r["oee_base"], 2)
+        out.append(r)
+    return out
+
+
+# ===== FIFO de inventario por molde / orden =====
 
 def compute_fifo_assignments(orders=None):
     """
@@ -474,64 +801,39 @@ def compute_fifo_assignments(orders=None):
       - remaining_by_mold[molde] -> piezas netas del molde que quedaron sin asignar
       - bruto_by_mold[molde], shipped_by_mold[molde]
       - order_to_mold[orden] -> molde
+      - shipped_by_order[orden] -> enviados aprobados de la orden
     Reglas:
       stock_neto_molde = producido_por_molde_global - enviados_por_molde (solo approved)
       necesidad_orden = max(0, objetivo - enviados_por_orden)
       FIFO: se ordena por fecha de inicio y luego por número de orden.
+    Sin ``orders`` se devuelve la instantánea compartida (de solo lectura) de
+    ``fifo_engine``: el mismo objeto para todas las vistas hasta que cambien
+    plan, salidas o producción. Con ``orders`` se calcula un dict aparte.
     """
     if orders is None:
-        orders = leer_csv_dict(PLANNING_CSV)
-
-    order_to_mold = {(r.get("orden","") or "").strip(): (r.get("molde_id","") or "").strip() for r in orders}
-    molds = sorted({m for m in order_to_mold.values() if m})
-
-    bruto_by_mold   = {m: int(producido_por_molde_global(m) or 0) for m in molds}
-    shipped_by_mold = {m: enviados_por_molde(m) for m in molds}
-    net_by_mold     = {m: max(0, bruto_by_mold[m] - shipped_by_mold[m]) for m in molds}
-
-    # agrupar órdenes por molde
-    grp = {m: [] for m in molds}
-    for r in orders:
-        o = (r.get("orden","") or "").strip()
-        m = (r.get("molde_id","") or "").strip()
-        if not (o and m):
-            continue
-        grp.setdefault(m, []).append((_inicio_de_orden(r), o, r))
-
-    assigned_by_order = {}
-    remaining_by_mold = {}
-    for m, lst in grp.items():
-        lst.sort(key=lambda t: (t[0], t[1]))  # FIFO
-        rem = net_by_mold.get(m, 0)
-        for _, o, row in lst:
-            objetivo = _obj_de_orden(row)
-            enviado  = enviados_por_orden(o)  # solo approved
-            necesidad = max(0, objetivo - enviado)
-            asignado = max(0, min(necesidad, rem))
-            assigned_by_order[o] = asignado
-            rem -= asignado
-            if rem <= 0:
-                rem = 0
-        remaining_by_mold[m] = rem
+        return fifo_engine.instantanea()
+    return fifo_engine.asignacion(como_ordenes(orders))
 
-    return dict(
-        assigned_by_order=assigned_by_order,
-        remaining_by_mold=remaining_by_mold,
-        bruto_by_mold=bruto_by_mold,
-        shipped_by_mold=shipped_by_mold,
-        order_to_mold=order_to_mold,
-    )
+def disponible_para_orden(row: Orden) -> int:
+    """``progreso - enviado`` de ``order_metrics`` recalculando solo el molde de la orden."""
+    c = fifo_engine.cadena_de_orden(row.orden)
+    enviado = enviados_por_orden(row.orden)
+    asignado = c.asignado.get(row.orden, 0) if c is not None else 0
+    return min(row.objetivo, enviado + asignado) - enviado
 
-def order_metrics(row: dict, fifo=None):
+def order_metrics(row, fifo=None):
     """
     Métricas listas para UI por orden:
       objetivo, enviado, asignado, progreso(=enviado+asignado limitado a objetivo), pendiente.
     """
     if fifo is None:
         fifo = compute_fifo_assignments()
-    orden = (row.get("orden","") or "").strip()
-    objetivo = _obj_de_orden(row)
-    enviado  = enviados_por_orden(orden)
+    if isinstance(row, Orden):
+        orden, objetivo = row.orden, row.objetivo
+    else:
+        orden, objetivo = (row.get("orden","") or "").strip(), objetivo_de_fila(row)
+    shipped = fifo.get("shipped_by_order")
+    enviado = shipped[orden] if shipped and orden in shipped else enviados_por_orden(orden)
     asignado = int(fifo.get("assigned_by_order", {}).get(orden, 0))
     progreso = min(objetivo, enviado + asignado)
     pendiente = max(0, objetivo - progreso)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Índice de piezas buenas por ``(molde, fecha)`` de todas las máquinas.
+
+Reemplaza el recorrido de los logs en ``producido_por_molde_global``: las
+filas de producción se suman una vez por molde y día (las nuevas del lector
+incremental, sin recorrer lo anterior; ver ``columnar.Fuentes``) junto con
+lo archivado. Cada molde guarda sus días ordenados con suma acumulada, así
+el total a la fecha es una búsqueda binaria.
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import archive
+import config
+from columnar import VOCAB, Fuentes, fecha_np
+
+_SIN_FECHA = None  # filas sin fecha: cuentan para cualquier ``hasta``
+
+
+def _por_molde_dia(molde: np.ndarray, fecha: np.ndarray, buenas: np.ndarray) -> Dict[Tuple[str, Optional[int]], int]:
+    """Suma de ``buenas`` por ``(molde, día)`` de un lote de columnas."""
+    out: Dict[Tuple[str, Optional[int]], int] = {}
+    if not len(molde):
+        return out
+    nat = np.isnat(fecha)
+    dias = np.where(nat, 0, fecha.astype(np.int64))
+    claves = np.empty(len(molde), dtype=[("molde", np.int64), ("nat", bool), ("dia", np.int64)])
+    claves["molde"], claves["nat"], claves["dia"] = molde, nat, dias
+    grupos, inv = np.unique(claves, return_inverse=True)
+    sumas = np.bincount(inv, weights=buenas.astype(np.float64), minlength=len(grupos))
+    valores = VOCAB["molde"].valores
+    for (m, sin, d), s in zip(grupos.tolist(), sumas.tolist()):
+        k = (valores[m], _SIN_FECHA if sin else d)
+        out[k] = out.get(k, 0) + int(s)
+    return out
+
+
+class IndiceMoldes:
+    """``molde -> día -> buenas`` de todas las máquinas."""
+
+    def __init__(self):
+        self._reiniciar()
+
+    def _reiniciar(self) -> None:
+        self.fuentes = Fuentes()
+        self.archivos: Dict[str, object] = {}
+        self.dias: Dict[str, Dict[Optional[int], int]] = {}
+        self._orden: Dict[str, tuple] = {}   # molde -> (días ordenados, acumulado, sin fecha)
+
+    def _sumar(self, grupos: Dict[Tuple[str, Optional[int]], int]) -> None:
+        for (molde, dia), buenas in grupos.items():
+            d = self.dias.setdefault(molde, {})
+            d[dia] = d.get(dia, 0) + buenas
+            self._orden.pop(molde, None)
+
+    def actualizar(self) -> None:
+        fuentes = self.fuentes.leer([m["oee_csv"] for m in config.MACHINES])
+        archivos = {m["id"]: archive.resumen_produccion(m) for m in config.MACHINES}
+        vigente = archivos.keys() == self.archivos.keys() and all(
+            archivos[k] is v for k, v in self.archivos.items())
+        if not vigente or not self.fuentes.vigente(fuentes):
+            self._reiniciar()
+            self.archivos = archivos
+            for arch in archivos.values():
+                self._sumar(_por_molde_dia(arch.molde, arch.fecha, arch.buenas_pzs))
+        for _, sub in self.fuentes.nuevas(fuentes):
+            self._sumar(_por_molde_dia(sub.molde, sub.fecha, sub.buenas))
+
+    def _ordenado(self, molde: str) -> tuple:
+        o = self._orden.get(molde)
+        if o is None:
+            d = self.dias.get(molde, {})
+            dias = np.array(sorted(k for k in d if k is not _SIN_FECHA), dtype=np.int64)
+            acum = np.cumsum([d[k] for k in dias.tolist()], dtype=np.int64)
+            o = self._orden[molde] = (dias, acum, d.get(_SIN_FECHA, 0))
+        return o
+
+    def producido(self, molde: str, hasta: Optional[int] = None) -> int:
+        dias, acum, sin_fecha = self._ordenado(molde)
+        if hasta is None:
+            i = len(dias)
+        else:
+            i = int(np.searchsorted(dias, hasta, side="right"))
+        return sin_fecha + (int(acum[i - 1]) if i else 0)
+
+
+def _pendientes(molde: str, hasta: Optional[int]) -> int:
+    cols = _INDICE.fuentes.pendientes([m["oee_csv"] for m in config.MACHINES])
+    if cols is None:
+        return 0
+    total = 0
+    for (mo, dia), buenas in _por_molde_dia(cols.molde, cols.fecha, cols.buenas).items():
+        if mo == molde and (dia is _SIN_FECHA or hasta is None or dia <= hasta):
+            total += buenas
+    return total
+
+
+_INDICE = IndiceMoldes()
+_LOCK = threading.Lock()
+
+
+def producido(molde_id: str, hasta_fecha: Optional[str] = None) -> int:
+    """Piezas buenas del molde en todas las máquinas, todo o hasta ``hasta_fecha``."""
+    molde = str(molde_id).strip()
+    h = fecha_np(hasta_fecha)
+    hasta = None if np.isnat(h) else int(h.astype(np.int64))
+    with _LOCK:
+        _INDICE.actualizar()
+        total = _INDICE.producido(molde, hasta)
+    return total + _pendientes(molde, hasta)
+
+
+def fechas_molde(molde_id: str) -> List[str]:
+    """Fechas (ISO) con producción del molde en alguna máquina, en orden."""
+    molde = str(molde_id).strip()
+    with _LOCK:
+        _INDICE.actualizar()
+        dias = _INDICE._ordenado(molde)[0]
+    return [str(d) for d in dias.astype("datetime64[D]")]
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Cubo de rendimiento por máquina × operador × molde × parte × turno × mes.
+
+Se arma desde el grano fino de ``query_index`` (que ya sigue los logs y el
+archivo) sumando por mes, y se guarda mientras ``query_index.sello()`` no
+cambie. Las consultas cortan (``filtros``), agrupan por cualquier
+subconjunto de las dimensiones y ordenan por una medida para sacar los N
+primeros sin volver a tocar los CSV.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import config
+import query_index
+from columnar import VOCAB
+
+DIMENSIONES = ("maquina", "operador", "molde", "parte", "turno", "mes")
+MEDIDAS = ("registros", "total", "scrap", "buenas", "availability", "performance", "quality", "oee",
+           "scrap_pct", "ciclo_ideal_s", "ciclo_real_s", "ciclo_ratio")
+_PCT = {"availability": "avail", "performance": "perf", "quality": "qual", "oee": "oee"}
+_S = {k: i for i, k in enumerate(query_index.SUMAS)}
+
+
+class Cubo:
+    """Claves enteras (una columna por dimensión) y sumas por celda."""
+
+    def __init__(self, machines: Sequence):
+        self.machines = list(machines)
+        claves, vals, maq = query_index.tabla_maquinas(self.machines)
+        if not len(claves):
+            self.claves = np.zeros((0, len(DIMENSIONES)), dtype=np.int64)
+            self.vals = vals
+            return
+        llave = np.stack([query_index.columna(d, claves, maq) for d in DIMENSIONES], axis=1)
+        self.claves, inv = np.unique(llave, axis=0, return_inverse=True)
+        self.vals = np.zeros((len(self.claves), vals.shape[1]), dtype=np.float64)
+        np.add.at(self.vals, inv.reshape(-1), vals)
+
+    def _codigos(self, d: str, valores: Iterable) -> List[int]:
+        if d == "maquina":
+            ids = [m["id"] for m in self.machines]
+            return [ids.index(v) for v in valores if v in ids]
+        if d in ("operador", "molde", "parte"):
+            return [VOCAB[d].buscar(str(v).strip()) for v in valores]
+        if d == "mes":
+            return [_mes(v) for v in valores]
+        return [int(v) for v in valores]
+
+    def mascara(self, filtros: Dict[str, object], desde_mes: Optional[int], hasta_mes: Optional[int]) -> np.ndarray:
+        mask = np.ones(len(self.claves), dtype=bool)
+        for d, valores in (filtros or {}).items():
+            if d not in DIMENSIONES:
+                raise ValueError(f"Dimensión desconocida: {d}")
+            if isinstance(valores, (str, int)):
+                valores = [valores]
+            mask &= np.isin(self.claves[:, DIMENSIONES.index(d)], self._codigos(d, valores))
+        im = DIMENSIONES.index("mes")
+        if desde_mes is not None:
+            mask &= self.claves[:, im] >= desde_mes
+        if hasta_mes is not None:
+            mask &= self.claves[:, im] <= hasta_mes
+        return mask
+
+    def texto(self, d: str, v: int):
+        if d == "maquina":
+            return self.machines[v]["id"]
+        if d in ("operador", "molde", "parte"):
+            return VOCAB[d].valores[v]
+        if d == "mes":
+            return f"{v // 100}-{v % 100:02d}"
+        return v
+
+
+def _mes(v) -> int:
+    """``"AAAA-MM"`` (o una fecha ``AAAA-MM-DD``) como ``año*100+mes``."""
+    s = str(v).strip()
+    return int(s[:4]) * 100 + int(s[5:7])
+
+
+def _medidas(v: np.ndarray) -> Dict[str, np.ndarray]:
+    def div(a, b):
+        return np.divide(a, b, out=np.zeros_like(a), where=b > 0)
+
+    total = v[:, _S["total"]]
+    out = {k: v[:, _S[k]] for k in ("registros", "total", "scrap", "buenas")}
+    for k, c in _PCT.items():
+        out[k] = div(v[:, _S[f"suma_{c}"]], v[:, _S[f"n_{c}"]])
+    out["scrap_pct"] = div(v[:, _S["scrap"]] * 100.0, total)
+    out["ciclo_ideal_s"] = div(v[:, _S["ciclo_pzs"]], v[:, _S["pzs_ciclo"]])
+    oper_seg = np.maximum(0.0, v[:, _S["horas"]] * 3600.0 - v[:, _S["paro_min"]] * 60.0)
+    out["ciclo_real_s"] = div(oper_seg, total)
+    out["ciclo_ratio"] = div(out["ciclo_real_s"], out["ciclo_ideal_s"])
+    return out
+
+
+_CUBO: Optional[Tuple[tuple, Cubo]] = None
+_LOCK = threading.Lock()
+
+
+def cubo(machines: Optional[Sequence] = None) -> Cubo:
+    """Cubo vigente (se rearma solo si cambió algún índice de producción)."""
+    global _CUBO
+    machines = config.MACHINES if machines is None else machines
+    sello = query_index.sello(machines)
+    with _LOCK:
+        if _CUBO is None or _CUBO[0] != sello:
+            _CUBO = (sello, Cubo(machines))
+        return _CUBO[1]
+
+
+def consultar(group_by: Sequence[str] = (), filtros: Optional[Dict[str, object]] = None,
+              desde_mes=None, hasta_mes=None, medidas: Optional[Sequence[str]] = None,
+              orden: Optional[str] = None, top: Optional[int] = None, ascendente: bool = False,
+              min_total: int = 0) -> List[Dict[str, object]]:
+    """Corte del cubo agrupado por ``group_by``; con ``orden``/``top`` los N primeros."""
+    for d in group_by:
+        if d not in DIMENSIONES:
+            raise ValueError(f"Dimensión desconocida: {d}")
+    medidas = list(MEDIDAS if medidas is None else medidas)
+    for k in medidas + ([orden] if orden else []):
+        if k not in MEDIDAS:
+            raise ValueError(f"Medida desconocida: {k}")
+    c = cubo()
+    mask = c.mascara(filtros, None if desde_mes is None else _mes(desde_mes),
+                     None if hasta_mes is None else _mes(hasta_mes))
+    claves, vals = c.claves[mask], c.vals[mask]
+    if not len(claves):
+        return []
+    cols = [DIMENSIONES.index(d) for d in group_by]
+    if cols:
+        grupos, inv = np.unique(claves[:, cols], axis=0, return_inverse=True)
+        suma = np.zeros((len(grupos), vals.shape[1]), dtype=np.float64)
+        np.add.at(suma, inv.reshape(-1), vals)
+    else:
+        grupos, suma = np.zeros((1, 0), dtype=np.int64), vals.sum(axis=0, keepdims=True)
+    m = _medidas(suma)
+    idx = np.flatnonzero(m["total"] >= min_total)
+    if orden:
+        clave = m[orden][idx]
+        idx = idx[np.argsort(clave if ascendente else -clave, kind="stable")]
+    if top:
+        idx = idx[:top]
+    out = []
+    for i in idx.tolist():
+        r = {d: c.texto(d, v) for d, v in zip(group_by, grupos[i].tolist())}
+        for k in medidas:
+            x = float(m[k][i])
+            r[k] = int(round(x)) if k in ("registros", "total", "scrap", "buenas") else round(x, 2)
+        out.append(r)
+    return out
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""Agregados de producción por ``(día, turno, operador, molde, parte)``.
+
+Es el grano más fino que piden los reportes por dimensión: cada máquina
+guarda una fila de sumas por combinación (filas, piezas, minutos de paro,
+horas de turno y suma/conteo de cada porcentaje). ``agrupar`` junta esas
+filas por las dimensiones pedidas sin volver a recorrer los logs; los logs
+se siguen con ``columnar.Fuentes``. Lo archivado entra con su
+resumen ``(fecha, turno, molde)``: operador y parte vacíos.
+"""
+
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import archive
+import config
+import csv_utils
+from columnar import VOCAB, VOCAB_LOCK, Fuentes, fecha_np
+
+SUMAS = ("registros", "total", "scrap", "buenas", "meta", "paro_min", "horas",
+         "suma_avail", "n_avail", "suma_perf", "n_perf", "suma_qual", "n_qual", "suma_oee", "n_oee",
+         "ciclo_pzs", "pzs_ciclo")  # ciclo ideal × piezas y piezas con ciclo (promedio ponderado)
+_S = {k: i for i, k in enumerate(SUMAS)}
+_PCT = ("avail", "perf", "qual", "oee")
+DIMENSIONES = ("maquina", "fecha", "turno", "operador", "molde", "parte", "semana", "mes", "dia_semana")
+
+_CLAVE = np.dtype([("dia", np.int64), ("turno", np.int8), ("operador", np.int32),
+                   ("molde", np.int32), ("parte", np.int32)])
+
+
+def _agrupar_lote(claves: np.ndarray, vals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    if not len(claves):
+        return claves, vals
+    grupos, inv = np.unique(claves, return_inverse=True)
+    suma = np.zeros((len(grupos), vals.shape[1]), dtype=np.float64)
+    np.add.at(suma, inv.reshape(-1), vals)
+    return grupos, suma
+
+
+def _lote_filas(cols) -> Tuple[np.ndarray, np.ndarray]:
+    """Claves y sumas por grupo de un ``ColumnasProduccion`` (sin filas sin fecha)."""
+    ok = ~np.isnat(cols.fecha)
+    n = int(ok.sum())
+    claves = np.empty(n, dtype=_CLAVE)
+    claves["dia"] = cols.fecha[ok].astype(np.int64)
+    for k in ("turno", "operador", "molde", "parte"):
+        claves[k] = getattr(cols, k)[ok]
+    vals = np.zeros((n, len(SUMAS)), dtype=np.float64)
+    vals[:, _S["registros"]] = 1.0
+    for k, col in (("total", cols.total), ("scrap", cols.scrap), ("buenas", cols.buenas),
+                   ("meta", cols.meta), ("paro_min", cols.paro_min), ("horas", cols.horas_turno)):
+        vals[:, _S[k]] = col[ok]
+    ciclo = cols.ciclo_s[ok].astype(np.float64)
+    vals[:, _S["ciclo_pzs"]] = ciclo * cols.total[ok]
+    vals[:, _S["pzs_ciclo"]] = np.where(ciclo > 0, cols.total[ok], 0)
+    for k in _PCT:
+        col = getattr(cols, k)[ok].astype(np.float64)
+        hay = ~np.isnan(col)
+        vals[:, _S[f"suma_{k}"]] = np.where(hay, col, 0.0)
+        vals[:, _S[f"n_{k}"]] = hay
+    return _agrupar_lote(claves, vals)
+
+
+def _lote_archivo(arch) -> Tuple[np.ndarray, np.ndarray]:
+    ok = ~np.isnat(arch.fecha)
+    n = int(ok.sum())
+    with VOCAB_LOCK:
+        vacio_op, vacio_parte = VOCAB["operador"].codigo(""), VOCAB["parte"].codigo("")
+    claves = np.empty(n, dtype=_CLAVE)
+    claves["dia"] = arch.fecha[ok].astype(np.int64)
+    claves["turno"], claves["molde"] = arch.turno[ok], arch.molde[ok]
+    claves["operador"], claves["parte"] = vacio_op, vacio_parte
+    vals = np.zeros((n, len(SUMAS)), dtype=np.float64)
+    for k, col in (("registros", arch.registros), ("total", arch.total_pzs), ("scrap", arch.scrap_pzs),
+                   ("buenas", arch.buenas_pzs), ("meta", arch.meta_oper_pzs), ("paro_min", arch.tiempo_paro_min),
+                   ("horas", arch.horas_turno)):
+        vals[:, _S[k]] = col[ok]
+    for k in _PCT:
+        vals[:, _S[f"suma_{k}"]] = getattr(arch, f"suma_{k}")[ok]
+        vals[:, _S[f"n_{k}"]] = getattr(arch, f"n_{k}")[ok]
+    return _agrupar_lote(claves, vals)
+
+
+class IndiceConsulta:
+    """Sumas por grano fino de una máquina."""
+
+    def __init__(self, machine):
+        self.machine = machine
+        self.version = 0
+        self._reiniciar()
+
+    def _reiniciar(self) -> None:
+        self.fuentes = Fuentes()
+        self.arch = None
+        self.version += 1
+        self.pos: Dict[tuple, int] = {}
+        self.n = 0
+        self._claves = np.empty(64, dtype=_CLAVE)
+        self._vals = np.zeros((64, len(SUMAS)), dtype=np.float64)
+
+    def _sumar(self, grupos: np.ndarray, suma: np.ndarray) -> None:
+        if not len(grupos):
+            return
+        self.version += 1
+        idx = np.empty(len(grupos), dtype=np.int64)
+        for i, k in enumerate(grupos.tolist()):
+            j = self.pos.get(k)
+            if j is None:
+                if self.n == len(self._claves):
+                    self._claves = np.concatenate([self._claves, np.empty(self.n, dtype=_CLAVE)])
+                    self._vals = np.concatenate([self._vals, np.zeros_like(self._vals)])
+                j = self.pos[k] = self.n
+                self._claves[j] = k
+                self.n += 1
+            idx[i] = j
+        self._vals[idx] += suma  # ``grupos`` es único: sin índices repetidos
+
+    def actualizar(self) -> None:
+        m = self.machine
+        arch = archive.resumen_produccion(m)
+        fuentes = self.fuentes.leer([m["oee_csv"]])
+        if arch is not self.arch or not self.fuentes.vigente(fuentes):
+            self._reiniciar()
+            self.arch = arch
+            self._sumar(*_lote_archivo(arch))
+        for _, sub in self.fuentes.nuevas(fuentes):
+            self._sumar(*_lote_filas(sub))
+
+    def tabla(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Claves y sumas actuales más las filas encoladas (copias)."""
+        self.actualizar()
+        claves, vals = self._claves[:self.n].copy(), self._vals[:self.n].copy()
+        pend = self.fuentes.pendientes([self.machine["oee_csv"]])
+        if pend is not None:
+            pc, pv = _lote_filas(pend)
+            claves, vals = np.concatenate([claves, pc]), np.concatenate([vals, pv])
+        return claves, vals
+
+
+_INDICES: Dict[str, IndiceConsulta] = {}
+_LOCK = threading.Lock()
+
+
+def _semanas(dias: np.ndarray) -> np.ndarray:
+    """Código ``año * 100 + semana`` ISO de cada día."""
+    unicos, inv = np.unique(dias, return_inverse=True)
+    iso = [date.fromordinal(date(1970, 1, 1).toordinal() + int(d)).isocalendar() for d in unicos.tolist()]
+    return np.array([y * 100 + w for y, w, _ in iso], dtype=np.int64)[inv.reshape(-1)]
+
+
+def _indice(machine) -> IndiceConsulta:
+    ix = _INDICES.get(machine["id"])
+    if ix is None or ix.machine is not machine:
+        ix = _INDICES[machine["id"]] = IndiceConsulta(machine)
+    return ix
+
+
+def sello(machines: Optional[Sequence] = None) -> tuple:
+    """Versión de los índices de ``machines`` (cambia con cada fila nueva o encolada)."""
+    out = []
+    for m in (config.MACHINES if machines is None else machines):
+        with _LOCK:
+            ix = _indice(m)
+            ix.actualizar()
+            out.append((m["id"], ix.version, len(csv_utils.filas_pendientes(m["oee_csv"]))))
+    return tuple(out)
+
+
+def tabla_maquinas(machines: Optional[Sequence] = None, desde: Optional[str] = None,
+                   hasta: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Claves, sumas y posición de la máquina (en ``machines``) del grano fino en ``[desde, hasta]``."""
+    machines = config.MACHINES if machines is None else machines
+    d0, d1 = fecha_np(desde), fecha_np(hasta)
+    partes_c, partes_v, partes_m = [], [], []
+    for i, m in enumerate(machines):
+        with _LOCK:
+            claves, vals = _indice(m).tabla()
+        mask = np.ones(len(claves), dtype=bool)
+        if not np.isnat(d0):
+            mask &= claves["dia"] >= d0.astype(np.int64)
+        if not np.isnat(d1):
+            mask &= claves["dia"] <= d1.astype(np.int64)
+        partes_c.append(claves[mask])
+        partes_v.append(vals[mask])
+        partes_m.append(np.full(int(mask.sum()), i, dtype=np.int64))
+    if not partes_c:
+        return np.empty(0, dtype=_CLAVE), np.zeros((0, len(SUMAS)), dtype=np.float64), np.empty(0, dtype=np.int64)
+    return np.concatenate(partes_c), np.concatenate(partes_v), np.concatenate(partes_m)
+
+
+def columna(d: str, claves: np.ndarray, maq: np.ndarray) -> np.ndarray:
+    """Valor entero de la dimensión ``d`` para cada fila del grano fino."""
+    if d == "maquina":
+        return maq
+    if d == "fecha":
+        return claves["dia"]
+    if d == "semana":
+        return _semanas(claves["dia"])
+    if d == "mes":
+        m = claves["dia"].astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        return (m // 12 + 1970) * 100 + m % 12 + 1
+    if d == "dia_semana":
+        return (claves["dia"] + 3) % 7  # 1970-01-01 fue jueves
+    return claves[d].astype(np.int64)
+
+
+def agrupar(machines: Optional[Sequence] = None, desde: Optional[str] = None, hasta: Optional[str] = None,
+            dimensiones: Sequence[str] = ()) -> Tuple[List[tuple], np.ndarray]:
+    """Sumas (``SUMAS``) por combinación de ``dimensiones`` dentro de ``[desde, hasta]``.
+
+    Devuelve las claves (tuplas con un valor por dimensión: id de máquina,
+    día como entero desde 1970, turno, texto de operador/molde/parte,
+    ``año*100+semana`` ISO, ``año*100+mes`` o día de la semana 0=lunes) y una
+    matriz de sumas con una fila por clave, ordenadas por clave.
+    """
+    for d in dimensiones:
+        if d not in DIMENSIONES:
+            raise ValueError(f"Dimensión desconocida: {d}")
+    machines = config.MACHINES if machines is None else machines
+    claves, vals, maq = tabla_maquinas(machines, desde, hasta)
+    if not len(claves):
+        return [], np.zeros((0, len(SUMAS)), dtype=np.float64)
+
+    cols = [columna(d, claves, maq) for d in dimensiones]
+    if not cols:
+        return [()], vals.sum(axis=0, keepdims=True)
+    llave = np.stack(cols, axis=1)
+    grupos, inv = np.unique(llave, axis=0, return_inverse=True)
+    suma = np.zeros((len(grupos), len(SUMAS)), dtype=np.float64)
+    np.add.at(suma, inv.reshape(-1), vals)
+
+    valores = {k: VOCAB[k].valores for k in ("operador", "molde", "parte")}
+    out = []
+    for g in grupos.tolist():
+        clave = []
+        for d, v in zip(dimensiones, g):
+            if d == "maquina":
+                clave.append(machines[v]["id"])
+            elif d in valores:
+                clave.append(valores[d][v])
+            else:
+                clave.append(v)
+        out.append(tuple(clave))
+    orden = sorted(range(len(out)), key=out.__getitem__)
+    return [out[i] for i in orden], suma[orden]
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""Índice por día para totales de un rango de fechas en O(log n).
+
+Por máquina se guarda, para cada día, el vector de sumas que usa
+``metrics.resumen_rango_maquina`` (filas válidas, piezas, porcentajes
+redondeados y minutos de paro) en un árbol de Fenwick. Porcentajes y
+minutos, que el resumen redondea a 2 decimales por fila, se guardan en
+centésimas enteras: así las sumas son exactas sin importar en qué orden se
+hagan y los totales coinciden con sumar las filas una por una. Un rango
+``[desde, hasta]`` son dos prefijos. Las filas nuevas de producción o de
+paros actualizan solo los días que tocan (actualización puntual); qué es
+nuevo, qué obliga a rehacer el índice y las filas encoladas (sumadas en
+cada consulta) salen de ``columnar.Fuentes``. Un cambio del archivo
+también rehace el índice.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import archive
+from columnar import Fuentes, fecha_np, flotante, redondear2
+
+CAMPOS = ("n", "total", "scrap", "buenas", "avail", "perf", "qual", "oee", "paro")
+_K = len(CAMPOS)
+_I = {k: i for i, k in enumerate(CAMPOS)}
+_PCT = ("avail", "perf", "qual", "oee")
+
+
+def _centesimas(x) -> np.ndarray:
+    """``x`` redondeado a 2 decimales (como ``round``), en centésimas enteras."""
+    return np.rint(redondear2(x) * 100.0)
+
+
+def _cent(v: float) -> float:
+    return float(round(round(v, 2) * 100.0))
+
+
+class Fenwick:
+    """Árbol de Fenwick de vectores (una columna por métrica)."""
+
+    def __init__(self, valores: np.ndarray):
+        self.valores = valores
+        n = len(valores)
+        arbol = np.zeros((n + 1, valores.shape[1]), dtype=np.float64)
+        arbol[1:] = valores
+        for j in range(1, n + 1):  # construcción lineal
+            p = j + (j & -j)
+            if p <= n:
+                arbol[p] += arbol[j]
+        self._arbol = arbol
+
+    def __len__(self):
+        return len(self.valores)
+
+    def sumar(self, i: int, delta: np.ndarray) -> None:
+        self.valores[i] += delta
+        j, n = i + 1, len(self.valores)
+        while j <= n:
+            self._arbol[j] += delta
+            j += j & -j
+
+    def prefijo(self, i: int) -> np.ndarray:
+        """Suma de ``valores[:i]``."""
+        out = np.zeros(self._arbol.shape[1], dtype=np.float64)
+        j = min(i, len(self.valores))
+        while j > 0:
+            out += self._arbol[j]
+            j -= j & -j
+        return out
+
+    def rango(self, i0: int, i1: int) -> np.ndarray:
+        """Suma de ``valores[i0:i1 + 1]``."""
+        return self.prefijo(i1 + 1) - self.prefijo(max(0, i0))
+
+
+def _dias(fechas) -> np.ndarray:
+    return np.asarray(fechas, dtype="datetime64[D]").astype(np.int64)
+
+
+def _valores_filas(cols, mask) -> tuple:
+    """Días y vectores (sin paro) de las filas válidas de ``cols``."""
+    total = cols.total[mask].astype(np.float64)
+    scrap = cols.scrap[mask].astype(np.float64)
+    vals = np.zeros((int(mask.sum()), _K), dtype=np.float64)
+    vals[:, _I["n"]] = 1.0
+    vals[:, _I["total"]] = total
+    vals[:, _I["scrap"]] = scrap
+    vals[:, _I["buenas"]] = np.maximum(0, total - scrap)
+    for k in _PCT:
+        # porcentajes vacíos cuentan como 0 en el rango
+        vals[:, _I[k]] = _centesimas(np.nan_to_num(getattr(cols, k)[mask].astype(np.float64)))
+    return _dias(cols.fecha[mask]), vals
+
+
+def _validas(cols) -> np.ndarray:
+    return ~np.isnat(cols.fecha) & (cols.total > 0) & (cols.meta > 0)
+
+
+def _valores_archivo(arch) -> tuple:
+    mask = ~np.isnat(arch.fecha) & (arch.total_pzs > 0) & (arch.meta_oper_pzs > 0)
+    reg = arch.registros[mask]
+    vals = np.zeros((int(mask.sum()), _K), dtype=np.float64)
+    vals[:, _I["n"]] = 1.0  # un grupo (fecha, turno, molde) cuenta como una fila
+    vals[:, _I["total"]] = arch.total_pzs[mask]
+    vals[:, _I["scrap"]] = arch.scrap_pzs[mask]
+    vals[:, _I["buenas"]] = np.maximum(0, arch.total_pzs[mask] - arch.scrap_pzs[mask])
+    for k in _PCT:
+        vals[:, _I[k]] = _centesimas(getattr(arch, f"suma_{k}")[mask] / reg)
+    return _dias(arch.fecha[mask]), vals
+
+
+def _agrupar(dias: np.ndarray, vals: np.ndarray):
+    if not len(dias):
+        return [], vals[:0]
+    unicos, inv = np.unique(dias, return_inverse=True)
+    suma = np.zeros((len(unicos), vals.shape[1]), dtype=np.float64)
+    np.add.at(suma, inv, vals)
+    return unicos.tolist(), suma
+
+
+def _minutos_filas(rows: List[Dict[str, str]]) -> Dict[int, List[float]]:
+    # minutos de cada paro por día, en orden de archivo: se suman uno a uno como el resumen
+    out: Dict[int, List[float]] = {}
+    for r in rows:
+        d = fecha_np(r.get("fecha"))
+        if np.isnat(d):
+            continue
+        out.setdefault(int(d.astype(np.int64)), []).append(flotante(r.get("duracion_seg"), 0.0) / 60.0)
+    return out
+
+
+def _minutos_archivo(paros: Dict[str, float]) -> Dict[int, List[float]]:
+    out: Dict[int, List[float]] = {}
+    for f, v in paros.items():
+        d = fecha_np(f)
+        if not np.isnat(d):
+            out[int(d.astype(np.int64))] = [v]
+    return out
+
+
+def _acumular(viejo: float, minutos: List[float]) -> float:
+    for m in minutos:
+        viejo += m
+    return viejo
+
+
+class IndiceRango:
+    """Índice por día de una máquina."""
+
+    def __init__(self, machine):
+        self.machine = machine
+        self._reiniciar()
+
+    def _reiniciar(self) -> None:
+        self.base = 0
+        self.fw: Optional[Fenwick] = None
+        self.oee = Fuentes()
+        self.down = Fuentes(columnas=False)
+        self.paro_dia: Dict[int, float] = {}
+        self.arch = None
+        self.arch_paros = None
+
+    # ----- estructura -----
+    def _asegurar(self, dmin: int, dmax: int) -> None:
+        if self.fw is None:
+            self.base = dmin
+            self.fw = Fenwick(np.zeros((max(64, dmax - dmin + 1), _K), dtype=np.float64))
+            return
+        if dmin >= self.base and dmax < self.base + len(self.fw):
+            return
+        base = min(self.base, dmin)
+        n = max(dmax, self.base + len(self.fw) - 1) - base + 1
+        vals = np.zeros((max(n, 2 * len(self.fw)), _K), dtype=np.float64)
+        off = self.base - base
+        vals[off:off + len(self.fw)] = self.fw.valores
+        self.base, self.fw = base, Fenwick(vals)
+
+    def _sumar_dias(self, dias: list, suma: np.ndarray) -> None:
+        if not dias:
+            return
+        self._asegurar(min(dias), max(dias))
+        ip = _I["paro"]
+        for d, v in zip(dias, suma):
+            v = v.copy()
+            v[ip] = v[_I["n"]] * _cent(self.paro_dia.get(d, 0.0))
+            self.fw.sumar(d - self.base, v)
+
+    def _sumar_paros(self, minutos: Dict[int, List[float]]) -> None:
+        if not minutos:
+            return
+        self._asegurar(min(minutos), max(minutos))
+        ip, delta = _I["paro"], np.zeros(_K, dtype=np.float64)
+        for d, m in minutos.items():
+            viejo = self.paro_dia.get(d, 0.0)
+            nuevo = self.paro_dia[d] = _acumular(viejo, m)
+            n = self.fw.valores[d - self.base, _I["n"]]
+            if n:
+                delta[ip] = n * (_cent(nuevo) - _cent(viejo))
+                self.fw.sumar(d - self.base, delta)
+
+    # ----- sincronizar con los logs -----
+    def actualizar(self) -> None:
+        m = self.machine
+        arch, arch_paros = archive.resumen_produccion(m), archive.paros_por_fecha(m)
+        oee, down = self.oee.leer([m["oee_csv"]]), self.down.leer([m["down_csv"]])
+        vigente = (arch is self.arch and arch_paros is self.arch_paros
+                   and self.oee.vigente(oee) and self.down.vigente(down))
+        if not vigente:
+            self._reiniciar()
+            self.arch, self.arch_paros = arch, arch_paros
+            self._sumar_paros(_minutos_archivo(arch_paros))
+            self._sumar_dias(*_agrupar(*_valores_archivo(arch)))
+        # paros primero: las filas de producción nuevas toman el paro del día ya sumado
+        for _, rows in self.down.nuevas(down):
+            self._sumar_paros(_minutos_filas(rows))
+        for _, sub in self.oee.nuevas(oee):
+            self._sumar_dias(*_agrupar(*_valores_filas(sub, _validas(sub))))
+
+    # ----- consultas -----
+    def totales(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> np.ndarray:
+        self.actualizar()
+        d0 = fecha_np(desde)
+        d1 = fecha_np(hasta)
+        i0 = int(d0.astype(np.int64)) if not np.isnat(d0) else None
+        i1 = int(d1.astype(np.int64)) if not np.isnat(d1) else None
+        out = np.zeros(_K, dtype=np.float64)
+        if self.fw is not None:
+            a = 0 if i0 is None else max(0, i0 - self.base)
+            b = len(self.fw) - 1 if i1 is None else min(len(self.fw) - 1, i1 - self.base)
+            if a <= b:
+                out += self.fw.rango(a, b)
+        self._sumar_pendientes(out, i0, i1)
+        return out
+
+    def _sumar_pendientes(self, out: np.ndarray, i0: Optional[int], i1: Optional[int]) -> None:
+        m = self.machine
+        pend_oee = self.oee.pendientes([m["oee_csv"]])
+        pend_down = self.down.pendientes([m["down_csv"]]) or []
+        if pend_oee is None and not pend_down:
+            return
+
+        def dentro(d):
+            return (i0 is None or d >= i0) and (i1 is None or d <= i1)
+
+        extra_paro = {d: v for d, v in _minutos_filas(pend_down).items() if dentro(d)}
+        dias, suma = [], None
+        if pend_oee is not None:
+            dias, suma = _agrupar(*_valores_filas(pend_oee, _validas(pend_oee)))
+        nuevos = {d: v for d, v in zip(dias, suma) if dentro(d)} if dias else {}
+        ip, iN = _I["paro"], _I["n"]
+        for d in set(extra_paro) | set(nuevos):
+            viejo = self.paro_dia.get(d, 0.0)
+            nuevo = _acumular(viejo, extra_paro.get(d, []))
+            n_idx = 0.0
+            if self.fw is not None and 0 <= d - self.base < len(self.fw):
+                n_idx = self.fw.valores[d - self.base, iN]
+            out[ip] += n_idx * (_cent(nuevo) - _cent(viejo))
+            v = nuevos.get(d)
+            if v is not None:
+                out += v
+                out[ip] += v[iN] * _cent(nuevo)
+
+
+_INDICES: Dict[str, IndiceRango] = {}
+_LOCK = threading.Lock()
+
+
+def indice(machine) -> IndiceRango:
+    with _LOCK:
+        ix = _INDICES.get(machine["id"])
+        if ix is None or ix.machine is not machine:
+            ix = _INDICES[machine["id"]] = IndiceRango(machine)
+        return ix
+
+
+def totales_rango(machine, desde: Optional[str] = None, hasta: Optional[str] = None) -> Dict[str, float]:
+    """Sumas de ``CAMPOS`` para ``[desde, hasta]`` (ambos opcionales; porcentajes y paro en centésimas)."""
+    ix = indice(machine)
+    with _LOCK:
+        v = ix.totales(desde, hasta)
+    return dict(zip(CAMPOS, v.tolist()))
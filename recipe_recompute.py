@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Recálculo retroactivo de turnos cuando se corrige el ciclo ideal de una receta.
+
+Si ``ciclo_ideal_s`` de un molde estaba mal, cada turno guardado con ese
+molde tiene ``ciclo_s``, ``meta_oper_pzs``, ``performance_%`` y ``oee_%``
+viejos. Este trabajo busca los meses con producción del molde en
+``mold_index``, revisa solo esos archivos (shards mensuales o el log plano)
+con sus columnas en caché y reescribe, de forma atómica y con el candado del
+log, únicamente los archivos que tienen turnos por corregir. Los turnos se
+recalculan juntos con ``calcular_tiempos_vec`` / ``calcular_metricas_vec``
+(el paro sale de ``tiempo_paro_min``); disponibilidad y calidad no dependen
+del ciclo y se conservan. Después se rehacen solo las filas de las tablas
+diarias de las fechas tocadas. El rollup de cada archivo reescrito se rehace
+solo en la siguiente lectura (ver ``rollup``); los demás no se tocan.
+
+Uso: ``python recipe_recompute.py <molde> [ciclo_s]`` (sin ciclo toma el de
+la receta activa del molde).
+"""
+
+import os
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+import config
+import csv_utils
+import metrics
+import mold_index
+import write_journal
+from columnar import VOCAB, columnas_archivo, flotante, mascara_rango
+from file_lock import bloqueo_csv, subir_version
+from records import leer_recetas
+
+
+def ciclo_receta(molde: str) -> Optional[int]:
+    """Ciclo que captura usa para ``molde`` (la última receta activa, en segundos enteros)."""
+    ciclo = None
+    for r in leer_recetas():
+        if r.activo and r.molde_id == molde:
+            ciclo = int(r.ciclo_ideal_s)
+    return ciclo
+
+
+def recalcular_filas(rows: List[Dict[str, str]], ciclo: int) -> List[Dict[str, str]]:
+    """Copias de ``rows`` con ``ciclo`` y su meta, performance y OEE recalculados."""
+    n = len(rows)
+    num = {k: np.array([flotante(r.get(k), 0.0) for r in rows], dtype=np.float64)
+           for k in ("horas_turno", "tiempo_paro_min", "total_pzs", "scrap_pzs")}
+    ciclos = np.full(n, float(ciclo))
+    turno_seg, oper_seg, _, meta = metrics.calcular_tiempos_vec(
+        num["horas_turno"], ciclos, num["tiempo_paro_min"] * 60.0)
+    _, A, P, Q, _ = metrics.calcular_metricas_vec(
+        num["total_pzs"].astype(np.int64), num["scrap_pzs"].astype(np.int64), turno_seg, oper_seg, ciclos)
+    # A y Q se conservan tal como se guardaron (solo cambian si faltan)
+    a = np.array([flotante(r.get("availability_%")) for r in rows], dtype=np.float64)
+    q = np.array([flotante(r.get("quality_%")) for r in rows], dtype=np.float64)
+    a = np.where(np.isnan(a), A, a)
+    q = np.where(np.isnan(q), Q, q)
+    oee = np.round(a * P * q / 10000.0, 2)
+    out = []
+    for r, m, p, o in zip(rows, meta.tolist(), P.tolist(), oee.tolist()):
+        r = dict(r)
+        r.update({"ciclo_s": str(ciclo), "meta_oper_pzs": str(m), "performance_%": str(p), "oee_%": str(o)})
+        out.append(r)
+    return out
+
+
+def _afectada(r: Dict[str, str], molde: str, ciclo: int, anterior: Optional[int],
+              desde: Optional[str], hasta: Optional[str]) -> bool:
+    if (r.get("molde") or "").strip() != molde:
+        return False
+    f = (r.get("fecha") or "").strip()
+    if (desde or hasta) and (not f or (desde and f < desde) or (hasta and f > hasta)):
+        return False
+    c = int(flotante(r.get("ciclo_s"), 0.0))
+    return c != ciclo and (anterior is None or c == anterior)
+
+
+def _candidato(path: str, molde: str, ciclo: int, anterior: Optional[int],
+               desde: Optional[str], hasta: Optional[str]) -> bool:
+    """Revisión rápida (columnas en caché, sin candado) de si ``path`` tiene turnos por corregir."""
+    cols = columnas_archivo(path)
+    c = np.trunc(cols.ciclo_s).astype(np.int64)
+    mask = (cols.molde == VOCAB["molde"].buscar(molde)) & (c != ciclo)
+    if anterior is not None:
+        mask &= c == anterior
+    if desde or hasta:
+        mask &= mascara_rango(cols, desde, hasta)
+    return bool(mask.any())
+
+
+def _fuentes(machine, meses: Set[str]) -> List[str]:
+    fuentes = csv_utils.fuentes_log(machine["oee_csv"])
+    if csv_utils.almacen_sqlite() is None and csv_utils.particionado(machine["oee_csv"]):
+        fuentes = [p for p in fuentes if os.path.basename(p)[:-4] in meses]
+    return fuentes
+
+
+def _reescribir(log: str, path: str, mutar) -> None:
+    """Aplica ``mutar`` a las filas de ``path`` (shard o log) y lo reemplaza de forma atómica."""
+    if csv_utils.almacen_sqlite() is not None:
+        csv_utils.actualizar_csv(log, csv_utils.OEE_FIELDS, mutar)
+        return
+    with bloqueo_csv(log):
+        rows = csv_utils.parsear_csv(path) or []
+        nuevas = mutar(rows)
+        if nuevas is None:
+            return
+        try:
+            csv_utils.reemplazar_csv(path, csv_utils.OEE_FIELDS, nuevas)
+        finally:
+            csv_utils.invalidar_cache(path)
+            csv_utils.olvidar_cache(path)
+        subir_version(log)
+
+
+def corregir_ciclo(molde: str, ciclo: Optional[int] = None, anterior: Optional[int] = None,
+                   machines=None, desde: Optional[str] = None, hasta: Optional[str] = None) -> Dict[str, object]:
+    """Pasa a ``ciclo`` (por omisión el de la receta) los turnos guardados de ``molde``.
+
+    Con ``anterior`` solo se corrigen los turnos guardados con ese ciclo
+    (deja en paz los que el operador cambió a mano); ``desde``/``hasta``
+    acotan por fecha. Devuelve cuántas filas y archivos cambiaron y las
+    fechas tocadas.
+    """
+    molde = str(molde).strip()
+    ciclo = ciclo_receta(molde) if ciclo is None else int(ciclo)
+    if ciclo is None:
+        raise ValueError(f"El molde {molde} no tiene receta activa")
+    anterior = None if anterior is None else int(anterior)
+    machines = config.MACHINES if machines is None else machines
+    wj = write_journal.activo()
+    if wj is not None:
+        wj.vaciar()  # que lo encolado llegue al archivo y se corrija también
+
+    meses = {f[:7] for f in mold_index.fechas_molde(molde)} | {"sin-fecha"}
+    cambios: List[Tuple[dict, str]] = []
+    archivos = 0
+    for m in machines:
+        for path in _fuentes(m, meses):
+            if not _candidato(path, molde, ciclo, anterior, desde, hasta):
+                continue
+            hechas: List[Dict[str, str]] = []
+
+            def mutar(rows):
+                idx = [i for i, r in enumerate(rows) if _afectada(r, molde, ciclo, anterior, desde, hasta)]
+                hechas[:] = []
+                if not idx:
+                    return None
+                rows = list(rows)
+                for i, r in zip(idx, recalcular_filas([rows[i] for i in idx], ciclo)):
+                    rows[i] = r
+                    hechas.append(r)
+                return rows
+
+            _reescribir(m["oee_csv"], path, mutar)
+            if hechas:
+                archivos += 1
+                cambios.extend((m, r.get("fecha", "")) for r in hechas)
+
+    fechas = _actualizar_diarios(cambios)
+    return {"molde": molde, "ciclo": ciclo, "filas": len(cambios), "archivos": archivos, "fechas": fechas}
+
+
+def _ultima_maquina(fechas: List[str]) -> Dict[str, dict]:
+    """Máquina que guardó al último cada fecha (mayor ``timestamp``), como ``daily_rebuild``."""
+    pedidas = set(fechas)
+    ultimo: Dict[str, Tuple[str, dict]] = {}
+    for m in config.MACHINES:
+        for r in csv_utils.leer_log_rango(m["oee_csv"], min(fechas), max(fechas)):
+            f = r.get("fecha")
+            ts = r.get("timestamp") or ""
+            if f in pedidas and (f not in ultimo or ts > ultimo[f][0]):
+                ultimo[f] = (ts, m)
+    return {f: m for f, (_, m) in ultimo.items()}
+
+
+def _actualizar_diarios(cambios: List[Tuple[dict, str]]) -> List[str]:
+    """Rehace las filas diarias de las fechas tocadas que ya estaban registradas."""
+    por_fecha: Dict[str, Set[str]] = {}
+    for m, f in cambios:
+        if f:
+            por_fecha.setdefault(f, set()).add(m["id"])
+    if not por_fecha:
+        return []
+    # la fila global es de la máquina que guardó al último: solo cambia si es una corregida
+    globales = csv_utils.fechas_registradas(config.DAILY_CSV_GLOBAL)
+    area = csv_utils.fechas_registradas(config.DAILY_CSV_INJECTOR)
+    ultima = _ultima_maquina(list(por_fecha))
+    for f, maquinas in sorted(por_fecha.items()):
+        m = ultima.get(f)
+        if f in globales and m is not None and m["id"] in maquinas:
+            metrics.escribir_daily_maquina(m, f)
+        if f in area:
+            metrics.escribir_daily_area(f)
+    return sorted(por_fecha)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+    res = corregir_ciclo(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
+    print(f"Molde {res['molde']} -> ciclo {res['ciclo']} s: {res['filas']} turnos en "
+          f"{res['archivos']} archivos, {len(res['fechas'])} fechas diarias")
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""Registros tipados para planeación, envíos, entregas y recetas.
+
+Cada fila CSV se convierte una sola vez al cargar (cantidades ``int``,
+fechas ``date``, banderas ``bool``) y los registros quedan en la caché de
+``csv_utils`` junto con la firma del archivo. Las listas que devuelven los
+``leer_*`` son compartidas: no modificarlas. Los registros son de solo
+lectura (la conversión pierde el texto original de algunas celdas): para
+editar, leer las filas con ``leer_csv_dict`` y guardar con
+``escribir_csv_dict``.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional
+
+import config
+from csv_utils import leer_registros
+
+# columnas alternativas aceptadas para objetivo / inicio de una orden
+_OBJ_KEYS = ("qty_total", "objetivo", "objetivo_pzs", "qty", "qty_plan", "cantidad", "target", "qty_objetivo")
+_START_KEYS = ("inicio_ts", "inicio", "start", "fecha_inicio", "start_date")
+
+
+def _txt(r: Dict[str, str], k: str) -> str:
+    return (r.get(k) or "").strip()
+
+
+def _int(s, default: int = 0) -> int:
+    try:
+        return int(float(str(s).replace(",", ".").strip()))
+    except Exception:
+        return default
+
+
+def _float(s, default: float = 0.0) -> float:
+    try:
+        return float(str(s).replace(",", ".").replace("%", "").strip())
+    except Exception:
+        return default
+
+
+def _fecha(s: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(s[:10]) if s else None
+    except ValueError:
+        return None
+
+
+def objetivo_de_fila(row: Dict[str, str]) -> int:
+    for k in _OBJ_KEYS:
+        v = row.get(k)
+        if v not in (None, ""):
+            try:
+                return int(float(v))
+            except Exception:
+                pass
+    return 0
+
+
+def inicio_de_fila(row: Dict[str, str]) -> str:
+    for k in _START_KEYS:
+        v = (row.get(k) or "").strip()
+        if v:
+            return v
+    return ""  # sin fecha: queda al final si hay empate por orden
+
+
+class Orden:
+    """Fila de ``planning.csv``."""
+
+    __slots__ = (
+        "orden", "parte", "molde_id", "maquina_id", "qty_total", "objetivo",
+        "inicio_ts", "inicio", "inicio_fecha", "fin_est_ts", "fin_est_fecha", "setup_min",
+        "estado", "ciclo_s", "cav_on",
+    )
+
+    def __init__(self, orden="", parte="", molde_id="", maquina_id="", qty_total=0, objetivo=0,
+                 inicio_ts="", inicio="", fin_est_ts="", setup_min=0, estado="plan", ciclo_s=0.0, cav_on=0):
+        self.orden = orden
+        self.parte = parte
+        self.molde_id = molde_id
+        self.maquina_id = maquina_id
+        self.qty_total = qty_total
+        self.objetivo = objetivo
+        self.inicio_ts = inicio_ts
+        self.inicio = inicio  # clave FIFO (primera columna de inicio con valor)
+        self.inicio_fecha = _fecha(inicio)
+        self.fin_est_ts = fin_est_ts
+        self.fin_est_fecha = _fecha(fin_est_ts)
+        self.setup_min = setup_min
+        self.estado = estado
+        self.ciclo_s = ciclo_s
+        self.cav_on = cav_on
+
+    @classmethod
+    def de_fila(cls, r: Dict[str, str]) -> "Orden":
+        return cls(
+            orden=_txt(r, "orden"),
+            parte=_txt(r, "parte"),
+            molde_id=_txt(r, "molde_id"),
+            maquina_id=_txt(r, "maquina_id"),
+            qty_total=_int(r.get("qty_total", "0")),
+            objetivo=objetivo_de_fila(r),
+            inicio_ts=_txt(r, "inicio_ts"),
+            inicio=inicio_de_fila(r),
+            fin_est_ts=_txt(r, "fin_est_ts"),
+            setup_min=_int(r.get("setup_min", "0")),
+            estado=(r.get("estado") or "plan").strip().lower(),
+            ciclo_s=_float(r.get("ciclo_s", "0")),
+            cav_on=_int(r.get("cav_on", "0")),
+        )
+
+    def __repr__(self):
+        return f"Orden({self.orden!r}, molde={self.molde_id!r}, qty={self.qty_total})"
+
+
+class Envio:
+    """Fila de ``shipments.csv``; sin ``approved`` cuenta como aprobada."""
+
+    __slots__ = ("orden", "ship_date", "fecha", "qty", "destino", "nota", "approved", "entrega", "autoriza")
+
+    def __init__(self, orden="", ship_date="", qty=0, destino="", nota="", approved=True, entrega="", autoriza=""):
+        self.orden = orden
+        self.ship_date = ship_date
+        self.fecha = _fecha(ship_date)
+        self.qty = qty
+        self.destino = destino
+        self.nota = nota
+        self.approved = approved
+        self.entrega = entrega
+        self.autoriza = autoriza
+
+    @classmethod
+    def de_fila(cls, r: Dict[str, str]) -> "Envio":
+        return cls(
+            orden=_txt(r, "orden"),
+            ship_date=_txt(r, "ship_date"),
+            qty=_int(r.get("qty", "0")),
+            destino=r.get("destino") or "",
+            nota=r.get("nota") or "",
+            approved=_txt(r, "approved") in ("", "1"),
+            entrega=r.get("entrega") or "",
+            autoriza=r.get("autoriza") or "",
+        )
+
+    def __repr__(self):
+        return f"Envio({self.orden!r}, {self.ship_date!r}, qty={self.qty}, approved={self.approved})"
+
+
+class Entrega:
+    """Milestone de ``deliveries.csv``."""
+
+    __slots__ = ("orden", "due_date", "fecha", "qty", "cumplido")
+
+    def __init__(self, orden="", due_date="", qty=0, cumplido=False):
+        self.orden = orden
+        self.due_date = due_date
+        self.fecha = _fecha(due_date)
+        self.qty = qty
+        self.cumplido = cumplido
+
+    @classmethod
+    def de_fila(cls, r: Dict[str, str]) -> "Entrega":
+        return cls(
+            orden=_txt(r, "orden"),
+            due_date=_txt(r, "due_date"),
+            qty=_int(r.get("qty", "0")),
+            cumplido=_txt(r, "cumplido") == "1",
+        )
+
+    def __repr__(self):
+        return f"Entrega({self.orden!r}, {self.due_date!r}, qty={self.qty})"
+
+
+class Receta:
+    """Fila de ``recipes.csv``."""
+
+    __slots__ = ("molde_id", "parte", "ciclo_ideal_s", "cavidades", "cavidades_habilitadas",
+                 "scrap_esperado_pct", "activo")
+
+    def __init__(self, molde_id="", parte="", ciclo_ideal_s=0.0, cavidades=0, cavidades_habilitadas=0,
+                 scrap_esperado_pct=0.0, activo=True):
+        self.molde_id = molde_id
+        self.parte = parte
+        self.ciclo_ideal_s = ciclo_ideal_s
+        self.cavidades = cavidades
+        self.cavidades_habilitadas = cavidades_habilitadas
+        self.scrap_esperado_pct = scrap_esperado_pct
+        self.activo = activo
+
+    @classmethod
+    def de_fila(cls, r: Dict[str, str]) -> "Receta":
+        activo = r.get("activo")
+        return cls(
+            molde_id=_txt(r, "molde_id"),
+            parte=_txt(r, "parte"),
+            ciclo_ideal_s=_float(r.get("ciclo_ideal_s", "0")),
+            cavidades=_int(r.get("cavidades", "0")),
+            cavidades_habilitadas=_int(r.get("cavidades_habilitadas", "0")),
+            scrap_esperado_pct=_float(r.get("scrap_esperado_pct", "0")),
+            activo=(activo if activo is not None else "1").strip() == "1",
+        )
+
+    def __repr__(self):
+        return f"Receta({self.molde_id!r}, {self.parte!r}, ciclo={self.ciclo_ideal_s})"
+
+
+def leer_ordenes(pendientes: bool = True) -> List[Orden]:
+    return leer_registros(config.PLANNING_CSV, Orden.de_fila, pendientes)
+
+
+def leer_envios(pendientes: bool = True) -> List[Envio]:
+    return leer_registros(config.SHIPMENTS_CSV, Envio.de_fila, pendientes)
+
+
+def leer_entregas() -> List[Entrega]:
+    return leer_registros(config.DELIV_CSV, Entrega.de_fila)
+
+
+def leer_recetas() -> List[Receta]:
+    return leer_registros(config.RECIPES_CSV, Receta.de_fila)
+
+
+def como_ordenes(rows) -> List[Orden]:
+    """Acepta registros ``Orden`` o filas dict (p. ej. de ``leer_csv_dict``)."""
+    return [r if isinstance(r, Orden) else Orden.de_fila(r) for r in rows]
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""Resumen de producción por ``(máquina, fecha, turno)`` en una sola pasada.
+
+Cada log ``oee_<id>.csv`` (o cada shard mensual) se recorre una vez y queda
+como un diccionario ``fecha -> turno -> Acumulado`` con las sumas de piezas,
+meta, horas, paro y porcentajes, más el acumulado global del archivo. Los
+resúmenes del día, global e histórico de ``metrics`` se responden con
+búsquedas en ese diccionario.
+
+El rollup se materializa junto al log (``<archivo>.rollup.json``) con el
+offset en bytes que ya cubre: al abrir solo se suman las líneas agregadas
+después, y cada turno guardado suma una fila en memoria. Si el archivo se
+reescribió (otro inodo, otro encabezado o cambió lo ya cubierto) se recorre
+completo otra vez. Las filas encoladas (write_journal) se suman aparte.
+"""
+
+import csv
+import io
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import csv_utils
+from columnar import entero, flotante
+
+PCT_FIELDS = ("availability_%", "performance_%", "quality_%", "oee_%")
+SUFIJO = ".rollup.json"
+PERSISTIR_S = 30.0    # como máximo una escritura del rollup materializado por archivo cada tanto
+_COLA = 64            # bytes finales de lo cubierto que se comparan para detectar reescrituras
+
+
+def _valores(r: Dict[str, str]) -> tuple:
+    pcts = []
+    for k in PCT_FIELDS:
+        v = r.get(k)
+        pcts.append(None if v in (None, "") else flotante(v, 0.0))
+    return (
+        entero(r.get("total_pzs", "0")), entero(r.get("scrap_pzs", "0")), entero(r.get("buenas_pzs", "0")),
+        flotante(r.get("meta_oper_pzs"), 0.0), entero(r.get("meta_oper_pzs", "0")), flotante(r.get("horas_turno"), 0.0),
+        flotante(r.get("tiempo_paro_min"), 0.0), entero(r.get("ciclo_s", "0")), pcts,
+    )
+
+
+class Acumulado:
+    """Sumas de un grupo de filas del log de producción."""
+
+    __slots__ = ("registros", "total", "scrap", "buenas", "meta", "meta_int", "horas", "paro_min",
+                 "ciclo", "ciclo_pos", "suma_pct", "n_pct")
+
+    def __init__(self):
+        self.registros = 0
+        self.total = 0
+        self.scrap = 0
+        self.buenas = 0           # suma de buenas_pzs tal cual se guardó
+        self.meta = 0.0
+        self.meta_int = 0         # suma de la meta truncada fila por fila (resumen del día)
+        self.horas = 0.0
+        self.paro_min = 0.0
+        self.ciclo = 0            # último ciclo_s > 0
+        self.ciclo_pos = -1
+        self.suma_pct = [0.0, 0.0, 0.0, 0.0]  # availability, performance, quality, oee
+        self.n_pct = [0, 0, 0, 0]             # celdas con valor
+
+    def agregar(self, r: Dict[str, str], pos: int) -> None:
+        self.agregar_valores(_valores(r), pos)
+
+    def agregar_valores(self, v: tuple, pos: int) -> None:
+        total, scrap, buenas, meta, meta_int, horas, paro, ciclo, pcts = v
+        self.registros += 1
+        self.total += total
+        self.scrap += scrap
+        self.buenas += buenas
+        self.meta += meta
+        self.meta_int += meta_int
+        self.horas += horas
+        self.paro_min += paro
+        if ciclo > 0:
+            self.ciclo, self.ciclo_pos = ciclo, pos
+        for i, p in enumerate(pcts):
+            if p is not None:
+                self.suma_pct[i] += p
+                self.n_pct[i] += 1
+
+    def sumar(self, otro: "Acumulado") -> None:
+        """Suma ``otro``; su ciclo gana si es válido (sumar en orden de archivo)."""
+        self.registros += otro.registros
+        self.total += otro.total
+        self.scrap += otro.scrap
+        self.buenas += otro.buenas
+        self.meta += otro.meta
+        self.meta_int += otro.meta_int
+        self.horas += otro.horas
+        self.paro_min += otro.paro_min
+        if otro.ciclo > 0:
+            self.ciclo, self.ciclo_pos = otro.ciclo, otro.ciclo_pos
+        for i in range(4):
+            self.suma_pct[i] += otro.suma_pct[i]
+            self.n_pct[i] += otro.n_pct[i]
+
+    def a_lista(self) -> list:
+        return [getattr(self, k) for k in self.__slots__]
+
+    @classmethod
+    def de_lista(cls, vals: list) -> "Acumulado":
+        if len(vals) != len(cls.__slots__):
+            raise ValueError("rollup materializado con otros campos")
+        a = cls()
+        for k, v in zip(cls.__slots__, vals):
+            setattr(a, k, v)
+        return a
+
+    @property
+    def turno_seg(self) -> int:
+        return int(self.horas * 3600)
+
+    @property
+    def paro_seg(self) -> int:
+        return int(self.paro_min * 60)
+
+
+class RollupLog:
+    """``fecha -> turno -> Acumulado`` de un archivo de producción."""
+
+    def __init__(self):
+        self.n = 0
+        self.por_fecha: Dict[str, Dict[int, Acumulado]] = {}
+        self.total = Acumulado()
+
+    def agregar_filas(self, rows: List[Dict[str, str]]) -> None:
+        pos = self.n
+        for r in rows:
+            turnos = self.por_fecha.get(r.get("fecha") or "")
+            if turnos is None:
+                turnos = self.por_fecha[r.get("fecha") or ""] = {}
+            t = entero(r.get("turno", "0"))
+            acc = turnos.get(t)
+            if acc is None:
+                acc = turnos[t] = Acumulado()
+            v = _valores(r)
+            acc.agregar_valores(v, pos)
+            self.total.agregar_valores(v, pos)
+            pos += 1
+        self.n = pos
+
+    def turno(self, fecha: str, turno: int) -> Optional[Acumulado]:
+        return self.por_fecha.get(fecha, {}).get(int(turno))
+
+    def a_json(self) -> dict:
+        return {"n": self.n, "grupos": [[f, t] + a.a_lista()
+                                        for f, turnos in self.por_fecha.items() for t, a in turnos.items()]}
+
+    @classmethod
+    def de_json(cls, d: dict) -> "RollupLog":
+        r = cls()
+        r.n = d["n"]
+        for g in d["grupos"]:
+            r.por_fecha.setdefault(g[0], {})[g[1]] = Acumulado.de_lista(g[2:])
+        grupos = [a for turnos in r.por_fecha.values() for a in turnos.values()]
+        for acc in sorted(grupos, key=lambda a: a.ciclo_pos):
+            r.total.sumar(acc)
+        return r
+
+
+class ParosLog:
+    """Último paro por fecha de un log ``down_<id>.csv``."""
+
+    def __init__(self):
+        self.n = 0
+        self.ultimo: Dict[str, Dict[str, str]] = {}
+
+    def agregar_filas(self, rows: List[Dict[str, str]]) -> None:
+        for r in rows:
+            self.ultimo[r.get("fecha") or ""] = r
+        self.n += len(rows)
+
+    def a_json(self) -> dict:
+        return {"n": self.n, "ultimo": self.ultimo}
+
+    @classmethod
+    def de_json(cls, d: dict) -> "ParosLog":
+        p = cls()
+        p.n, p.ultimo = d["n"], d["ultimo"]
+        return p
+
+
+# ===== materialización junto al log =====
+class _Entrada:
+    __slots__ = ("lectura", "rollup", "ino", "encabezado", "bytes", "cola", "mtime_ns", "sucio", "guardado")
+
+    def __init__(self, rollup, encabezado: bytes = b"", ino: int = 0):
+        self.lectura = None       # solo SQLite: ``csv_utils.lectura_log`` de la que salió el rollup
+        self.rollup = rollup
+        self.ino = ino
+        self.encabezado = encabezado
+        self.bytes = len(encabezado)
+        self.cola = b""
+        self.mtime_ns = 0
+        self.sucio = False
+        self.guardado = 0.0
+
+
+_CACHE: Dict[str, _Entrada] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _cargar(key: str, clase) -> Optional[_Entrada]:
+    try:
+        with open(key + SUFIJO, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        if d.get("clase") != clase.__name__:
+            return None
+        e = _Entrada(clase.de_json(d["datos"]), d["encabezado"].encode("utf-8"), d["ino"])
+        e.bytes, e.cola = d["bytes"], bytes.fromhex(d["cola"])
+    except (OSError, ValueError, KeyError, TypeError, IndexError):
+        return None
+    e.guardado = time.monotonic()
+    return e
+
+
+def _guardar(key: str, e: _Entrada) -> None:
+    d = {
+        "clase": type(e.rollup).__name__, "ino": e.ino, "encabezado": e.encabezado.decode("utf-8"),
+        "bytes": e.bytes, "cola": e.cola.hex(), "datos": e.rollup.a_json(),
+    }
+    tmp = f"{key}{SUFIJO}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(d, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, key + SUFIJO)
+    except OSError:
+        return  # sin permiso o en uso: se reintenta en la próxima actualización
+    e.sucio = False
+    e.guardado = time.monotonic()
+
+
+def _vigente(f, st, encabezado: bytes, e: _Entrada) -> bool:
+    if encabezado != e.encabezado or st.st_size < e.bytes:
+        return False
+    if e.ino and st.st_ino and e.ino != st.st_ino:
+        return False  # reemplazado (escribir_csv_dict) aunque mida igual
+    if e.cola:
+        f.seek(e.bytes - len(e.cola))
+        if f.read(len(e.cola)) != e.cola:
+            return False
+    return True
+
+
+def _actualizar(key: str, e: Optional[_Entrada], clase) -> Optional[_Entrada]:
+    try:
+        st = os.stat(key)
+    except OSError:
+        return None
+    if e is not None and st.st_size == e.bytes and st.st_mtime_ns == e.mtime_ns:
+        return e
+    try:
+        with open(key, "rb") as f:
+            encabezado = f.readline()
+            if not encabezado.endswith(b"\n"):
+                return None
+            if e is None:
+                e = _cargar(key, clase)
+            if e is not None and not _vigente(f, st, encabezado, e):
+                e = None
+            if e is None:
+                e = _Entrada(clase(), encabezado, st.st_ino)
+            f.seek(e.bytes)
+            data = f.read(st.st_size - e.bytes)
+    except OSError:
+        return None
+    fin = data.rfind(b"\n") + 1
+    if fin > 0:
+        campos = next(csv.reader(io.StringIO(e.encabezado.decode("utf-8"), newline="")), [])
+        e.rollup.agregar_filas(csv_utils.parsear_lineas(data[:fin], campos))
+        e.cola = (e.cola + data[:fin])[-_COLA:]
+        e.bytes += fin
+        e.sucio = True
+    e.mtime_ns = st.st_mtime_ns
+    if e.sucio and time.monotonic() - e.guardado >= PERSISTIR_S:
+        _guardar(key, e)
+    return e
+
+
+def _rollup_archivo(path: str, clase):
+    key = os.path.abspath(path)
+    if csv_utils.almacen_sqlite() is not None:
+        rows, lectura = csv_utils.lectura_log(path)
+        with _CACHE_LOCK:
+            e = _CACHE.get(key)
+            # otra lectura = la tabla se reescribió; si no, solo faltan las filas nuevas
+            if e is None or e.lectura != lectura or len(rows) < e.rollup.n or not isinstance(e.rollup, clase):
+                e = _CACHE[key] = _Entrada(clase())
+                e.lectura = lectura
+            if len(rows) > e.rollup.n:
+                e.rollup.agregar_filas(rows[e.rollup.n:])
+            return e.rollup
+    with _CACHE_LOCK:
+        e = _CACHE.get(key)
+        if e is not None and not isinstance(e.rollup, clase):
+            e = None
+        e = _actualizar(key, e, clase)
+        if e is None:
+            _CACHE.pop(key, None)
+            return clase()
+        _CACHE[key] = e
+        return e.rollup
+
+
+def persistir() -> None:
+    """Escribe ya los rollups con cambios sin materializar (p. ej. al cerrar)."""
+    with _CACHE_LOCK:
+        for key, e in _CACHE.items():
+            if e.sucio and e.lectura is None:
+                _guardar(key, e)
+
+
+# ===== consultas =====
+def _partes(path: str, clase, desde: Optional[str] = None, hasta: Optional[str] = None) -> list:
+    partes = [_rollup_archivo(p, clase) for p in csv_utils.fuentes_log(path, desde, hasta)]
+    pendientes = csv_utils.filas_pendientes(path)
+    if pendientes:
+        extra = clase()
+        extra.agregar_filas(pendientes)
+        partes.append(extra)
+    return partes
+
+
+def produccion(machine, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[RollupLog]:
+    """Rollups del log de producción (uno por archivo físico, más lo encolado)."""
+    return _partes(machine["oee_csv"], RollupLog, desde, hasta)
+
+
+def de_filas(rows: List[Dict[str, str]]) -> RollupLog:
+    """Rollup de una lista de filas arbitraria (sin caché)."""
+    r = RollupLog()
+    r.agregar_filas(rows)
+    return r
+
+
+def acumulado_dia(partes: List[RollupLog], fecha: str) -> Acumulado:
+    """Suma de todos los turnos de ``fecha`` (el ciclo es el último válido del día)."""
+    grupos = []
+    for i, p in enumerate(partes):
+        for acc in p.por_fecha.get(fecha, {}).values():
+            grupos.append((i, acc.ciclo_pos, acc))
+    out = Acumulado()
+    for _, _, acc in sorted(grupos, key=lambda g: g[:2]):
+        out.sumar(acc)
+    return out
+
+
+def acumulado_total(partes: List[RollupLog]) -> Tuple[Acumulado, Set[str]]:
+    """Suma de todo el log y las fechas distintas con registros."""
+    out = Acumulado()
+    fechas = set()
+    for p in partes:
+        out.sumar(p.total)
+        fechas.update(p.por_fecha)
+    fechas.discard("")
+    return out, fechas
+
+
+def dia_maquina(machine, fecha: str) -> Acumulado:
+    return acumulado_dia(produccion(machine, fecha, fecha), fecha)
+
+
+def total_maquina(machine) -> Tuple[Acumulado, Set[str]]:
+    return acumulado_total(produccion(machine))
+
+
+def turno_registrado(machine, fecha: str, turno: int) -> bool:
+    """``True`` si el log vivo ya tiene filas de ``fecha``/``turno``."""
+    return any(p.turno(fecha, turno) is not None for p in produccion(machine, fecha, fecha))
+
+
+def ultimo_paro(machine, fecha: str) -> Optional[Dict[str, str]]:
+    """Última fila de paro registrada en ``fecha`` o ``None``."""
+    ultimo = None
+    for p in _partes(machine["down_csv"], ParosLog, fecha, fecha):
+        ultimo = p.ultimo.get(fecha, ultimo)
+    return ultimo
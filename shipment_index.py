@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""Índice en memoria de salidas aprobadas y pendientes por orden y por molde.
+
+``shipments.csv`` se recorre completo solo cuando su versión (``file_lock``)
+o su mtime/tamaño ya no son los del índice: otra terminal escribió o
+llegaron al archivo salidas encoladas. El mapa orden → molde se arma una vez
+por versión de ``planning.csv``; como en el cálculo original, si una orden
+aparece varias veces en el plan gana su última fila. Crear una salida la
+encola (write_journal) y se suma en la consulta sin rehacer nada. Aprobar o
+borrar pasan por ``actualizar``, que le aplica al índice solo las filas que
+cambiaron.
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+import csv_utils
+from file_lock import version_csv
+from records import Envio, Orden, leer_envios, leer_ordenes
+
+
+def _sumar(d: Dict[str, int], k: str, q: int) -> None:
+    d[k] = d.get(k, 0) + q
+
+
+def _clave() -> tuple:
+    p = config.SHIPMENTS_CSV
+    return (version_csv(p), csv_utils.firma_archivo(p))
+
+
+def _campos(e: Envio) -> tuple:
+    return (e.orden, e.ship_date, e.qty, e.destino, e.nota, e.approved, e.entrega, e.autoriza)
+
+
+class IndiceEnvios:
+    """Cantidades enviadas por orden y por molde, separadas por estado."""
+
+    def __init__(self):
+        self.clave = None          # (versión, firma) de shipments.csv al construir
+        self.n = 0                 # filas del archivo
+        self.ordenes: List[Orden] = None
+        self.por_orden: Dict[str, List[Envio]] = {}
+        self.aprobados: Dict[str, int] = {}
+        self.pendientes: Dict[str, int] = {}
+        self.molde_de: Dict[str, str] = {}   # orden -> molde (última fila del plan)
+        self.aprobados_molde: Dict[str, int] = {}
+        self.pendientes_molde: Dict[str, int] = {}
+
+    def actualizar(self) -> None:
+        clave = _clave()
+        ordenes = leer_ordenes(pendientes=False)
+        if clave == self.clave and ordenes is self.ordenes:
+            return
+        if clave != self.clave:
+            envios = leer_envios(pendientes=False)
+            self.por_orden, self.aprobados, self.pendientes = {}, {}, {}
+            for e in envios:
+                self.por_orden.setdefault(e.orden, []).append(e)
+                _sumar(self.aprobados if e.approved else self.pendientes, e.orden, e.qty)
+            self.n, self.clave = len(envios), clave
+        if ordenes is not self.ordenes:
+            self.molde_de = {o.orden: o.molde_id for o in ordenes}
+            self.ordenes = ordenes
+        self.aprobados_molde, self.pendientes_molde = {}, {}
+        for por_estado, por_molde in ((self.aprobados, self.aprobados_molde),
+                                      (self.pendientes, self.pendientes_molde)):
+            for orden, q in por_estado.items():
+                m = self.molde_de.get(orden)
+                if m is not None:
+                    _sumar(por_molde, m, q)
+
+    def _contar(self, e: Envio, signo: int) -> None:
+        _sumar(self.aprobados if e.approved else self.pendientes, e.orden, signo * e.qty)
+        m = self.molde_de.get(e.orden)
+        if m is not None:
+            _sumar(self.aprobados_molde if e.approved else self.pendientes_molde, m, signo * e.qty)
+
+    def aplicar(self, cambios: List[Tuple[Optional[dict], Optional[dict]]], clave: tuple) -> None:
+        """Aplica ``(fila anterior, fila nueva)`` de una reescritura; ``None`` = no estaba / se borró."""
+        # copias: quien ya tiene los diccionarios de por_orden() no los ve cambiar
+        self.aprobados, self.pendientes = dict(self.aprobados), dict(self.pendientes)
+        self.aprobados_molde, self.pendientes_molde = dict(self.aprobados_molde), dict(self.pendientes_molde)
+        self.por_orden = dict(self.por_orden)
+        for viejo, nuevo in cambios:
+            v = Envio.de_fila(viejo) if viejo is not None else None
+            w = Envio.de_fila(nuevo) if nuevo is not None else None
+            i = None
+            if v is not None:
+                self._contar(v, -1)
+                lst = self.por_orden[v.orden] = list(self.por_orden.get(v.orden, []))
+                c = _campos(v)
+                i = next((k for k, e in enumerate(lst) if _campos(e) == c), None)
+                if i is not None and (w is None or w.orden != v.orden):
+                    del lst[i]
+                    i = None
+                self.n -= 1
+            if w is not None:
+                self._contar(w, 1)
+                if i is not None:
+                    self.por_orden[w.orden][i] = w
+                else:
+                    self.por_orden[w.orden] = self.por_orden.get(w.orden, []) + [w]
+                self.n += 1
+        self.clave = clave
+
+
+_INDICE = IndiceEnvios()
+_LOCK = threading.Lock()
+
+
+def _indice() -> IndiceEnvios:
+    with _LOCK:
+        _INDICE.actualizar()
+        return _INDICE
+
+
+def actualizar(mutar: Callable[[List[Dict[str, str]]], Optional[List[Dict[str, str]]]],
+               normalizar: bool = True) -> Optional[List[Dict[str, str]]]:
+    """``csv_utils.actualizar_csv`` de shipments.csv que pasa al índice solo lo que cambió.
+
+    Con ``normalizar`` ``mutar`` recibe las filas como ``leer_shipments``
+    (``approved`` vacío pasa a ``"1"``); si no, tal como están en el archivo.
+    """
+    cambios: List[Tuple[Optional[dict], Optional[dict]]] = []
+    base: List[tuple] = []
+
+    def _mutar(rows):
+        cambios.clear()
+        base.clear()
+        with _LOCK:
+            clave, n = _INDICE.clave, _INDICE.n
+            # las primeras n filas son las del archivo; las demás venían encoladas
+            fresco = clave is not None and clave == _clave() and n <= len(rows)
+        if normalizar:
+            for r in rows:
+                if "approved" not in r or r.get("approved") == "":
+                    r["approved"] = "1"
+        antes = [(r, dict(r)) for r in rows] if fresco else None
+        nuevas = mutar(rows)
+        if nuevas is None or antes is None:
+            return nuevas
+        quedan = {id(r) for r in nuevas}
+        for i, (r, viejo) in enumerate(antes):
+            del_archivo = i < n
+            if id(r) not in quedan:
+                if del_archivo:
+                    cambios.append((viejo, None))
+            elif not del_archivo or r != viejo:
+                cambios.append((viejo if del_archivo else None, r))
+        origen = {id(r) for r, _ in antes}
+        cambios.extend((None, r) for r in nuevas if id(r) not in origen)
+        base.append(clave)
+        return nuevas
+
+    res = csv_utils.actualizar_csv(config.SHIPMENTS_CSV, csv_utils.SHIPMENTS_FIELDS, _mutar)
+    if res is not None and base:
+        with _LOCK:
+            ahora = _clave()
+            # solo si nadie más escribió entre la lectura y este punto
+            if _INDICE.clave == base[0] and ahora[0] == base[0][0] + 1:
+                _INDICE.aplicar(cambios, ahora)
+    return res
+
+
+def _envios_encolados() -> List[Envio]:
+    return [Envio.de_fila(r) for r in csv_utils.filas_pendientes(config.SHIPMENTS_CSV)]
+
+
+def _moldes_encolados() -> Dict[str, str]:
+    return {o.orden: o.molde_id for o in map(Orden.de_fila, csv_utils.filas_pendientes(config.PLANNING_CSV))}
+
+
+def por_orden(aprobados: bool = True) -> Dict[str, int]:
+    """Piezas por orden (aprobadas o pendientes). Sin filas encoladas el
+    diccionario es el del índice: no modificarlo."""
+    ix = _indice()
+    base = ix.aprobados if aprobados else ix.pendientes
+    extra = [e for e in _envios_encolados() if e.approved == aprobados]
+    if not extra:
+        return base
+    out = dict(base)
+    for e in extra:
+        _sumar(out, e.orden, e.qty)
+    return out
+
+
+def enviados_orden(orden: str, aprobados: bool = True) -> int:
+    return por_orden(aprobados).get(str(orden).strip(), 0)
+
+
+def por_molde(aprobados: bool = True) -> Dict[str, int]:
+    """Piezas por molde sobre todo el plan (aprobadas o pendientes). Sin filas
+    encoladas el diccionario es el del índice: no modificarlo."""
+    ix = _indice()
+    base = ix.aprobados_molde if aprobados else ix.pendientes_molde
+    encoladas = _moldes_encolados()
+    extra = [e for e in _envios_encolados() if e.approved == aprobados]
+    if not encoladas and not extra:
+        return base
+    out = dict(base)
+    molde_de = ix.molde_de
+    if encoladas:
+        # una fila encolada del plan es la última de su orden: cambia su molde
+        por_estado = ix.aprobados if aprobados else ix.pendientes
+        for orden, mo in encoladas.items():
+            antes = molde_de.get(orden)
+            if antes == mo:
+                continue
+            q = por_estado.get(orden, 0)
+            if antes is not None:
+                _sumar(out, antes, -q)
+            _sumar(out, mo, q)
+        molde_de = {**molde_de, **encoladas}
+    for e in extra:
+        m = molde_de.get(e.orden)
+        if m is not None:
+            _sumar(out, m, e.qty)
+    return out
+
+
+def enviados_molde(molde_id: str, aprobados: bool = True) -> int:
+    """Piezas de todas las órdenes del molde (aprobadas o pendientes)."""
+    return por_molde(aprobados).get(str(molde_id).strip(), 0)
+
+
+def envios_de_orden(orden: str) -> List[Envio]:
+    """Salidas de la orden (incluye las encoladas), en orden de captura."""
+    o = str(orden).strip()
+    base = _indice().por_orden.get(o, [])
+    extra = [e for e in _envios_encolados() if e.orden == o]
+    return base + extra if extra else list(base)
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""Backend SQLite para la API de csv_utils.
+
+Cada archivo CSV lógico (``planning.csv``, ``shipments.csv``, ...) se guarda
+como una tabla de la misma base. Los logs de máquina (``oee_<id>.csv`` y
+``down_<id>.csv``) se unifican en las tablas ``produccion`` y ``paros`` con
+una columna ``maquina_id``. Todas las columnas se guardan como TEXT para
+conservar exactamente lo que devolvería ``csv.DictReader``.
+
+Uso de línea de comandos::
+
+    python sqlite_store.py importar          # CSV -> SQLite (una sola vez)
+    python sqlite_store.py exportar [dir]    # SQLite -> CSV (compatibilidad)
+"""
+
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+
+INDEX_COLS = ("fecha", "turno", "molde", "orden", "maquina_id")
+
+
+def _tabla(path: str) -> Tuple[str, Optional[str]]:
+    """Traduce una ruta CSV a ``(tabla, maquina_id)``."""
+    ap = os.path.abspath(path)
+    for m in config.MACHINES:
+        if ap == os.path.abspath(m["oee_csv"]):
+            return "produccion", m["id"]
+        if ap == os.path.abspath(m["down_csv"]):
+            return "paros", m["id"]
+    base = os.path.splitext(os.path.basename(ap))[0]
+    return re.sub(r"\W", "_", base), None
+
+
+def _q(ident: str) -> str:
+    return '"' + ident.replace('"', '""') + '"'
+
+
+class SqliteStore:
+    """Almacén WAL con una conexión por hilo."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._cols: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS _columnas (tabla TEXT PRIMARY KEY, columnas TEXT NOT NULL)")
+            c.execute("CREATE TABLE IF NOT EXISTS _reescrituras "
+                      "(tabla TEXT NOT NULL, maquina TEXT NOT NULL, n INTEGER NOT NULL, PRIMARY KEY (tabla, maquina))")
+
+    def _conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.db_path, timeout=30)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    # ----- esquema -----
+    def columnas(self, tabla: str) -> List[str]:
+        with self._lock:
+            cols = self._cols.get(tabla)
+        if cols is None:
+            row = self._conn().execute("SELECT columnas FROM _columnas WHERE tabla=?", (tabla,)).fetchone()
+            cols = json.loads(row[0]) if row else []
+            if cols:
+                with self._lock:
+                    self._cols[tabla] = cols
+        return cols
+
+    def asegurar(self, path: str, header: List[str]) -> None:
+        tabla, maquina = _tabla(path)
+        if self.columnas(tabla):
+            return
+        cols = list(header)
+        fisicas = cols + (["maquina_id"] if maquina and "maquina_id" not in cols else [])
+        c = self._conn()
+        with c:
+            c.execute(f"CREATE TABLE IF NOT EXISTS {_q(tabla)} ({', '.join(_q(k) + ' TEXT' for k in fisicas)})")
+            for k in INDEX_COLS:
+                if k in fisicas:
+                    c.execute(f"CREATE INDEX IF NOT EXISTS {_q('ix_' + tabla + '_' + k)} ON {_q(tabla)} ({_q(k)})")
+            c.execute("INSERT OR REPLACE INTO _columnas (tabla, columnas) VALUES (?, ?)", (tabla, json.dumps(cols)))
+        with self._lock:
+            self._cols[tabla] = cols
+
+    def columnas_de(self, path: str) -> List[str]:
+        """Columnas de la tabla que guarda ``path`` ([] si no existe)."""
+        return self.columnas(_tabla(path)[0])
+
+    def existe(self, path: str) -> bool:
+        return bool(self.columnas_de(path))
+
+    # ----- lectura / escritura -----
+    def leer(self, path: str, where: str = "", params: Tuple = ()) -> List[Dict[str, str]]:
+        tabla, maquina = _tabla(path)
+        cols = self.columnas(tabla)
+        if not cols:
+            return []
+        conds, args = [], []
+        if maquina:
+            conds.append("maquina_id=?"); args.append(maquina)
+        if where:
+            conds.append(where); args.extend(params)
+        sql = f"SELECT {', '.join(_q(k) for k in cols)} FROM {_q(tabla)}"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        sql += " ORDER BY rowid"
+        cur = self._conn().execute(sql, args)
+        return [{k: ("" if v is None else v) for k, v in zip(cols, r)} for r in cur]
+
+    def leer_desde(self, path: str, marca: Optional[tuple] = None) -> Tuple[List[Dict[str, str]], Optional[tuple], bool]:
+        """Filas agregadas a ``path`` después de una lectura anterior.
+
+        ``marca`` es la que devolvió esa lectura: ``(reescrituras, último
+        rowid, filas)``. Devuelve ``(filas, marca nueva, completa)``; si la
+        tabla se reescribió o le faltan filas ya leídas (o no hay ``marca``),
+        ``completa`` es ``True`` y ``filas`` son todas.
+        """
+        tabla, maquina = _tabla(path)
+        cols = self.columnas(tabla)
+        if not cols:
+            return [], None, True
+        filtro, args = ("maquina_id=? AND ", [maquina]) if maquina else ("", [])
+        c = self._conn()
+        propia = not c.in_transaction
+        if propia:
+            c.execute("BEGIN")  # reescrituras, conteo y filas de la misma instantánea
+        try:
+            row = c.execute("SELECT n FROM _reescrituras WHERE tabla=? AND maquina=?",
+                            (tabla, maquina or "")).fetchone()
+            gen = row[0] if row else 0
+            completa = marca is None or marca[0] != gen
+            if not completa:
+                n = c.execute(f"SELECT COUNT(*) FROM {_q(tabla)} WHERE {filtro}rowid<=?",
+                              args + [marca[1]]).fetchone()[0]
+                completa = n != marca[2]
+            desde, n = (0, 0) if completa else marca[1:]
+            cur = c.execute(f"SELECT rowid, {', '.join(_q(k) for k in cols)} FROM {_q(tabla)} "
+                            f"WHERE {filtro}rowid>? ORDER BY rowid", args + [desde])
+            out, ultimo = [], desde
+            for r in cur:
+                ultimo = r[0]
+                out.append({k: ("" if v is None else v) for k, v in zip(cols, r[1:])})
+        finally:
+            if propia:
+                c.execute("COMMIT")
+        return out, (gen, ultimo, n + len(out)), completa
+
+    def _reescrita(self, c: sqlite3.Connection, tabla: str, maquina: Optional[str]) -> None:
+        c.execute("INSERT INTO _reescrituras (tabla, maquina, n) VALUES (?, ?, 1) "
+                  "ON CONFLICT (tabla, maquina) DO UPDATE SET n = n + 1", (tabla, maquina or ""))
+
+    def _insert_sql(self, tabla: str, cols: List[str], maquina: Optional[str]) -> str:
+        fisicas = cols + (["maquina_id"] if maquina and "maquina_id" not in cols else [])
+        return (f"INSERT INTO {_q(tabla)} ({', '.join(_q(k) for k in fisicas)}) "
+                f"VALUES ({', '.join('?' for _ in fisicas)})")
+
+    def _valores(self, cols, maquina, row) -> List:
+        vals = [("" if v is None else str(v)) for v in row][:len(cols)]
+        vals += [""] * (len(cols) - len(vals))
+        if maquina and "maquina_id" not in cols:
+            vals.append(maquina)
+        return vals
+
+    def agregar(self, path: str, row: Iterable) -> None:
+        self.agregar_muchas(path, [row])
+
+    def agregar_muchas(self, path: str, rows: Iterable[Iterable]) -> None:
+        tabla, maquina = _tabla(path)
+        cols = self.columnas(tabla)
+        if not cols:
+            raise KeyError(f"Tabla sin esquema: {tabla}")
+        c = self._conn()
+        with c:
+            c.executemany(self._insert_sql(tabla, cols, maquina),
+                          [self._valores(cols, maquina, list(r)) for r in rows])
+
+    def reescribir(self, path: str, fieldnames: List[str], rows: Iterable[Dict[str, str]]) -> None:
+        tabla, maquina = _tabla(path)
+        if not self.columnas(tabla):
+            self.asegurar(path, fieldnames)
+        cols = self.columnas(tabla)
+        c = self._conn()
+        with c:
+            if maquina:
+                c.execute(f"DELETE FROM {_q(tabla)} WHERE maquina_id=?", (maquina,))
+            else:
+                c.execute(f"DELETE FROM {_q(tabla)}")
+            self._reescrita(c, tabla, maquina)
+            c.executemany(self._insert_sql(tabla, cols, maquina),
+                          [self._valores(cols, maquina, [r.get(k, "") for k in cols]) for r in rows])
+
+    def upsert(self, path: str, clave: str, valores: Dict[str, str]) -> None:
+        """Actualiza la fila cuyo ``clave`` coincide o la inserta si no existe."""
+        tabla, maquina = _tabla(path)
+        cols = self.columnas(tabla)
+        sets = [k for k in cols if k != clave and k in valores]
+        c = self._conn()
+        with c:
+            sql = f"UPDATE {_q(tabla)} SET {', '.join(_q(k) + '=?' for k in sets)} WHERE {_q(clave)}=?"
+            args = [str(valores[k]) for k in sets] + [valores[clave]]
+            if maquina:
+                sql += " AND maquina_id=?"; args.append(maquina)
+            if c.execute(sql, args).rowcount == 0:
+                c.execute(self._insert_sql(tabla, cols, maquina),
+                          self._valores(cols, maquina, [valores.get(k, "") for k in cols]))
+            else:
+                self._reescrita(c, tabla, maquina)
+
+
+_STORE: Optional[SqliteStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def store() -> SqliteStore:
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = SqliteStore(config.SQLITE_DB)
+        return _STORE
+
+
+def _archivos_conocidos() -> List[str]:
+    paths = []
+    for m in config.MACHINES:
+        paths += [m["oee_csv"], m["down_csv"]]
+    paths += [
+        config.DAILY_CSV_GLOBAL, config.DAILY_CSV_INJECTOR, config.RECIPES_CSV,
+        config.PLANNING_CSV, config.DELIV_CSV, config.SHIPMENTS_CSV,
+        config.PERSONNEL_CSV, config.CLIENTS_CSV,
+    ]
+    return paths
+
+
+def importar_csv(paths: Optional[List[str]] = None) -> Dict[str, int]:
+    """Copia los CSV existentes a la base (reemplaza el contenido previo)."""
+    st = store()
+    out = {}
+    for p in paths or _archivos_conocidos():
+        # logs particionados por mes: oee_<id>/AAAA-MM.csv
+        shard_dir = os.path.splitext(p)[0]
+        fuentes = [p] if os.path.exists(p) else []
+        if os.path.isdir(shard_dir):
+            fuentes += sorted(os.path.join(shard_dir, n) for n in os.listdir(shard_dir) if n.endswith(".csv"))
+        header, rows = None, []
+        for fuente in fuentes:
+            with open(fuente, "r", newline="", encoding="utf-8") as f:
+                reader = csv.DictReader(f)
+                if not reader.fieldnames:
+                    continue
+                header = header or list(reader.fieldnames)
+                rows.extend(reader)
+        if not header:
+            continue
+        if p in (config.DAILY_CSV_GLOBAL, config.DAILY_CSV_INJECTOR):
+            # una fecha repetida (archivo editado a mano): la última línea es la vigente
+            rows = list({r.get("fecha"): r for r in rows}.values())
+        st.asegurar(p, header)
+        st.reescribir(p, header, rows)
+        out[os.path.basename(p)] = len(rows)
+    return out
+
+
+def exportar_csv(dest_dir: Optional[str] = None) -> Dict[str, int]:
+    """Vuelca cada tabla a su CSV original (o a ``dest_dir``)."""
+    st = store()
+    out = {}
+    for p in _archivos_conocidos():
+        if not st.existe(p):
+            continue
+        cols = st.columnas(_tabla(p)[0])
+        rows = st.leer(p)
+        dest = os.path.join(dest_dir, os.path.basename(p)) if dest_dir else p
+        with open(dest, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=cols)
+            w.writeheader(); w.writerows(rows)
+        out[os.path.basename(p)] = len(rows)
+    return out
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "importar":
+        res = importar_csv()
+    elif cmd == "exportar":
+        res = exportar_csv(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        print(__doc__)
+        sys.exit(2)
+    for nombre, n in res.items():
+        print(f"{nombre}: {n} filas")
@@ -17,3 +17,4 @@ import plotly.graph_objects as go
 from config import *
 from csv_utils import *
 from metrics import *
+from records import leer_entregas, leer_ordenes
@@ -18,12 +18,15 @@ class InventoryView(ctk.CTkFrame):
         self._log_filter_status = tk.StringVar(value="Todas")
         self._log_filter_text = tk.StringVar(value="")
         self._show_cards = tk.BooleanVar(value=True)
+        self._ships = None  # salidas leídas una vez por recarga
         self._build_professional_inventory()
 
     # ---------------------------
     # Helpers (sin cambios)
     # ---------------------------
     def _shipments_all(self):
+        if self._ships is not None:
+            return self._ships
         try:
             return leer_shipments()
         except Exception:
@@ -464,16 +467,25 @@ class InventoryView(ctk.CTkFrame):
     # Recargas de data (lógica sin cambios)
     # ----------------
     def _reload_all(self):
-        self._reload_kpis()
-        self._reload_orders_table()
-        self._reload_pending_cards()
-        self._reload_order_detail()
-        self._reload_log()
-
-    def _reload_kpis(self):
+        # una sola carga de órdenes, salidas y FIFO para todas las secciones
+        orders = leer_ordenes()
+        fifo = compute_fifo_assignments()
+        self._ships = self._shipments_all()
+        try:
+            self._reload_kpis(orders, fifo)
+            self._reload_orders_table(orders, fifo)
+            self._reload_pending_cards()
+            self._reload_order_detail(orders, fifo)
+            self._reload_log()
+        finally:
+            self._ships = None
+
+    def _reload_kpis(self, orders=None, fifo=None):
         """Actualiza KPIs con nueva información visual"""
-        orders = leer_csv_dict(PLANNING_CSV)
-        fifo = compute_fifo_assignments(orders)
+        if orders is None:
+            orders = leer_ordenes()
+        if fifo is None:
+            fifo = compute_fifo_assignments()
         t = totals_from_fifo(fifo)
 
         total_orders = len(orders)
@@ -493,19 +505,19 @@ class InventoryView(ctk.CTkFrame):
         for i, (card, value) in enumerate(zip(self._kpi_cards, values)):
             card["value"].configure(text=value)
 
-    def _reload_orders_table(self):
+    def _reload_orders_table(self, orders=None, fifo=None):
         """Actualiza la tabla de órdenes con datos FIFO"""
         for i in self.tree_orders.get_children():
             self.tree_orders.delete(i)
 
-        orders = leer_csv_dict(PLANNING_CSV)
-        fifo = compute_fifo_assignments(orders)
+        if orders is None:
+            orders = leer_ordenes()
+        if fifo is None:
+            fifo = compute_fifo_assignments()
 
         tot_obj = tot_env = tot_asig = tot_prog = tot_pend = 0
         for r in orders:
-            orden = (r.get("orden", "") or "").strip()
-            parte = (r.get("parte", "") or "").strip()
-            molde = (r.get("molde_id", "") or "").strip()
+            orden, parte, molde = r.orden, r.parte, r.molde_id
 
             m = order_metrics(r, fifo)
             self.tree_orders.insert("", "end", values=(
@@ -529,24 +541,26 @@ class InventoryView(ctk.CTkFrame):
         for i in self.tree_ship.get_children(): 
             self.tree_ship.delete(i)
 
-    def _reload_order_detail(self):
+    def _reload_order_detail(self, orders=None, fifo=None):
         """Recarga el detalle de la orden seleccionada"""
         if not self._selected_order:
             self._clear_order_detail()
             return
 
-        orders = leer_csv_dict(PLANNING_CSV)
-        row = next((r for r in orders if (r.get("orden","") or "").strip() == self._selected_order), None)
+        if orders is None:
+            orders = leer_ordenes()
+        row = next((r for r in orders if r.orden == self._selected_order), None)
         if not row:
             self._clear_order_detail()
             return
 
-        fifo = compute_fifo_assignments(orders)
+        if fifo is None:
+            fifo = compute_fifo_assignments()
         m = order_metrics(row, fifo)
         
         # Actualizar información de la orden
-        parte = (row.get("parte", "") or "").strip()
-        molde = (row.get("molde_id", "") or "").strip()
+        parte = row.parte
+        molde = row.molde_id
         
         self.lbl_order_header.configure(
             text=f"📋 Orden: {self._selected_order} | 🔧 Parte: {parte}"
@@ -775,31 +789,34 @@ class InventoryView(ctk.CTkFrame):
             messagebox.showwarning("Selección", "Selecciona al menos una salida para aprobar")
             return
             
-        count = 0
-        all_ships = leer_shipments()
-        
+        claves = []
         for item in sel:
             values = self.tree_ship.item(item, "values")
             if not values:
                 continue
-                
-            fecha, qty, destino, nota = values[1:5]
-            
-            # Buscar y actualizar en la lista completa
-            for r in all_ships:
-                if (r.get("orden", "") == self._selected_order and
-                    r.get("fecha", "") == fecha and
-                    r.get("qty", "") == qty and
-                    r.get("destino", "") == destino and
-                    r.get("nota", "") == nota and
-                    str(r.get("approved", "0")).strip() != "1"):
-                    
-                    r["approved"] = "1"
-                    count += 1
-                    break
-        
+            claves.append(values[1:5])
+        hechas = []
+        
+        def aprobar(all_ships):
+            hechas.clear()
+            for fecha, qty, destino, nota in claves:
+                # Buscar y actualizar en la lista completa
+                for r in all_ships:
+                    if (r.get("orden", "") == self._selected_order and
+                        r.get("fecha", "") == fecha and
+                        r.get("qty", "") == qty and
+                        r.get("destino", "") == destino and
+                        r.get("nota", "") == nota and
+                        str(r.get("approved", "0")).strip() != "1"):
+                        
+                        r["approved"] = "1"
+                        hechas.append(r)
+                        break
+            return all_ships if hechas else None
+        
+        actualizar_shipments(aprobar)
+        count = len(hechas)
         if count > 0:
-            guardar_shipments(all_ships)
             messagebox.showinfo("Éxito", f"Se aprobaron {count} salida(s)")
             self._reload_all()
         else:
@@ -815,30 +832,32 @@ class InventoryView(ctk.CTkFrame):
         if not messagebox.askyesno("Confirmar", f"¿Eliminar {len(sel)} salida(s) seleccionada(s)?"):
             return
             
-        count = 0
-        all_ships = leer_shipments()
-        
+        claves = []
         for item in reversed(sel):  # Procesar en reversa para evitar problemas de índices
             values = self.tree_ship.item(item, "values")
             if not values:
                 continue
-                
-            fecha, qty, destino, nota = values[1:5]
-            
-            # Buscar y eliminar
-            for i, r in enumerate(all_ships):
-                if (r.get("orden", "") == self._selected_order and
-                    r.get("fecha", "") == fecha and
-                    r.get("qty", "") == qty and
-                    r.get("destino", "") == destino and
-                    r.get("nota", "") == nota):
-                    
-                    all_ships.pop(i)
-                    count += 1
-                    break
-        
+            claves.append(values[1:5])
+        hechas = []
+        
+        def quitar(all_ships):
+            hechas.clear()
+            for fecha, qty, destino, nota in claves:
+                # Buscar y eliminar
+                for i, r in enumerate(all_ships):
+                    if (r.get("orden", "") == self._selected_order and
+                        r.get("fecha", "") == fecha and
+                        r.get("qty", "") == qty and
+                        r.get("destino", "") == destino and
+                        r.get("nota", "") == nota):
+                        
+                        hechas.append(all_ships.pop(i))
+                        break
+            return all_ships if hechas else None
+        
+        actualizar_shipments(quitar)
+        count = len(hechas)
         if count > 0:
-            guardar_shipments(all_ships)
             messagebox.showinfo("Éxito", f"Se eliminaron {count} salida(s)")
             self._reload_all()
         else:
@@ -851,31 +870,34 @@ class InventoryView(ctk.CTkFrame):
             messagebox.showwarning("Selección", "Selecciona al menos una salida para aprobar")
             return
             
-        count = 0
-        all_ships = leer_shipments()
-        
+        claves = []
         for item in sel:
             values = self.tree_log.item(item, "values")
             if not values or "Aprobada" in values[2]:
                 continue
-                
-            orden, molde, status, fecha, qty, destino, nota = values
-            
-            # Buscar y aprobar
-            for r in all_ships:
-                if (r.get("orden", "") == orden and
-                    r.get("fecha", "") == fecha and
-                    r.get("qty", "") == qty and
-                    r.get("destino", "") == destino and
-                    r.get("nota", "") == nota and
-                    str(r.get("approved", "0")).strip() != "1"):
-                    
-                    r["approved"] = "1"
-                    count += 1
-                    break
-        
+            claves.append(values)
+        hechas = []
+        
+        def aprobar(all_ships):
+            hechas.clear()
+            for orden, molde, status, fecha, qty, destino, nota in claves:
+                # Buscar y aprobar
+                for r in all_ships:
+                    if (r.get("orden", "") == orden and
+                        r.get("fecha", "") == fecha and
+                        r.get("qty", "") == qty and
+                        r.get("destino", "") == destino and
+                        r.get("nota", "") == nota and
+                        str(r.get("approved", "0")).strip() != "1"):
+                        
+                        r["approved"] = "1"
+                        hechas.append(r)
+                        break
+            return all_ships if hechas else None
+        
+        actualizar_shipments(aprobar)
+        count = len(hechas)
         if count > 0:
-            guardar_shipments(all_ships)
             messagebox.showinfo("Éxito", f"Se aprobaron {count} salida(s)")
             self._reload_all()
         else:
@@ -123,7 +123,7 @@ class LiveDashboard(ctk.CTkFrame):
 
             # por máquina y promedio de área
             suma_oee = 0.0
-            plan_rows = leer_csv_dict(PLANNING_CSV)
+            plan_rows = leer_ordenes()
             for m in MACHINES:
                 r_hist = resumen_historico_maquina(m)
                 r_day = resumen_hoy_maquina(m, hoy)
@@ -147,32 +147,25 @@ class LiveDashboard(ctk.CTkFrame):
                 futuros = [
                     p
                     for p in plan_rows
-                    if p.get("maquina_id") == m["id"]
-                    and (p.get("estado", "plan").lower() != "done")
+                    if p.maquina_id == m["id"] and p.estado != "done"
                 ]
-                try:
-                    futuros.sort(key=lambda p: p.get("inicio_ts", ""))
-                except Exception:
-                    pass
+                futuros.sort(key=lambda p: p.inicio_ts)
                 if futuros:
                     p = futuros[0]
-                    orden = p.get("orden", "")
-                    parte = p.get("parte", "")
-                    molde = p.get("molde_id", "")
-                    qty_total = parse_int_str(p.get("qty_total", "0"))
+                    orden = p.orden
+                    parte = p.parte
+                    molde = p.molde_id
+                    qty_total = p.qty_total
                     prod = producido_por_molde_global(molde)
                     shipped_order = enviados_por_orden(orden)
                     shipped_total = enviados_por_molde(molde)
                     disp = max(0, prod - shipped_total)
                     frac_prod = (prod / qty_total) if qty_total > 0 else 0.0
                     frac_ship = (shipped_order / qty_total) if qty_total > 0 else 0.0
-                    try:
-                        dleft = (
-                            datetime.strptime(p.get("fin_est_ts", ""), "%Y-%m-%d").date()
-                            - date.today()
-                        ).days
+                    if p.fin_est_fecha:
+                        dleft = (p.fin_est_fecha - date.today()).days
                         days_left = f"{dleft} días restantes"
-                    except Exception:
+                    else:
                         days_left = ""
                     card["order_title"].configure(
                         text=f"Orden {orden} — {parte} • Molde {molde}"
@@ -198,7 +191,15 @@ class LiveDashboard(ctk.CTkFrame):
                         text="Enviado ord: 0/0 pzs  •  Enviado mol: 0 pzs  •  Disponible: 0"
                     )
                     card["lbl_days"].configure(text="")
-                card["paro"].configure(text=f"Último paro: {r_day['ultimo_paro']}")
+                texto_paro = f"Último paro: {r_day['ultimo_paro']}"
+                pareto = analisis_paros([m], hoy, hoy)
+                if pareto:
+                    top = pareto[0]
+                    eventos = sum(x["eventos"] for x in pareto)
+                    minutos = sum(x["paro_min"] for x in pareto)
+                    texto_paro += (f"\nHoy: {eventos} paros, {minutos:.1f} min  •  "
+                                   f"Principal: {top['motivo'] or 'Sin motivo'} ({top['pct']:.0f}%)")
+                card["paro"].configure(text=texto_paro)
 
             if MACHINES:
                 area_oee = suma_oee / len(MACHINES)
@@ -86,19 +86,18 @@ class OrdersBoardView(ctk.CTkFrame):
             for widget in container.winfo_children():
                 widget.destroy()
 
-        rows = leer_csv_dict(PLANNING_CSV)
-        fifo = compute_fifo_assignments(rows)
+        rows = leer_ordenes()
+        fifo = compute_fifo_assignments()
 
         orders_by_state = {"active": [], "done": []}
         for r in rows:
-            estado = r.get("estado", "plan").lower()
-            if estado == "done":
+            if r.estado == "done":
                 orders_by_state["done"].append(r)
             else:
                 orders_by_state["active"].append(r)
 
         for state, orders in orders_by_state.items():
-            orders.sort(key=lambda r: r.get("fin_est_ts", ""))
+            orders.sort(key=lambda r: r.fin_est_ts)
             container = self.card_containers[state]
             if not orders:
                 ctk.CTkLabel(container, text="Sin órdenes en este estado.",
@@ -113,9 +112,9 @@ class OrdersBoardView(ctk.CTkFrame):
         self._timer = self.after(15000, self._refresh_cards)
 
     def _create_order_card(self, parent, r, fifo):
-        orden = r.get("orden", "N/A"); parte = r.get("parte", "N/A"); molde = r.get("molde_id", "N/A")
-        objetivo = parse_int_str(r.get("qty_total", "0"))
-        estado = r.get("estado", "plan").lower()
+        orden = r.orden or "N/A"; parte = r.parte or "N/A"; molde = r.molde_id or "N/A"
+        objetivo = r.qty_total
+        estado = r.estado
 
         m = order_metrics(r, fifo)
         mm = mold_metrics(molde, fifo)
@@ -123,20 +123,18 @@ class PlanningMilestonesView(ctk.CTkFrame):
         cavon=self.e_cavon.get().strip() or ""
         if not (orden and parte and molde and maquina and qty and inicio and fin):
             messagebox.showwarning("Faltan datos","Completa: orden, parte, molde, máquina, qty, inicio y fin."); return
-        rows=leer_csv_dict(PLANNING_CSV); found=False
-        for r in rows:
-            if r.get("orden")==orden:
-                r.update({"parte":parte,"molde_id":molde,"maquina_id":maquina,"qty_total":qty,
-                          "inicio_ts":inicio,"fin_est_ts":fin,"setup_min":setup,"estado":r.get("estado","plan") or "plan",
-                          "ciclo_s":ciclo,"cav_on":cavon})
-                found=True; break
-        if not found:
+        def upsert(rows):
+            for r in rows:
+                if r.get("orden")==orden:
+                    r.update({"parte":parte,"molde_id":molde,"maquina_id":maquina,"qty_total":qty,
+                              "inicio_ts":inicio,"fin_est_ts":fin,"setup_min":setup,"estado":r.get("estado","plan") or "plan",
+                              "ciclo_s":ciclo,"cav_on":cavon})
+                    return rows
             rows.append({"orden":orden,"parte":parte,"molde_id":molde,"maquina_id":maquina,"qty_total":qty,
                          "inicio_ts":inicio,"fin_est_ts":fin,"setup_min":setup,"estado":"plan",
                          "ciclo_s":ciclo,"cav_on":cavon})
-        with open(PLANNING_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","parte","molde_id","maquina_id","qty_total","inicio_ts","fin_est_ts","setup_min","estado","ciclo_s","cav_on"])
-            w.writeheader(); w.writerows(rows)
+            return rows
+        actualizar_csv(PLANNING_CSV, PLANNING_FIELDS, upsert)
         messagebox.showinfo("Orden","Orden guardada.")
         self._reload_orders_combo(); self._reload_orders_table()
         if getattr(self.app, 'dashboard_page', None):
@@ -149,15 +147,12 @@ class PlanningMilestonesView(ctk.CTkFrame):
         orden = self.e_orden.get().strip() or self.sel_orden_var.get().strip()
         if not orden: messagebox.showwarning("Orden","Selecciona o escribe la orden a eliminar."); return
         if not messagebox.askyesno("Eliminar","¿Eliminar la orden "+orden+"?"): return
-        rows=[r for r in leer_csv_dict(PLANNING_CSV) if r.get("orden")!=orden]
-        with open(PLANNING_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","parte","molde_id","maquina_id","qty_total","inicio_ts","fin_est_ts","setup_min","estado","ciclo_s","cav_on"])
-            w.writeheader(); w.writerows(rows)
+        def quitar(rows):
+            nuevas=[r for r in rows if r.get("orden")!=orden]
+            return nuevas if len(nuevas)!=len(rows) else None
+        actualizar_csv(PLANNING_CSV, PLANNING_FIELDS, quitar)
         # también borrar milestones asociados
-        miles=[r for r in leer_csv_dict(DELIV_CSV) if r.get("orden")!=orden]
-        with open(DELIV_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","due_date","qty","cumplido"])
-            w.writeheader(); w.writerows(miles)
+        actualizar_csv(DELIV_CSV, DELIV_FIELDS, quitar)
         messagebox.showinfo("Orden","Orden eliminada.")
         self._reload_orders_combo(); self._reload_orders_table(); self._render_milestones_panel()
         if getattr(self.app, 'dashboard_page', None):
@@ -169,13 +164,12 @@ class PlanningMilestonesView(ctk.CTkFrame):
     def _mark_done(self):
         orden = self.e_orden.get().strip() or self.sel_orden_var.get().strip()
         if not orden: messagebox.showwarning("Orden","Selecciona o escribe la orden a completar."); return
-        rows=leer_csv_dict(PLANNING_CSV)
-        for r in rows:
-            if r.get("orden")==orden:
-                r["estado"]="done"
-        with open(PLANNING_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","parte","molde_id","maquina_id","qty_total","inicio_ts","fin_est_ts","setup_min","estado","ciclo_s","cav_on"])
-            w.writeheader(); w.writerows(rows)
+        def marcar(rows):
+            for r in rows:
+                if r.get("orden")==orden:
+                    r["estado"]="done"
+            return rows
+        actualizar_csv(PLANNING_CSV, PLANNING_FIELDS, marcar)
         self._reload_orders_table()
         if getattr(self.app, 'dashboard_page', None):
             try:
@@ -345,20 +339,18 @@ class PlanningMilestonesView(ctk.CTkFrame):
         cavon=self.e_cavon.get().strip() or ""
         if not (orden and parte and molde and maquina and qty and inicio and fin):
             messagebox.showwarning("Faltan datos","Completa: orden, parte, molde, máquina, qty, inicio y fin."); return
-        rows=leer_csv_dict(PLANNING_CSV); found=False
-        for r in rows:
-            if r.get("orden")==orden:
-                r.update({"parte":parte,"molde_id":molde,"maquina_id":maquina,"qty_total":qty,
-                          "inicio_ts":inicio,"fin_est_ts":fin,"setup_min":setup,"estado":r.get("estado","plan") or "plan",
-                          "ciclo_s":ciclo,"cav_on":cavon})
-                found=True; break
-        if not found:
+        def upsert(rows):
+            for r in rows:
+                if r.get("orden")==orden:
+                    r.update({"parte":parte,"molde_id":molde,"maquina_id":maquina,"qty_total":qty,
+                              "inicio_ts":inicio,"fin_est_ts":fin,"setup_min":setup,"estado":r.get("estado","plan") or "plan",
+                              "ciclo_s":ciclo,"cav_on":cavon})
+                    return rows
             rows.append({"orden":orden,"parte":parte,"molde_id":molde,"maquina_id":maquina,"qty_total":qty,
                          "inicio_ts":inicio,"fin_est_ts":fin,"setup_min":setup,"estado":"plan",
                          "ciclo_s":ciclo,"cav_on":cavon})
-        with open(PLANNING_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","parte","molde_id","maquina_id","qty_total","inicio_ts","fin_est_ts","setup_min","estado","ciclo_s","cav_on"])
-            w.writeheader(); w.writerows(rows)
+            return rows
+        actualizar_csv(PLANNING_CSV, PLANNING_FIELDS, upsert)
         messagebox.showinfo("Orden","Orden guardada.")
         self._reload_orders_combo(); self._reload_orders_table()
         if getattr(self.app, 'dashboard_page', None):
@@ -371,15 +363,12 @@ class PlanningMilestonesView(ctk.CTkFrame):
         orden = self.e_orden.get().strip() or self.sel_orden_var.get().strip()
         if not orden: messagebox.showwarning("Orden","Selecciona o escribe la orden a eliminar."); return
         if not messagebox.askyesno("Eliminar","¿Eliminar la orden "+orden+"?"): return
-        rows=[r for r in leer_csv_dict(PLANNING_CSV) if r.get("orden")!=orden]
-        with open(PLANNING_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","parte","molde_id","maquina_id","qty_total","inicio_ts","fin_est_ts","setup_min","estado","ciclo_s","cav_on"])
-            w.writeheader(); w.writerows(rows)
+        def quitar(rows):
+            nuevas=[r for r in rows if r.get("orden")!=orden]
+            return nuevas if len(nuevas)!=len(rows) else None
+        actualizar_csv(PLANNING_CSV, PLANNING_FIELDS, quitar)
         # también borrar milestones asociados
-        miles=[r for r in leer_csv_dict(DELIV_CSV) if r.get("orden")!=orden]
-        with open(DELIV_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","due_date","qty","cumplido"])
-            w.writeheader(); w.writerows(miles)
+        actualizar_csv(DELIV_CSV, DELIV_FIELDS, quitar)
         messagebox.showinfo("Orden","Orden eliminada.")
         self._reload_orders_combo(); self._reload_orders_table(); self._render_milestones_panel()
         if getattr(self.app, 'dashboard_page', None):
@@ -391,13 +380,12 @@ class PlanningMilestonesView(ctk.CTkFrame):
     def _mark_done(self):
         orden = self.e_orden.get().strip() or self.sel_orden_var.get().strip()
         if not orden: messagebox.showwarning("Orden","Selecciona o escribe la orden a completar."); return
-        rows=leer_csv_dict(PLANNING_CSV)
-        for r in rows:
-            if r.get("orden")==orden:
-                r["estado"]="done"
-        with open(PLANNING_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","parte","molde_id","maquina_id","qty_total","inicio_ts","fin_est_ts","setup_min","estado","ciclo_s","cav_on"])
-            w.writeheader(); w.writerows(rows)
+        def marcar(rows):
+            for r in rows:
+                if r.get("orden")==orden:
+                    r["estado"]="done"
+            return rows
+        actualizar_csv(PLANNING_CSV, PLANNING_FIELDS, marcar)
         self._reload_orders_table()
         if getattr(self.app, 'dashboard_page', None):
             try:
@@ -472,8 +460,7 @@ class PlanningMilestonesView(ctk.CTkFrame):
         # << ======================= FIN DEL CAMBIO ======================= >>
         
         # append
-        with open(DELIV_CSV,"a",newline="",encoding="utf-8") as f:
-            w=csv.writer(f); w.writerow([orden, due, str(qty), "0"])
+        agregar_fila_csv(DELIV_CSV, [orden, due, str(qty), "0"])
         self.e_due.delete(0,"end"); self.e_dqty.delete(0,"end")
         self._render_milestones_panel()
 
@@ -483,20 +470,20 @@ class PlanningMilestonesView(ctk.CTkFrame):
         if not orden or orden=="(elige orden)":
             ctk.CTkLabel(self.mil_scroll, text="Selecciona una orden para ver sus milestones.").pack(padx=10, pady=10)
             return
-        miles=[r for r in leer_csv_dict(DELIV_CSV) if r.get("orden")==orden]
-        miles.sort(key=lambda r: (r.get("due_date",""), r.get("qty","")))
+        miles=[r for r in leer_entregas() if r.orden==orden]
+        miles.sort(key=lambda r: (r.due_date, r.qty))
         if not miles:
             ctk.CTkLabel(self.mil_scroll, text="Sin milestones.").pack(padx=10, pady=10)
             return
 
-        orden_row = next((r for r in leer_csv_dict(PLANNING_CSV) if r.get("orden")==orden), None)
-        molde = orden_row.get("molde_id","").strip() if orden_row else ""
+        orden_row = next((r for r in leer_ordenes() if r.orden==orden), None)
+        molde = orden_row.molde_id if orden_row else ""
         prod_total = producido_por_molde_global(molde)
         sum_acum = 0
         # agrupar por mes
         grupos={}
         for r in miles:
-            ym=(r.get("due_date","") or "")[:7]
+            ym=r.due_date[:7]
             grupos.setdefault(ym,[]).append(r)
 
         for ym in sorted(grupos.keys()):
@@ -507,8 +494,8 @@ class PlanningMilestonesView(ctk.CTkFrame):
             cont.pack(fill="x", padx=8, pady=(0,10))
             all_ok=True
             for r in grupos[ym]:
-                due=r.get("due_date","")
-                q=parse_int_str(r.get("qty","0"))
+                due=r.due_date
+                q=r.qty
                 sum_acum += q
                 cumplido = prod_total >= sum_acum
                 if not cumplido: all_ok=False
@@ -535,15 +522,14 @@ class PlanningMilestonesView(ctk.CTkFrame):
         resumen.pack(anchor="w", padx=12, pady=(2,6))
 
     def _delete_milestone(self, orden, due, qty):
-        rows=leer_csv_dict(DELIV_CSV); deleted=False
-        new=[]
-        for r in rows:
-            if not deleted and r.get("orden")==orden and r.get("due_date")==due and str(r.get("qty",""))==str(qty):
-                deleted=True; continue
-            new.append(r)
-        with open(DELIV_CSV,"w",newline="",encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","due_date","qty","cumplido"])
-            w.writeheader(); w.writerows(new)
+        def quitar(rows):
+            deleted=False; new=[]
+            for r in rows:
+                if not deleted and r.get("orden")==orden and r.get("due_date")==due and str(r.get("qty",""))==str(qty):
+                    deleted=True; continue
+                new.append(r)
+            return new if deleted else None
+        actualizar_csv(DELIV_CSV, DELIV_FIELDS, quitar)
         self._render_milestones_panel()
 
     def _edit_milestone_dialog(self, orden, due, qty):
@@ -558,8 +544,7 @@ class PlanningMilestonesView(ctk.CTkFrame):
                 messagebox.showwarning("Milestone","Datos inválidos."); return
             # actualizar (delete + add)
             self._delete_milestone(orden, due, qty)
-            with open(DELIV_CSV,"a",newline="",encoding="utf-8") as f:
-                csv.writer(f).writerow([orden,new_due,new_qty,"0"])
+            agregar_fila_csv(DELIV_CSV, [orden,new_due,new_qty,"0"])
             top.destroy(); self._render_milestones_panel()
         ctk.CTkButton(frm, text="Guardar", command=save).pack(side="left", padx=8)
         ctk.CTkButton(frm, text="Cancelar", fg_color="#E5E7EB", text_color="#111", hover_color="#D1D5DB",
@@ -239,10 +239,9 @@ class RecipesView(ctk.CTkFrame):
         except Exception:
             pass
 
-    def _save_to_disk(self):
-        with open(RECIPES_CSV, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=self.FIELDS)
-            w.writeheader(); w.writerows(self._all_rows)
+    def _save_to_disk(self, mutar):
+        """Aplica ``mutar`` sobre las recetas vigentes en disco (no sobre la copia en pantalla)."""
+        self._all_rows = actualizar_csv(RECIPES_CSV, self.FIELDS, mutar)
         try:
             self.app._refresh_moldes_from_recipes()
             self.app._on_molde_change(); self.app._update_now()
@@ -269,8 +268,7 @@ class RecipesView(ctk.CTkFrame):
                 messagebox.showwarning("Importar", "El archivo está vacío."); return
             if not messagebox.askyesno("Importar", "¿Reemplazar todas las recetas por el archivo seleccionado?"):
                 return
-            self._all_rows = rows
-            self._save_to_disk()
+            self._save_to_disk(lambda _actuales: rows)
             self._refresh_table()
             messagebox.showinfo("Importar", "Recetas importadas.")
         except Exception as e:
@@ -446,20 +444,24 @@ class RecipesView(ctk.CTkFrame):
             messagebox.showwarning("Validación", "\n".join(errs)); return
         sel = self.tree.selection()
         old_id = self.tree.item(sel[0], "values")[0] if sel else None
-        if old_id:
-            idx = next((i for i, r in enumerate(self._all_rows) if r.get("molde_id", "") == old_id), None)
-            if idx is not None: self._all_rows[idx] = row
-            else: self._upsert_by_id(row)
-        else:
-            self._upsert_by_id(row)
-        self._save_to_disk(); self._refresh_table()
+
+        def aplicar(rows):
+            if old_id:
+                idx = next((i for i, r in enumerate(rows) if r.get("molde_id", "") == old_id), None)
+                if idx is not None:
+                    rows[idx] = row
+                    return rows
+            return self._upsert_by_id(rows, row)
+
+        self._save_to_disk(aplicar); self._refresh_table()
         messagebox.showinfo("Recetas", "Receta guardada.")
 
-    def _upsert_by_id(self, row: dict):
-        for r in self._all_rows:
+    def _upsert_by_id(self, rows: list, row: dict) -> list:
+        for r in rows:
             if r.get("molde_id", "").strip() == row["molde_id"]:
-                r.update(row); return
-        self._all_rows.append(row)
+                r.update(row); return rows
+        rows.append(row)
+        return rows
 
     def _delete(self):
         sel = self.tree.selection()
@@ -468,8 +470,8 @@ class RecipesView(ctk.CTkFrame):
         molde = self.tree.item(sel[0], "values")[0]
         if not messagebox.askyesno("Eliminar", f"¿Eliminar la receta del molde {molde}?"):
             return
-        self._all_rows = [r for r in self._all_rows if r.get("molde_id", "") != molde]
-        self._save_to_disk(); self._refresh_table()
+        self._save_to_disk(lambda rows: [r for r in rows if r.get("molde_id", "") != molde])
+        self._refresh_table()
 
     # ===================== Utils =====================
     def _to_float(self, s):
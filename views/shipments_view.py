@@ -1,5 +1,5 @@
 from .base import *
-from metrics import compute_fifo_assignments, order_metrics, mold_metrics, parse_int_str
+from metrics import compute_fifo_assignments, disponible_para_orden, order_metrics, mold_metrics, parse_int_str
 from tkinter import simpledialog
 
 class ShipmentsView(ctk.CTkFrame):
@@ -218,8 +218,7 @@ class ShipmentsView(ctk.CTkFrame):
                 messagebox.showwarning("Duplicado", f"El nombre '{name}' ya existe.", parent=top)
                 return
 
-            with open(config.PERSONNEL_CSV, "a", newline="", encoding="utf-8") as f:
-                csv.writer(f).writerow([name, role])
+            agregar_fila_csv(config.PERSONNEL_CSV, [name, role])
             
             entry_name.delete(0, "end")
             self._populate_personnel_dropdowns()
@@ -260,8 +259,7 @@ class ShipmentsView(ctk.CTkFrame):
                 messagebox.showwarning("Duplicado", f"El cliente '{name}' ya existe.", parent=top)
                 return
 
-            with open(config.CLIENTS_CSV, "a", newline="", encoding="utf-8") as f:
-                csv.writer(f).writerow([name, addr, contact])
+            agregar_fila_csv(config.CLIENTS_CSV, [name, addr, contact])
             
             entry_name.delete(0, "end"); entry_addr.delete(0, "end"); entry_contact.delete(0, "end")
             self._populate_clients_dropdown()
@@ -322,12 +320,12 @@ class ShipmentsView(ctk.CTkFrame):
             for i in self._tree_ord.get_children(): self._tree_ord.delete(i)
             return
 
-        plan = leer_csv_dict(config.PLANNING_CSV)
-        row = next((r for r in plan if (r.get("orden","") or "").strip() == self._selected_order), None)
+        plan = leer_ordenes()
+        row = next((r for r in plan if r.orden == self._selected_order), None)
         if not row: return
 
-        molde = (row.get("molde_id","") or "").strip(); parte = (row.get("parte","") or "").strip()
-        fifo = compute_fifo_assignments(plan); m = order_metrics(row, fifo); mm = mold_metrics(molde, fifo)
+        molde = row.molde_id; parte = row.parte
+        fifo = compute_fifo_assignments(); m = order_metrics(row, fifo); mm = mold_metrics(molde, fifo)
         
         self.lbl_order_header.configure(text=f"Orden {self._selected_order} — {parte}")
         self.kpi_prog.configure(text=f"{m['progreso']:,} / {m['objetivo']:,}")
@@ -371,22 +369,19 @@ class ShipmentsView(ctk.CTkFrame):
         autoriza = self._om_autoriza.get()
         if autoriza == "(Sin personal)": autoriza = ""
 
-        plan=leer_csv_dict(config.PLANNING_CSV)
-        orow=next((r for r in plan if r.get("orden") == o), None)
+        plan=leer_ordenes()
+        orow=next((r for r in plan if r.orden == o), None)
         if not orow:
             messagebox.showerror("Error", "La orden seleccionada ya no existe en la planificación."); return
 
         if self._approve_on_save.get():
-            fifo = compute_fifo_assignments(plan)
-            m = order_metrics(orow, fifo)
-            disponible_para_enviar = m['progreso'] - m['enviado']
+            disponible_para_enviar = disponible_para_orden(orow)
             if qty_val > disponible_para_enviar:
                 messagebox.showwarning("Límite Excedido", f"No se puede aprobar esta cantidad.\n\nInventario disponible para esta orden: {disponible_para_enviar:,} pzs.\nCantidad solicitada: {qty_val:,} pzs.")
                 return
 
         approved_flag = "1" if self._approve_on_save.get() else "0"
-        with open(config.SHIPMENTS_CSV, "a", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow([o, d, str(qty_val), dest, nota, approved_flag, entrega, autoriza])
+        encolar_fila_csv(config.SHIPMENTS_CSV, [o, d, str(qty_val), dest, nota, approved_flag, entrega, autoriza])
         
         self._e_qty.delete(0,"end"); self._e_note.delete("1.0", "end")
         self._note_focus_out()
@@ -397,11 +392,9 @@ class ShipmentsView(ctk.CTkFrame):
         sel=self._tree_ord.selection()
         if not sel: return
         
-        plan=leer_csv_dict(config.PLANNING_CSV)
-        fifo=compute_fifo_assignments(plan)
-        orow=next((r for r in plan if r.get("orden") == self._selected_order), None)
-        m = order_metrics(orow, fifo)
-        disponible = m['progreso'] - m['enviado']
+        plan=leer_ordenes()
+        orow=next((r for r in plan if r.orden == self._selected_order), None)
+        disponible = disponible_para_orden(orow)
 
         qty_a_aprobar = 0; items_a_aprobar = []
         for iid in sel:
@@ -416,17 +409,18 @@ class ShipmentsView(ctk.CTkFrame):
             messagebox.showwarning("Límite Excedido", f"No se pueden aprobar las salidas seleccionadas.\n\nInventario disponible: {disponible:,} pzs.\nCantidad a aprobar: {qty_a_aprobar:,} pzs.")
             return
 
-        rows=self._shipments_all(); changed=False
-        for r in rows:
-            if r.get("orden") == self._selected_order and r.get("approved","0") != "1":
-                key = (r.get("ship_date",""), r.get("qty",""), r.get("destino",""), r.get("nota",""), r.get("entrega",""), r.get("autoriza",""))
-                if key in items_a_aprobar:
-                    r["approved"]="1"; changed=True
-
+        orden = self._selected_order; changed = []
+        def aprobar(rows):
+            changed.clear()
+            for r in rows:
+                if r.get("orden") == orden and r.get("approved","0") != "1":
+                    key = (r.get("ship_date",""), r.get("qty",""), r.get("destino",""), r.get("nota",""), r.get("entrega",""), r.get("autoriza",""))
+                    if key in items_a_aprobar:
+                        r["approved"]="1"; changed.append(key)
+            return rows if changed else None
+
+        actualizar_shipments(aprobar, normalizar=False)
         if changed:
-            with open(config.SHIPMENTS_CSV, "w", newline="", encoding="utf-8") as f:
-                w=csv.DictWriter(f, fieldnames=["orden","ship_date","qty","destino","nota","approved", "entrega", "autoriza"])
-                w.writeheader(); w.writerows(rows)
             self._reload_all()
 
     def _delete_selected_in_order(self):
@@ -434,19 +428,19 @@ class ShipmentsView(ctk.CTkFrame):
         if not sel: return
         if not messagebox.askyesno("Confirmar", f"¿Eliminar {len(sel)} registro(s) de salida?"): return
         
-        rows=self._shipments_all(); new_rows=[]
         keys_to_delete = set()
         for iid in sel:
             status, fecha, qty, dest, entrega, autoriza, nota = self._tree_ord.item(iid, "values")
             approved = "1" if status == "Aprobada" else "0"
             keys_to_delete.add((self._selected_order, fecha, str(qty), dest, nota, approved, entrega, autoriza))
         
-        for r in rows:
-            key=(r.get("orden",""), r.get("ship_date",""), str(r.get("qty","")), r.get("destino",""), r.get("nota",""), r.get("approved","0"), r.get("entrega",""), r.get("autoriza",""))
-            if key not in keys_to_delete:
-                new_rows.append(r)
+        def quitar(rows):
+            new_rows=[]
+            for r in rows:
+                key=(r.get("orden",""), r.get("ship_date",""), str(r.get("qty","")), r.get("destino",""), r.get("nota",""), r.get("approved","0"), r.get("entrega",""), r.get("autoriza",""))
+                if key not in keys_to_delete:
+                    new_rows.append(r)
+            return new_rows if len(new_rows) != len(rows) else None
         
-        with open(config.SHIPMENTS_CSV, "w", newline="", encoding="utf-8") as f:
-            w=csv.DictWriter(f, fieldnames=["orden","ship_date","qty","destino","nota","approved", "entrega", "autoriza"])
-            w.writeheader(); w.writerows(new_rows)
+        actualizar_shipments(quitar, normalizar=False)
         self._reload_all()
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""Escritura diferida (write-behind) de filas agregadas.
+
+``encolar`` guarda la fila en una bitácora local (``config.JOURNAL_DIR``,
+``fsync`` por fila) y regresa de inmediato; un hilo escritor agrupa las
+filas por archivo destino y las agrega con ``csv_utils.agregar_filas_csv``.
+Si el destino está bloqueado (p. ej. abierto en Excel) se reintenta con
+espera creciente sin frenar a los demás archivos. Mientras una fila está
+pendiente, los lectores de ``csv_utils`` la ven igual (``pendientes``).
+
+Cada fila lleva un id en la bitácora. Antes de agregar un lote se anota
+``escribiendo`` con sus ids y después ``hechas``; al arrancar se reponen las
+filas sin ``hechas``. Si el corte cayó entre las dos marcas, el lote se da
+por escrito solo si aparece completo y seguido en el destino.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set
+
+import config
+import csv_utils
+from file_lock import bloqueo_csv
+
+LOTE_S = 0.2          # ventana para juntar filas antes de escribir
+REINTENTO_MIN_S = 0.5
+REINTENTO_MAX_S = 30.0
+BLOQUEO_S = 0.2       # espera corta por el candado entre terminales: si no, se reintenta luego
+COMPACTAR_MIN = 256   # líneas de la bitácora antes de reescribirla sin lo ya escrito
+
+
+class _Entrada:
+    __slots__ = ("id", "path", "row", "t")
+
+    def __init__(self, id_: int, path: str, row: List[str], t: float):
+        self.id = id_
+        self.path = path
+        self.row = row
+        self.t = t
+
+
+def _texto(row) -> List[str]:
+    # lo mismo que escribiría csv.writer
+    return ["" if v is None else str(v) for v in row]
+
+
+class WriteJournal:
+    """Cola durable con un hilo escritor."""
+
+    def __init__(self, directorio: str):
+        os.makedirs(directorio, exist_ok=True)
+        self.path = os.path.join(directorio, "pendientes.jsonl")
+        self._cond = threading.Condition()
+        self._pend: Deque[_Entrada] = deque()
+        self._seq = 0
+        self._lineas = 0   # líneas en la bitácora (entradas y marcas)
+        self._en_vuelo: List[int] = []   # ids del lote que se está agregando
+        self._espera: Dict[str, List[float]] = {}  # path -> [próximo intento, backoff]
+        self._parar = False
+        self._stats = {
+            "encoladas": 0, "escritas": 0, "lotes": 0, "reintentos": 0,
+            "latencia_ultima_ms": 0.0, "latencia_max_ms": 0.0, "latencia_media_ms": 0.0,
+            "ultimo_error": "",
+        }
+        self._recuperar()
+        self._hilo = threading.Thread(target=self._bucle, name="write-journal", daemon=True)
+        self._hilo.start()
+
+    # ----- bitácora local -----
+    def _recuperar(self) -> None:
+        entradas: Dict[int, tuple] = {}
+        en_vuelo: List[List[int]] = []
+        hechas: Set[int] = set()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        d = json.loads(linea)
+                        if "hechas" in d:
+                            hechas.update(d["hechas"])
+                        elif "escribiendo" in d:
+                            en_vuelo.append(d["escribiendo"])
+                        else:
+                            id_ = d.get("id")
+                            if id_ is None:  # bitácora de una versión sin ids
+                                id_ = -1 - len(entradas)
+                                en_vuelo.append([id_])
+                            entradas[id_] = (d["path"], d["row"])
+                    except (ValueError, KeyError, TypeError):
+                        continue  # línea truncada por un corte
+        except FileNotFoundError:
+            return
+        for ids in en_vuelo:
+            lote = [i for i in ids if i in entradas and i not in hechas]
+            if lote and self._ya_escrito(entradas[lote[0]][0], [entradas[i][1] for i in lote]):
+                hechas.update(lote)
+        ahora = time.monotonic()
+        for id_, (path, row) in sorted(entradas.items()):
+            if id_ not in hechas:
+                self._seq += 1
+                self._pend.append(_Entrada(self._seq, path, row, ahora))
+        self._reescribir()
+
+    @staticmethod
+    def _ya_escrito(path: str, filas: List[List[str]]) -> bool:
+        """``True`` si ``filas`` aparecen seguidas en ``path`` (un lote se agrega de una vez)."""
+        logs = {os.path.abspath(m[k]) for m in config.MACHINES for k in ("oee_csv", "down_csv")}
+        campos = csv_utils.encabezado_csv(path)
+        leer = csv_utils.leer_log_maquina if path in logs else csv_utils.leer_csv_dict
+        destino = [tuple(r.get(k, "") for k in campos) for r in leer(path, pendientes=False)]
+        lote = [tuple(r) for r in filas]
+        n = len(lote)
+        for i in range(len(destino) - n, -1, -1):
+            if destino[i] == lote[0] and destino[i:i + n] == lote:
+                return True
+        return False
+
+    def _anotar(self, d: Dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(d, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._lineas += 1
+
+    def _reescribir(self) -> None:
+        self._lineas = len(self._pend)
+        if not self._pend:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for e in self._pend:
+                f.write(json.dumps({"id": e.id, "path": e.path, "row": e.row}, ensure_ascii=False) + "\n")
+            if self._en_vuelo:
+                f.write(json.dumps({"escribiendo": self._en_vuelo}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _quitar(self, ids: Set[int]) -> None:
+        # con self._cond tomado
+        self._pend = deque(e for e in self._pend if e.id not in ids)
+        if not self._pend or self._lineas > max(COMPACTAR_MIN, 4 * len(self._pend)):
+            self._reescribir()
+        else:
+            self._anotar({"hechas": sorted(ids)})
+        self._cond.notify_all()
+
+    # ----- API -----
+    def encolar(self, path: str, row) -> None:
+        path = os.path.abspath(path)
+        e_row = _texto(row)
+        with self._cond:
+            self._seq += 1
+            self._pend.append(_Entrada(self._seq, path, e_row, time.monotonic()))
+            self._anotar({"id": self._seq, "path": path, "row": e_row})
+            self._stats["encoladas"] += 1
+            self._cond.notify()
+
+    def pendientes(self, path: str, ids: Optional[List[int]] = None) -> List[List[str]]:
+        """Filas aún no escritas en ``path``, en orden de llegada; sus ids se agregan a ``ids``."""
+        path = os.path.abspath(path)
+        with self._cond:
+            lote = [e for e in self._pend if e.path == path]
+        if ids is not None:
+            ids.extend(e.id for e in lote)
+        return [e.row for e in lote]
+
+    def descartar(self, path: str, ids: Iterable[int]) -> None:
+        """Olvida las filas ``ids`` de ``path``: quien reescribió el archivo ya las incluyó.
+
+        Llamar con el candado de ``path`` tomado para no cruzarse con un lote
+        del hilo escritor. Lo encolado después de esa lectura sigue en cola.
+        """
+        path = os.path.abspath(path)
+        ids = set(ids)
+        with self._cond:
+            quitar = {e.id for e in self._pend if e.path == path and e.id in ids}
+            if quitar:
+                self._quitar(quitar)
+
+    def vaciar(self, timeout: float = 5.0) -> bool:
+        """Espera a que la cola quede vacía; ``False`` si vence el plazo."""
+        limite = time.monotonic() + timeout
+        with self._cond:
+            for p in self._espera.values():
+                p[0] = 0.0
+            self._cond.notify()
+            while self._pend:
+                resto = limite - time.monotonic()
+                if resto <= 0:
+                    return False
+                self._cond.wait(resto)
+        return True
+
+    def detener(self, timeout: float = 5.0) -> bool:
+        ok = self.vaciar(timeout)
+        with self._cond:
+            self._parar = True
+            self._cond.notify()
+        self._hilo.join(timeout)
+        return ok
+
+    def stats(self) -> Dict:
+        with self._cond:
+            out = dict(self._stats)
+            out["pendientes"] = len(self._pend)
+            out["bloqueados"] = sorted(os.path.basename(p) for p in self._espera)
+            return out
+
+    # ----- hilo escritor -----
+    def _listos(self, ahora: float) -> Dict[str, List[_Entrada]]:
+        grupos: Dict[str, List[_Entrada]] = {}
+        for e in self._pend:
+            esp = self._espera.get(e.path)
+            if esp is None or esp[0] <= ahora:
+                grupos.setdefault(e.path, []).append(e)
+        return grupos
+
+    def _bucle(self) -> None:
+        while True:
+            with self._cond:
+                while not self._parar:
+                    ahora = time.monotonic()
+                    if self._listos(ahora):
+                        break
+                    proximos = [p[0] for p in self._espera.values()]
+                    self._cond.wait(max(0.05, min(proximos) - ahora) if proximos else None)
+                if self._parar:
+                    return
+            time.sleep(LOTE_S)
+            with self._cond:
+                lotes = self._listos(time.monotonic())
+            # el archivo se escribe sin self._cond: encolar y los lectores no esperan al disco
+            for path, lote in lotes.items():
+                try:
+                    self._escribir(path, lote)
+                except Exception as ex:  # bloqueado, sin permiso, base ocupada...
+                    with self._cond:
+                        esp = self._espera.setdefault(path, [0.0, REINTENTO_MIN_S / 2])
+                        esp[1] = min(REINTENTO_MAX_S, esp[1] * 2)
+                        esp[0] = time.monotonic() + esp[1]
+                        self._stats["reintentos"] += 1
+                        self._stats["ultimo_error"] = f"{os.path.basename(path)}: {ex}"
+
+    def _escribir(self, path: str, lote: List[_Entrada]) -> None:
+        # con el candado del destino: quien reescribe el archivo (descartar) no se cruza con el lote
+        with bloqueo_csv(path, BLOQUEO_S):
+            with self._cond:
+                vivas = {e.id for e in self._pend if e.path == path}
+                lote = [e for e in lote if e.id in vivas]
+                if not lote:
+                    return
+                ids = self._en_vuelo = [e.id for e in lote]
+                self._anotar({"escribiendo": ids})
+            try:
+                csv_utils.agregar_filas_csv(path, [e.row for e in lote], espera=BLOQUEO_S)
+            finally:
+                with self._cond:
+                    self._en_vuelo = []
+            # entre la escritura y _quitar un lector puede ver la fila en el
+            # archivo y en cola; su siguiente consulta ya la ve una vez. Quien
+            # guarda sumas derivadas (tablas diarias) llama antes a vaciar()
+            with self._cond:
+                self._espera.pop(path, None)
+                self._registrar(lote)
+                self._quitar(set(ids))
+
+    def _registrar(self, lote: List[_Entrada]) -> None:
+        ahora = time.monotonic()
+        s = self._stats
+        for e in lote:
+            lat = (ahora - e.t) * 1000.0
+            s["escritas"] += 1
+            s["latencia_ultima_ms"] = round(lat, 1)
+            s["latencia_max_ms"] = round(max(s["latencia_max_ms"], lat), 1)
+            s["latencia_media_ms"] = round(
+                s["latencia_media_ms"] + (lat - s["latencia_media_ms"]) / s["escritas"], 1)
+        s["lotes"] += 1
+
+
+_JOURNAL: Optional[WriteJournal] = None
+_JOURNAL_LOCK = threading.Lock()
+
+
+def journal() -> WriteJournal:
+    global _JOURNAL
+    with _JOURNAL_LOCK:
+        if _JOURNAL is None:
+            _JOURNAL = WriteJournal(config.JOURNAL_DIR)
+        return _JOURNAL
+
+
+def activo() -> Optional[WriteJournal]:
+    """La instancia en uso o ``None`` si nadie ha encolado todavía."""
+    return _JOURNAL